@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'keitaro_wrapper.apps.KeitaroWrapperConfig',
     'django_extensions'
 ]
@@ -136,10 +137,17 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Общий для всех воркеров gunicorn и management-команд кеш в таблице Postgres
+# (создаётся командой `manage.py createcachetable`)
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "keitaro-cache",
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "keitaro_cache",
+        "TIMEOUT": 600,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES") or 10000),
+            "CULL_FREQUENCY": 4,
+        },
     }
 }
 
@@ -159,4 +167,77 @@ LOGGING = {
 
 #Keitaro settings
 KEITARO_API_HOST = os.environ.get("KEITARO_API_HOST")
-KEITARO_API_TOKEN = os.environ.get("KEITARO_API_TOKEN")
\ No newline at end of file
+KEITARO_API_TOKEN = os.environ.get("KEITARO_API_TOKEN")
+KEITARO_API_POOL_SIZE = int(os.environ.get("KEITARO_API_POOL_SIZE") or 10)
+KEITARO_API_CONNECT_TIMEOUT = float(os.environ.get("KEITARO_API_CONNECT_TIMEOUT") or 3.05)
+KEITARO_API_READ_TIMEOUT = float(os.environ.get("KEITARO_API_READ_TIMEOUT") or 30)
+# Сколько запросов к Keitaro один ASGI-процесс держит одновременно (AsyncKeitaroAPIManager)
+KEITARO_API_ASYNC_MAX_CONNECTIONS = int(os.environ.get("KEITARO_API_ASYNC_MAX_CONNECTIONS") or 200)
+# Отрицательный кеш GET-запросов: после ошибки эндпоинт не запрашивается
+# KEITARO_NEGATIVE_CACHE_TTL секунд, при повторных ошибках пауза удваивается до MAX_TTL
+KEITARO_NEGATIVE_CACHE_TTL = int(os.environ.get("KEITARO_NEGATIVE_CACHE_TTL") or 5)
+KEITARO_NEGATIVE_CACHE_MAX_TTL = int(os.environ.get("KEITARO_NEGATIVE_CACHE_MAX_TTL") or 300)
+# Circuit breaker поверх отрицательного кеша: пока пауза эндпоинта не истекла,
+# запросы к нему сразу получают отказ; после паузы к Keitaro идёт один пробный
+# запрос (его блокировка живёт KEITARO_CIRCUIT_PROBE_TTL секунд), остальные
+# по-прежнему получают отказ. Чтения в это время отдают последний успешный
+# ответ эндпоинта, который хранится KEITARO_SNAPSHOT_TTL секунд
+KEITARO_CIRCUIT_PROBE_TTL = int(KEITARO_API_CONNECT_TIMEOUT + KEITARO_API_READ_TIMEOUT) + 5
+KEITARO_SNAPSHOT_TTL = int(os.environ.get("KEITARO_SNAPSHOT_TTL") or 7 * 24 * 3600)
+# Сколько последних ответов GET (валидаторы + разобранное тело) держит каждый процесс
+# для условных запросов к Keitaro
+KEITARO_VALIDATORS_MAX_ENTRIES = int(os.environ.get("KEITARO_VALIDATORS_MAX_ENTRIES") or 32)
+
+# Справочники Keitaro: (мягкий, жёсткий) TTL в секундах. После мягкого TTL
+# значение отдаётся из кеша и обновляется в фоне, после жёсткого — удаляется.
+# Домены и действия потоков почти не меняются, офферы — часто.
+KEITARO_REFERENCE_TTL_DEFAULT = (600, 3600)
+KEITARO_REFERENCE_TTL = {
+    "domains": (3 * 3600, 24 * 3600),
+    "offers": (120, 1800),
+    "sources": (3600, 6 * 3600),
+    "groups": (3600, 6 * 3600),
+    "flow_actions": (6 * 3600, 24 * 3600),
+}
+# Single-flight загрузки справочников: сколько живёт блокировка лидера
+# в общем кеше и сколько остальные ждут его результата
+KEITARO_SINGLE_FLIGHT_LOCK_TTL = int(KEITARO_API_CONNECT_TIMEOUT + KEITARO_API_READ_TIMEOUT) + 5
+KEITARO_SINGLE_FLIGHT_WAIT = 15
+KEITARO_BACKGROUND_WORKERS = int(os.environ.get("KEITARO_BACKGROUND_WORKERS") or 4)
+# Сколько PUT-запросов потоков одновременно отправляет публикация кампании
+KEITARO_PUBLISH_CONCURRENCY = int(os.environ.get("KEITARO_PUBLISH_CONCURRENCY") or 5)
+# Каталог кампаний (список редактирования): через сколько секунд после синхронизации
+# страница обновляет его в фоне, сколько кампаний на странице и сколько живёт
+# закешированный фрагмент страницы (ключ включает версию каталога)
+KEITARO_CAMPAIGN_CATALOG_TTL = int(os.environ.get("KEITARO_CAMPAIGN_CATALOG_TTL") or 300)
+KEITARO_CAMPAIGNS_PAGE_SIZE = int(os.environ.get("KEITARO_CAMPAIGNS_PAGE_SIZE") or 50)
+KEITARO_CAMPAIGN_FRAGMENT_TTL = int(os.environ.get("KEITARO_CAMPAIGN_FRAGMENT_TTL") or 600)
+# Outbox отправки потоков: пауза перед повтором удваивается от RETRY_DELAY до
+# MAX_RETRY_DELAY, после MAX_ATTEMPTS попыток отправка помечается failed.
+# LEASE — сколько секунд запись принадлежит воркеру, прежде чем её заберёт другой
+KEITARO_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("KEITARO_OUTBOX_MAX_ATTEMPTS") or 8)
+KEITARO_OUTBOX_RETRY_DELAY = int(os.environ.get("KEITARO_OUTBOX_RETRY_DELAY") or 5)
+KEITARO_OUTBOX_MAX_RETRY_DELAY = int(os.environ.get("KEITARO_OUTBOX_MAX_RETRY_DELAY") or 600)
+KEITARO_OUTBOX_LEASE = int(os.environ.get("KEITARO_OUTBOX_LEASE") or 120)
+# Общие для всех процессов лимиты запросов к Keitaro по классам эндпоинтов
+# (GET — read, POST/PUT — write): запросов в секунду, допустимый всплеск и
+# сколько запросов одновременно в полёте; 0 отключает ограничение.
+# Запрос ждёт своей очереди до KEITARO_RATE_LIMIT_WAIT секунд.
+KEITARO_RATE_LIMITS = {
+    "read": (
+        float(os.environ.get("KEITARO_READ_RATE") or 10),
+        int(os.environ.get("KEITARO_READ_BURST") or 20),
+        int(os.environ.get("KEITARO_READ_MAX_IN_FLIGHT") or 10),
+    ),
+    "write": (
+        float(os.environ.get("KEITARO_WRITE_RATE") or 5),
+        int(os.environ.get("KEITARO_WRITE_BURST") or 10),
+        int(os.environ.get("KEITARO_WRITE_MAX_IN_FLIGHT") or 5),
+    ),
+}
+KEITARO_RATE_LIMIT_WAIT = float(os.environ.get("KEITARO_RATE_LIMIT_WAIT") or 30)
+# Место в семафоре освобождается само, если процесс умер, не вернув его
+KEITARO_RATE_LIMIT_LEASE = int(KEITARO_API_CONNECT_TIMEOUT + KEITARO_API_READ_TIMEOUT) + 5
+# Каталог для метрик Prometheus всех воркеров (multiprocess-режим prometheus_client);
+# без него /metrics отдаёт метрики только обработавшего запрос процесса
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
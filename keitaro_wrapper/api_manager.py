@@ -1,9 +1,32 @@
+import hashlib
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from json import JSONDecodeError
-from typing import Any
+from typing import Any, Callable, Literal
 
 import requests
-from adrobot.settings import KEITARO_API_HOST, KEITARO_API_TOKEN
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from adrobot.settings import (
+    KEITARO_API_HOST,
+    KEITARO_API_TOKEN,
+    KEITARO_API_POOL_SIZE,
+    KEITARO_API_CONNECT_TIMEOUT,
+    KEITARO_API_READ_TIMEOUT,
+    KEITARO_NEGATIVE_CACHE_TTL,
+    KEITARO_NEGATIVE_CACHE_MAX_TTL,
+    KEITARO_CIRCUIT_PROBE_TTL,
+    KEITARO_SNAPSHOT_TTL,
+    KEITARO_VALIDATORS_MAX_ENTRIES,
+)
+from . import metrics
+from .background import closing_connections
+from .rate_limit import RateLimitTimeout, endpoint_class, limited
 from .types import (
     Offer,
     Domain,
@@ -18,16 +41,230 @@ from .types import (
 )
 
 
+class EndpointBackoff(Exception):
+    """
+    Цепь эндпоинта разомкнута: он недавно отвечал ошибкой, и повторный запрос
+    отложен до retry_at (или уже идёт пробный запрос другого процесса).
+    """
+
+    def __init__(self, url: str, retry_at: float):
+        super().__init__(f"{url} failed recently, next attempt in {max(0, retry_at - time.time()):.0f}s")
+        self.url = url
+        self.retry_at = retry_at
+
+
+@dataclass
+class FetchResult:
+    """
+    Результат запроса: данные (возможно, пустые) или ошибка.
+    Для GET not_modified — тело не изменилось с прошлого запроса к этому URL
+    в этом процессе, data — тот же объект, что и в прошлый раз.
+    stale — запрос не удался (error), но data — последний успешный ответ
+    эндпоинта, полученный в fetched_at (unix time).
+    """
+    data: Any = None
+    error: Exception | None = None
+    not_modified: bool = False
+    stale: bool = False
+    fetched_at: float | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def empty(self) -> bool:
+        return self.ok and not self.data
+
+    @property
+    def status(self) -> Literal["ok", "empty", "stale", "error"]:
+        if not self.ok:
+            return "stale" if self.stale else "error"
+        return "empty" if self.empty else "ok"
+
+
+@dataclass
+class _Validators:
+    """Валидаторы последнего ответа по URL и уже разобранное тело."""
+    etag: str | None
+    last_modified: str | None
+    body_hash: str
+    data: Any
+
+
+# Последние ответы GET по URL (LRU), общие для всех менеджеров процесса
+_validators: OrderedDict[str, _Validators] = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def _get_validators(url: str) -> _Validators | None:
+    with _validators_lock:
+        known = _validators.get(url)
+        if known is not None:
+            _validators.move_to_end(url)
+        return known
+
+
+def _store_validators(url: str, validators: _Validators) -> None:
+    with _validators_lock:
+        _validators[url] = validators
+        _validators.move_to_end(url)
+        while len(_validators) > KEITARO_VALIDATORS_MAX_ENTRIES:
+            _validators.popitem(last=False)
+
+
+def forget_validators(url: str) -> None:
+    """Следующий запрос к url скачает и разберёт тело заново."""
+    with _validators_lock:
+        _validators.pop(url, None)
+
+
+def clear_validators() -> None:
+    with _validators_lock:
+        _validators.clear()
+
+
+def conditional_headers(headers: dict[str, str], known: _Validators | None) -> dict[str, str]:
+    """Добавляет к заголовкам валидаторы прошлого ответа, если они есть."""
+    if known is not None:
+        if known.etag:
+            headers["If-None-Match"] = known.etag
+        if known.last_modified:
+            headers["If-Modified-Since"] = known.last_modified
+    return headers
+
+
+def read_conditional(url: str, known: _Validators | None, response) -> tuple[APIResponse, bool]:
+    """
+    Разбирает ответ условного GET (requests или httpx) и запоминает его валидаторы.
+    Возвращает (данные, не изменились ли они).
+    """
+    if known is not None and response.status_code == 304:
+        return known.data, True
+    response.raise_for_status()
+
+    body_hash = hashlib.sha256(response.content).hexdigest()
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if known is not None and known.body_hash == body_hash:
+        data, not_modified = known.data, True
+    else:
+        data, not_modified = response.json(), False
+    _store_validators(url, _Validators(etag, last_modified, body_hash, data))
+    return data, not_modified
+
+
+def failure_key(url: str, method: str = "GET") -> str:
+    # Чтение и запись эндпоинта ломаются независимо (как и лимитируются): у каждого своя цепь
+    return f"keitaro_api_failure:{endpoint_class(method)}:{url}"
+
+
+def next_failure(previous: dict | None, now: float) -> tuple[dict, int]:
+    """Запись отрицательного кеша после очередного сбоя и её TTL: пауза удваивается до MAX_TTL."""
+    failures = (previous["failures"] if previous else 0) + 1
+    delay = min(KEITARO_NEGATIVE_CACHE_TTL * 2 ** (failures - 1), KEITARO_NEGATIVE_CACHE_MAX_TTL)
+    # Запись живёт дольше паузы, чтобы следующий сбой продолжил рост задержки
+    return {"failures": failures, "retry_at": now + delay}, delay + KEITARO_NEGATIVE_CACHE_MAX_TTL
+
+
+def probe_key(url: str, method: str = "GET") -> str:
+    return f"keitaro_api_probe:{endpoint_class(method)}:{url}"
+
+
+def snapshot_key(url: str) -> str:
+    return f"keitaro_api_snapshot:{url}"
+
+
+def breaks_circuit(exc: Exception) -> bool:
+    """
+    Считается ли ошибка записи сбоем эндпоинта: сеть, таймаут, 5xx или 429.
+    Остальные 4xx — ошибка самого запроса, а не недоступность Keitaro.
+    """
+    if isinstance(exc, (JSONDecodeError, RateLimitTimeout)):
+        return False
+    response = getattr(exc, "response", None)
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+
+def fresh_snapshots(urls: dict[str, str], results: dict[str, FetchResult], now: float) -> dict[str, dict]:
+    """Записи кеша для новых успешных ответов; на 304 снимок уже лежит в кеше."""
+    return {
+        snapshot_key(urls[name]): {"data": result.data, "fetched_at": now}
+        for name, result in results.items()
+        if result.ok and not result.not_modified
+    }
+
+
+def stale_results(
+    urls: dict[str, str],
+    results: dict[str, FetchResult],
+    snapshots: dict[str, dict],
+) -> dict[str, FetchResult]:
+    """Неудавшиеся запросы, для которых есть снимок, как stale-результаты."""
+    stale = {}
+    for name, result in results.items():
+        snapshot = snapshots.get(snapshot_key(urls[name]))
+        if not result.ok and snapshot is not None:
+            stale[name] = FetchResult(
+                data=snapshot["data"], error=result.error, stale=True, fetched_at=snapshot["fetched_at"],
+            )
+    return stale
+
+
+def count_cache_lookups(api_host: str, urls: dict[str, str], results: dict[str, FetchResult]) -> None:
+    """
+    Метрики кешей по итогам запросов: для полученных ответов — валидаторы
+    (hit — тело не изменилось), для неудавшихся — снимки последних ответов.
+    """
+    for name, result in results.items():
+        endpoint = metrics.endpoint_label(urls[name].removeprefix(api_host))
+        if result.ok:
+            metrics.count_cache("validators", endpoint, "hit" if result.not_modified else "miss")
+        else:
+            metrics.count_cache("snapshot", endpoint, "stale" if result.stale else "miss")
+
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Возвращает общий для процесса requests.Session с пулом keep-alive соединений.
+    После fork (воркеры gunicorn) сессия создаётся заново, чтобы не делить сокеты.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session(KEITARO_API_POOL_SIZE)
+                _session_pid = pid
+    return _session
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class KeitaroAPIManager:
 
     def __init__(
         self,
         api_host=KEITARO_API_HOST,
-        api_token = KEITARO_API_TOKEN
+        api_token = KEITARO_API_TOKEN,
+        session: requests.Session | None = None,
+        timeout: tuple[float, float] = (KEITARO_API_CONNECT_TIMEOUT, KEITARO_API_READ_TIMEOUT)
     ):
         self.api_host = api_host
         self.api_token = api_token
+        self.session = session or get_session()
+        self.timeout = timeout
 
     def get_offers(self) -> list[Offer]:
         url = f"{self.api_host}offers"
@@ -66,6 +303,42 @@ class KeitaroAPIManager:
         url = f"{self.api_host}campaigns/{campaign_id}/streams"
         return self._send_get_request(url)
 
+    def fetch_campaign(self, campaign_id: int) -> FetchResult:
+        return self.fetch(f"campaigns/{campaign_id}")
+
+    def fetch_flows(self, campaign_id: int) -> FetchResult:
+        return self.fetch(f"campaigns/{campaign_id}/streams")
+
+    def fetch_offers(self) -> FetchResult:
+        return self.fetch("offers")
+
+    def forget(self, path: str) -> None:
+        """Сбрасывает валидаторы эндпоинта, например если обработка его данных упала."""
+        forget_validators(f"{self.api_host}{path}")
+
+    def fetch(self, path: str) -> FetchResult:
+        """GET одного эндпоинта (путь относительно api_host) с типизированным результатом."""
+        return self.fetch_many({path: path})[path]
+
+    def fetch_many(
+        self,
+        endpoints: dict[str, str],
+        max_workers: int | None = None
+    ) -> dict[str, FetchResult]:
+        """
+        Параллельно выполняет независимые GET-запросы ({имя: путь относительно api_host}).
+        Ошибка одного ресурса не влияет на остальные.
+        """
+        urls = {name: f"{self.api_host}{path}" for name, path in endpoints.items()}
+        return self._fetch_urls(urls, max_workers)
+
+    def send(self, method: str, path: str, payload: dict[str, Any]) -> FetchResult:
+        """
+        POST/PUT одного эндпоинта (путь относительно api_host) с типизированным
+        результатом: по error видно, чем кончился запрос, которому не вернулись данные.
+        """
+        return self._send_write(method, getattr(self.session, method.lower()), f"{self.api_host}{path}", payload)
+
     def create_campaign(self, payload: CampaignPayload) -> dict[str, Any] | None:
         url = f"{self.api_host}campaigns"
         return self._send_post_request(url, payload)
@@ -83,51 +356,189 @@ class KeitaroAPIManager:
             url: str,
             payload: dict[str, Any]
     ) -> APIResponse | None:
-        headers = self._get_auth_headers()
-        headers["Content-Type"] = "application/json"
-        try:
-            response = requests.put(url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except JSONDecodeError:
-            logging.warning(f"Failed to decode JSON from {url}")
-        except requests.exceptions.RequestException as exc:
-            logging.warning(f"PUT request to {url} failed: {exc}")
-        return None
+        return self._send_write("PUT", self.session.put, url, payload).data
 
     def _send_post_request(
             self,
             url: str,
             payload: dict[str, Any]
     ) -> APIResponse | None:
+        return self._send_write("POST", self.session.post, url, payload).data
+
+    def _send_write(
+            self,
+            method: str,
+            send: Callable[..., requests.Response],
+            url: str,
+            payload: dict[str, Any]
+    ) -> FetchResult:
+        """POST/PUT через circuit breaker эндпоинта: при разомкнутой цепи сразу ошибка EndpointBackoff."""
+        key = failure_key(url, method)
+        failure = cache.get(key)
+        endpoint = self._endpoint(url)
+        backoff = self._open_circuit(url, failure, time.time(), method)
+        if backoff is not None:
+            metrics.count_short_circuit(endpoint, method)
+            logging.warning(f"{method} request to {url} skipped: {backoff}")
+            return FetchResult(error=backoff)
+        if failure:
+            metrics.count_retry(endpoint, method)
+
         headers = self._get_auth_headers()
         headers["Content-Type"] = "application/json"
-
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            with limited("write"), metrics.track_request(endpoint, method) as call:
+                response = send(url, headers=headers, json=payload, timeout=self.timeout)
+                call.status = response.status_code
             response.raise_for_status()
-            return response.json()
-        except JSONDecodeError:
+            result = FetchResult(data=response.json())
+        except JSONDecodeError as exc:
             logging.warning(f"Failed to decode JSON from {url}")
-        except requests.exceptions.RequestException as exc:
-            logging.warning(f"POST request to {url} failed: {exc}")
-        return None
+            result = FetchResult(error=exc)
+        except (requests.exceptions.RequestException, RateLimitTimeout) as exc:
+            logging.warning(f"{method} request to {url} failed: {exc}")
+            if breaks_circuit(exc):
+                cache.set(key, *next_failure(failure, time.time()))
+            elif failure and not isinstance(exc, RateLimitTimeout):
+                cache.delete(key)
+            return FetchResult(error=exc)
+        finally:
+            if failure:
+                cache.delete(probe_key(url, method))
+        if failure:
+            cache.delete(key)
+        return result
 
     def _send_get_request(
         self,
         url: str,
     ) -> APIResponse:
-        headers = self._get_auth_headers()
-        headers["Content-Type"] = "application/json"
+        result = self._fetch_urls({url: url})[url]
+        if not (result.ok or result.stale):
+            return []
+        return result.data
+
+    def _fetch_urls(
+        self,
+        urls: dict[str, str],
+        max_workers: int | None = None
+    ) -> dict[str, FetchResult]:
+        """
+        Выполняет GET-запросы через circuit breaker эндпоинтов: к эндпоинту с
+        разомкнутой цепью запрос не отправляется. Неудавшиеся запросы отдают
+        последний успешный ответ эндпоинта (stale), если он сохранён.
+        Кеш читается и пишется только в вызывающем потоке: потоки пула работают лишь
+        с HTTP и общими лимитами запросов.
+        """
+        if not urls:
+            return {}
+        failure_keys = {name: self._failure_key(url) for name, url in urls.items()}
+        failures = cache.get_many(failure_keys.values())
+
+        now = time.time()
+        results = {}
+        allowed = {}
+        for name, url in urls.items():
+            failure = failures.get(failure_keys[name])
+            backoff = self._open_circuit(url, failure, now)
+            if backoff is not None:
+                metrics.count_short_circuit(self._endpoint(url), "GET")
+                results[name] = FetchResult(error=backoff)
+            else:
+                if failure:
+                    metrics.count_retry(self._endpoint(url), "GET")
+                allowed[name] = url
+
+        if len(allowed) == 1:
+            fetched = {name: self._fetch_url(url) for name, url in allowed.items()}
+        elif allowed:
+            workers = max_workers or min(len(allowed), KEITARO_API_POOL_SIZE)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {name: executor.submit(closing_connections, self._fetch_url, url) for name, url in allowed.items()}
+            fetched = {name: future.result() for name, future in futures.items()}
+        else:
+            fetched = {}
+
+        failed = {}
+        recovered = []
+        for name, result in fetched.items():
+            key = failure_keys[name]
+            # Исчерпанный собственный лимит — ни сбой, ни ответ эндпоинта: цепь не трогаем
+            if isinstance(result.error, RateLimitTimeout):
+                continue
+            if not result.ok:
+                failed[key] = failures.get(key)
+            elif key in failures:
+                recovered.append(key)
+        self._record_failures(failed, recovered)
+        probes = [probe_key(url) for name, url in allowed.items() if failure_keys[name] in failures]
+        if probes:
+            cache.delete_many(probes)
+
+        results.update(fetched)
+        fresh = fresh_snapshots(urls, results, time.time())
+        if fresh:
+            cache.set_many(fresh, KEITARO_SNAPSHOT_TTL)
+        if not all(result.ok for result in results.values()):
+            snapshots = cache.get_many([snapshot_key(urls[name]) for name, result in results.items() if not result.ok])
+            results.update(stale_results(urls, results, snapshots))
+        count_cache_lookups(self.api_host, urls, results)
+        return results
+
+    def _fetch_url(self, url: str) -> FetchResult:
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except JSONDecodeError:
+            data, not_modified = self._get_json(url)
+            return FetchResult(data=data, not_modified=not_modified)
+        except JSONDecodeError as exc:
             logging.warning(f"Failed to decode JSON from {url}")
-        except requests.exceptions.RequestException as exc:
+            return FetchResult(error=exc)
+        except (requests.exceptions.RequestException, RateLimitTimeout) as exc:
             logging.warning(f"Request to {url} failed: {exc}")
-        return []
+            return FetchResult(error=exc)
+
+    @staticmethod
+    def _record_failures(failed: dict[str, dict | None], recovered: list[str]) -> None:
+        """Экспоненциально увеличивает паузу для упавших эндпоинтов и сбрасывает её для восстановившихся."""
+        now = time.time()
+        for key, previous in failed.items():
+            cache.set(key, *next_failure(previous, now))
+        if recovered:
+            cache.delete_many(recovered)
+
+    @staticmethod
+    def _failure_key(url: str, method: str = "GET") -> str:
+        return failure_key(url, method)
+
+    def _endpoint(self, url: str) -> str:
+        return metrics.endpoint_label(url.removeprefix(self.api_host))
+
+    @staticmethod
+    def _open_circuit(url: str, failure: dict | None, now: float, method: str = "GET") -> EndpointBackoff | None:
+        """
+        Ошибка быстрого отказа, если цепь эндпоинта разомкнута, иначе None.
+        Когда пауза истекла, цепь полуоткрыта: запрос пропускается только у того,
+        кто первым занял пробную блокировку.
+        """
+        if not failure:
+            return None
+        if failure["retry_at"] <= now and cache.add(probe_key(url, method), os.getpid(), KEITARO_CIRCUIT_PROBE_TTL):
+            return None
+        return EndpointBackoff(url, failure["retry_at"])
+
+    def _get_json(self, url: str) -> tuple[APIResponse, bool]:
+        """
+        Условный GET: отправляет валидаторы прошлого ответа, если они есть.
+        Keitaro отвечает 304 не везде, поэтому неизменность тела проверяется
+        ещё и по sha256 — совпавшее тело не разбирается повторно.
+        Возвращает (данные, не изменились ли они).
+        """
+        headers = self._get_auth_headers()
+        headers["Content-Type"] = "application/json"
+        known = _get_validators(url)
+        with limited("read"), metrics.track_request(self._endpoint(url), "GET") as call:
+            response = self.session.get(url, headers=conditional_headers(headers, known), timeout=self.timeout)
+            call.status = response.status_code
+        return read_conditional(url, known, response)
 
     def _get_auth_headers(self):
         return {"Api-Key": self.api_token}
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+Асинхронный клиент Keitaro для async-представлений под ASGI.
+
+Ожидание ответа Keitaro не занимает ни воркер, ни поток: один процесс держит
+одновременно до KEITARO_API_ASYNC_MAX_CONNECTIONS запросов (в пределах общих
+лимитов rate_limit). Поведение то же, что у KeitaroAPIManager: circuit breaker
+эндпоинтов и снимки последних успешных ответов (общий кеш Django), условные
+GET с валидаторами процесса, None/[] вместо исключений.
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from json import JSONDecodeError
+from typing import Any
+
+import httpx
+from django.core.cache import cache
+
+from adrobot.settings import (
+    KEITARO_API_ASYNC_MAX_CONNECTIONS,
+    KEITARO_API_CONNECT_TIMEOUT,
+    KEITARO_API_HOST,
+    KEITARO_API_POOL_SIZE,
+    KEITARO_API_READ_TIMEOUT,
+    KEITARO_API_TOKEN,
+    KEITARO_CIRCUIT_PROBE_TTL,
+    KEITARO_SNAPSHOT_TTL,
+)
+from .api_manager import (
+    EndpointBackoff,
+    FetchResult,
+    _get_validators,
+    breaks_circuit,
+    conditional_headers,
+    count_cache_lookups,
+    failure_key,
+    forget_validators,
+    fresh_snapshots,
+    next_failure,
+    probe_key,
+    read_conditional,
+    snapshot_key,
+    stale_results,
+)
+from . import metrics
+from .rate_limit import RateLimitTimeout, alimited, endpoint_class
+from .types import APIResponse, Campaign, CampaignPayload, Flow, FlowPayload
+
+
+# httpx.AsyncClient привязан к event loop, поэтому клиент — один на loop
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Общий для event loop клиент с пулом keep-alive соединений."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _build_client(KEITARO_API_ASYNC_MAX_CONNECTIONS)
+        _clients[loop] = client
+    return client
+
+
+def _build_client(max_connections: int) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=KEITARO_API_POOL_SIZE,
+        ),
+        timeout=httpx.Timeout(KEITARO_API_READ_TIMEOUT, connect=KEITARO_API_CONNECT_TIMEOUT),
+    )
+
+
+class AsyncKeitaroAPIManager:
+
+    def __init__(
+        self,
+        api_host=KEITARO_API_HOST,
+        api_token=KEITARO_API_TOKEN,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.api_host = api_host
+        self.api_token = api_token
+        self.client = client or get_async_client()
+
+    async def get_campaigns(self) -> list[Campaign]:
+        return await self._send_get_request(f"{self.api_host}campaigns")
+
+    async def get_campaign(self, campaign_id: int) -> Campaign:
+        return await self._send_get_request(f"{self.api_host}campaigns/{campaign_id}")
+
+    async def get_flows(self, campaign_id: int) -> list[Flow]:
+        return await self._send_get_request(f"{self.api_host}campaigns/{campaign_id}/streams")
+
+    async def fetch_campaign(self, campaign_id: int) -> FetchResult:
+        return await self.fetch(f"campaigns/{campaign_id}")
+
+    async def fetch_flows(self, campaign_id: int) -> FetchResult:
+        return await self.fetch(f"campaigns/{campaign_id}/streams")
+
+    async def fetch_offers(self) -> FetchResult:
+        return await self.fetch("offers")
+
+    def forget(self, path: str) -> None:
+        """Сбрасывает валидаторы эндпоинта, например если обработка его данных упала."""
+        forget_validators(f"{self.api_host}{path}")
+
+    async def fetch(self, path: str) -> FetchResult:
+        """GET одного эндпоинта (путь относительно api_host) с типизированным результатом."""
+        return (await self.fetch_many({path: path}))[path]
+
+    async def fetch_many(self, endpoints: dict[str, str]) -> dict[str, FetchResult]:
+        """
+        Одновременно выполняет независимые GET-запросы ({имя: путь относительно api_host}).
+        Ошибка одного ресурса не влияет на остальные.
+        """
+        urls = {name: f"{self.api_host}{path}" for name, path in endpoints.items()}
+        return await self._fetch_urls(urls)
+
+    async def create_campaign(self, payload: CampaignPayload) -> dict[str, Any] | None:
+        return await self._send("POST", f"{self.api_host}campaigns", payload)
+
+    async def create_flow(self, payload: FlowPayload) -> dict[str, Any] | None:
+        return await self._send("POST", f"{self.api_host}streams", payload)
+
+    async def update_flow(self, flow_id: int, payload: FlowPayload) -> list[Flow]:
+        return await self._send("PUT", f"{self.api_host}streams/{flow_id}", payload)
+
+    async def _send(self, method: str, url: str, payload: dict[str, Any]) -> APIResponse | None:
+        """POST/PUT через circuit breaker эндпоинта: при разомкнутой цепи сразу None."""
+        key = failure_key(url, method)
+        failure = await cache.aget(key)
+        endpoint = self._endpoint(url)
+        backoff = await self._open_circuit(url, failure, time.time(), method)
+        if backoff is not None:
+            metrics.count_short_circuit(endpoint, method)
+            logging.warning(f"{method} request to {url} skipped: {backoff}")
+            return None
+        if failure:
+            metrics.count_retry(endpoint, method)
+
+        headers = self._get_auth_headers()
+        headers["Content-Type"] = "application/json"
+        try:
+            async with alimited(endpoint_class(method)):
+                with metrics.track_request(endpoint, method) as call:
+                    response = await self.client.request(method, url, headers=headers, json=payload)
+                    call.status = response.status_code
+            response.raise_for_status()
+            data = response.json()
+        except JSONDecodeError:
+            logging.warning(f"Failed to decode JSON from {url}")
+            data = None
+        except (httpx.HTTPError, RateLimitTimeout) as exc:
+            logging.warning(f"{method} request to {url} failed: {exc}")
+            if breaks_circuit(exc):
+                await cache.aset(key, *next_failure(failure, time.time()))
+            elif failure and not isinstance(exc, RateLimitTimeout):
+                await cache.adelete(key)
+            return None
+        finally:
+            if failure:
+                await cache.adelete(probe_key(url, method))
+        if failure:
+            await cache.adelete(key)
+        return data
+
+    async def _send_get_request(self, url: str) -> APIResponse:
+        result = (await self._fetch_urls({url: url}))[url]
+        if not (result.ok or result.stale):
+            return []
+        return result.data
+
+    async def _fetch_urls(self, urls: dict[str, str]) -> dict[str, FetchResult]:
+        """
+        Выполняет GET-запросы через circuit breaker эндпоинтов; неудавшиеся
+        отдают последний успешный ответ (stale), если он сохранён.
+        """
+        if not urls:
+            return {}
+        failure_keys = {name: failure_key(url) for name, url in urls.items()}
+        failures = await cache.aget_many(failure_keys.values())
+
+        now = time.time()
+        results = {}
+        allowed = {}
+        for name, url in urls.items():
+            failure = failures.get(failure_keys[name])
+            backoff = await self._open_circuit(url, failure, now)
+            if backoff is not None:
+                metrics.count_short_circuit(self._endpoint(url), "GET")
+                results[name] = FetchResult(error=backoff)
+            else:
+                if failure:
+                    metrics.count_retry(self._endpoint(url), "GET")
+                allowed[name] = url
+
+        fetched = dict(zip(allowed, await asyncio.gather(*map(self._fetch_url, allowed.values()))))
+
+        now = time.time()
+        recovered = []
+        for name, result in fetched.items():
+            key = failure_keys[name]
+            # Исчерпанный собственный лимит — ни сбой, ни ответ эндпоинта: цепь не трогаем
+            if isinstance(result.error, RateLimitTimeout):
+                continue
+            if not result.ok:
+                await cache.aset(key, *next_failure(failures.get(key), now))
+            elif key in failures:
+                recovered.append(key)
+        if recovered:
+            await cache.adelete_many(recovered)
+        probes = [probe_key(url) for name, url in allowed.items() if failure_keys[name] in failures]
+        if probes:
+            await cache.adelete_many(probes)
+
+        results.update(fetched)
+        fresh = fresh_snapshots(urls, results, time.time())
+        if fresh:
+            await cache.aset_many(fresh, KEITARO_SNAPSHOT_TTL)
+        if not all(result.ok for result in results.values()):
+            snapshots = await cache.aget_many(
+                [snapshot_key(urls[name]) for name, result in results.items() if not result.ok]
+            )
+            results.update(stale_results(urls, results, snapshots))
+        count_cache_lookups(self.api_host, urls, results)
+        return results
+
+    @staticmethod
+    async def _open_circuit(url: str, failure: dict | None, now: float, method: str = "GET") -> EndpointBackoff | None:
+        """KeitaroAPIManager._open_circuit для async-кода."""
+        if not failure:
+            return None
+        if failure["retry_at"] <= now and await cache.aadd(probe_key(url, method), os.getpid(), KEITARO_CIRCUIT_PROBE_TTL):
+            return None
+        return EndpointBackoff(url, failure["retry_at"])
+
+    async def _fetch_url(self, url: str) -> FetchResult:
+        try:
+            data, not_modified = await self._get_json(url)
+            return FetchResult(data=data, not_modified=not_modified)
+        except JSONDecodeError as exc:
+            logging.warning(f"Failed to decode JSON from {url}")
+            return FetchResult(error=exc)
+        except (httpx.HTTPError, RateLimitTimeout) as exc:
+            logging.warning(f"Request to {url} failed: {exc}")
+            return FetchResult(error=exc)
+
+    async def _get_json(self, url: str) -> tuple[APIResponse, bool]:
+        """Условный GET, как KeitaroAPIManager._get_json."""
+        headers = self._get_auth_headers()
+        headers["Content-Type"] = "application/json"
+        known = _get_validators(url)
+        async with alimited("read"):
+            with metrics.track_request(self._endpoint(url), "GET") as call:
+                response = await self.client.get(url, headers=conditional_headers(headers, known))
+                call.status = response.status_code
+        return read_conditional(url, known, response)
+
+    def _endpoint(self, url: str) -> str:
+        return metrics.endpoint_label(url.removeprefix(self.api_host))
+
+    def _get_auth_headers(self):
+        # requests молча пропускает заголовки со значением None, httpx — падает
+        return {"Api-Key": self.api_token} if self.api_token is not None else {}
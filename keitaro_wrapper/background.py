@@ -0,0 +1,50 @@
+"""Фоновое выполнение коротких задач внутри процесса (воркера gunicorn)."""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.db import connections
+
+from adrobot.settings import KEITARO_BACKGROUND_WORKERS
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков создаётся лениво и заново после fork."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=KEITARO_BACKGROUND_WORKERS,
+                    thread_name_prefix="keitaro-bg",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """Запускает fn в фоне; соединения с БД потока закрываются по завершении."""
+    return get_executor().submit(_run, fn, *args, **kwargs)
+
+
+def closing_connections(fn, *args, **kwargs):
+    """Для задач пула потоков: соединения с БД, открытые fn, закрываются по завершении."""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+def _run(fn, *args, **kwargs):
+    try:
+        return closing_connections(fn, *args, **kwargs)
+    except Exception:
+        logging.exception(f"Background task {getattr(fn, '__name__', fn)} failed")
+        raise
@@ -0,0 +1,276 @@
+"""
+Бенчмарки горячих путей редактора на синтетических кампаниях.
+
+Кампания размера N — это N потоков и N офферов: у «целевого» потока (первого)
+все N офферов, у остальных — по OFFERS_PER_FLOW. Для каждого пути и размера
+замеряются время, число запросов к БД и пик памяти Python (tracemalloc) на один
+запрос к представлению; подготовка данных в замер не входит. Ответ Keitaro
+подменяется, сеть не используется. Каждый прогон выполняется в транзакции,
+которая откатывается, поэтому бенчмарки не оставляют данных и не видят
+друг друга. Строки с keitaro id 1..N пишутся поверх существующих, поэтому
+замеры работают только в тестовой БД (test_*): команда benchmark_views
+создаёт её сама, как manage.py test.
+
+Бюджеты лежат в benchmark_budgets.json: число запросов — ровно замеренное,
+время и память — с запасом (TIME_HEADROOM, MEMORY_HEADROOM, но не меньше
+минимумов, чтобы не ловить шум на маленьких размерах). Перезаписываются
+командой manage.py benchmark_views --record, проверяются ей же
+и тестами keitaro_wrapper.tests.test_benchmarks: число запросов — в обычном
+прогоне, время и память — только с RUN_BENCHMARKS=1 (они зависят от машины).
+"""
+import gc
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+from unittest.mock import MagicMock, patch
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .api_manager import FetchResult
+from .models import Flow, OfferFlow
+from .sync import QueryCounter, mirror_offers, sync_campaign_flows
+
+
+SIZES = (10, 100, 1000)
+OFFERS_PER_FLOW = 10
+CAMPAIGN_ID = 1
+TARGET_FLOW_ID = 1
+BUDGETS_PATH = Path(__file__).with_name("benchmark_budgets.json")
+
+TIME_HEADROOM = 3.0
+MIN_SECONDS = 0.05
+MEMORY_HEADROOM = 1.5
+MIN_PEAK_KIB = 512
+
+
+@dataclass
+class Measurement:
+    seconds: float
+    queries: int
+    peak_kib: int
+
+
+@dataclass
+class SyntheticCampaign:
+    flows: list[dict]
+    offers: list[dict]
+
+
+def synthetic_campaign(size: int) -> SyntheticCampaign:
+    """Ответы Keitaro для кампании из size потоков и size офферов."""
+    offers = [{"id": offer_id, "name": f"Offer {offer_id}"} for offer_id in range(1, size + 1)]
+    flows = []
+    for flow_id in range(1, size + 1):
+        count = size if flow_id == TARGET_FLOW_ID else min(OFFERS_PER_FLOW, size)
+        offer_ids = [(flow_id + n) % size + 1 for n in range(count)]
+        flows.append({
+            "id": flow_id, "name": f"Flow {flow_id}", "type": "regular", "campaign_id": CAMPAIGN_ID,
+            "position": flow_id, "action_options": {}, "comments": "", "state": "active",
+            "action_type": "", "action_payload": "", "schema": "", "collect_clicks": False,
+            "filter_or": False, "weight": 100, "offer_selection": "", "filters": [],
+            "triggers": [], "landings": [], "updated_at": "2025-01-01 10:00:00",
+            "offers": [{"offer_id": offer_id, "share": 100 // count, "state": "active"} for offer_id in offer_ids],
+        })
+    return SyntheticCampaign(flows, offers)
+
+
+@dataclass
+class Benchmark:
+    """prepare готовит БД (не замеряется), request — замеряемый запрос к представлению."""
+    name: str
+    request: Callable[[Client, SyntheticCampaign], HttpResponse]
+    prepare: Callable[[SyntheticCampaign], None] = lambda campaign: None
+
+
+def _mirror(campaign: SyntheticCampaign) -> None:
+    mirror_offers(campaign.offers)
+    sync_campaign_flows(campaign.flows)
+
+
+def _campaign_flows(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    api = _fake_api(fetch_flows=FetchResult(data=campaign.flows))
+    with patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", return_value=api):
+        return client.get(reverse("keitaro_wrapper:campaign_streams", args=[CAMPAIGN_ID]))
+
+
+def _offers(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    api = _fake_api(fetch_offers=FetchResult(data=campaign.offers))
+    with patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", return_value=api):
+        return client.get(reverse("keitaro_wrapper:offers"))
+
+
+def _offer_flows(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    return client.get(reverse("keitaro_wrapper:offer_flows", args=[TARGET_FLOW_ID]))
+
+
+def _offer_flow_update(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    return client.post(
+        reverse("keitaro_wrapper:flow_update_offer", args=[TARGET_FLOW_ID]),
+        data={"offer_id": campaign.offers[-1]["id"], "share": 40, "state": "pending_add", "is_pinned": True},
+        content_type="application/json",
+    )
+
+
+def _flow_update(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    return client.put(reverse("keitaro_wrapper:flow_update", args=[TARGET_FLOW_ID]))
+
+
+def _flow_update_dry_run(client: Client, campaign: SyntheticCampaign) -> HttpResponse:
+    return client.put(reverse("keitaro_wrapper:flow_update", args=[TARGET_FLOW_ID]) + "?dry_run=1")
+
+
+def _stage_changes(campaign: SyntheticCampaign) -> None:
+    """Правки целевого потока, которые dry_run покажет в diff."""
+    _mirror(campaign)
+    # Фильтр по flow_id, а не по JOIN: у только что вставленных строк ещё нет
+    # статистики, и план с подзапросом на 1000 потоков выполняется десятки секунд
+    flow = Flow.objects.get(keitaro_flow_id=TARGET_FLOW_ID)
+    OfferFlow.objects.filter(flow=flow).update(share=F("share") + 1, state="pending_add")
+
+
+def _fake_api(**results: FetchResult) -> MagicMock:
+    api = MagicMock()
+    for method, result in results.items():
+        getattr(api, method).side_effect = _returning(result)
+    return api
+
+
+def _returning(value: Any):
+    async def method(*args, **kwargs):
+        return value
+    return method
+
+
+BENCHMARKS = [
+    Benchmark("campaign_flows_cold", _campaign_flows),
+    Benchmark("campaign_flows_warm", _campaign_flows, _mirror),
+    Benchmark("offers_cold", _offers),
+    Benchmark("offers_warm", _offers, lambda campaign: mirror_offers(campaign.offers)),
+    Benchmark("offer_flows", _offer_flows, _mirror),
+    Benchmark("offer_flow_update", _offer_flow_update, _mirror),
+    Benchmark("flow_update", _flow_update, _mirror),
+    Benchmark("flow_update_dry_run", _flow_update_dry_run, _stage_changes),
+]
+
+
+def measure(benchmark: Benchmark, size: int) -> Measurement:
+    """
+    Два прогона на свежих данных: время и запросы без tracemalloc
+    (он замедляет код в разы), затем пик памяти.
+    """
+    campaign = synthetic_campaign(size)
+    seconds, queries = _timed_run(benchmark, campaign)
+
+    with _rolled_back() as client:
+        benchmark.prepare(campaign)
+        tracemalloc.start()
+        try:
+            benchmark.request(client, campaign)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return Measurement(seconds=seconds, queries=queries, peak_kib=peak // 1024)
+
+
+def count_queries(benchmark: Benchmark, size: int) -> int:
+    """Только число SQL-запросов — оно не зависит от машины, в отличие от времени и памяти."""
+    _, queries = _timed_run(benchmark, synthetic_campaign(size))
+    return queries
+
+
+def _timed_run(benchmark: Benchmark, campaign: SyntheticCampaign) -> tuple[float, int]:
+    with _rolled_back() as client:
+        benchmark.prepare(campaign)
+        # Мусор предыдущих замеров собирается заранее: иначе полная сборка
+        # поколения 2 может прийтись на замер и добавить к нему десятки миллисекунд
+        gc.collect()
+        # QueryCounter, а не CaptureQueriesContext: журнал запросов соединения
+        # ограничен 9000 записей и на больших размерах перестаёт расти
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            response = benchmark.request(client, campaign)
+            seconds = time.perf_counter() - started
+        _check_response(benchmark, response)
+    return seconds, queries.count
+
+
+def run(sizes=SIZES, names: list[str] | None = None) -> dict[str, dict[int, Measurement]]:
+    return {
+        benchmark.name: {size: measure(benchmark, size) for size in sizes}
+        for benchmark in BENCHMARKS
+        if not names or benchmark.name in names
+    }
+
+
+def load_budgets(path: Path = BUDGETS_PATH) -> dict[str, dict[str, dict]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def record_budgets(results: dict[str, dict[int, Measurement]], path: Path = BUDGETS_PATH) -> dict:
+    """Дописывает в файл бюджеты по замерам, сохраняя бюджеты незамеренных путей."""
+    budgets = load_budgets(path)
+    for name, by_size in results.items():
+        budgets.setdefault(name, {})
+        for size, result in by_size.items():
+            budgets[name][str(size)] = budget_for(result)
+    path.write_text(json.dumps(budgets, indent=2, sort_keys=True) + "\n")
+    return budgets
+
+
+def budget_for(result: Measurement) -> dict:
+    return {
+        "queries": result.queries,
+        "seconds": round(max(result.seconds * TIME_HEADROOM, MIN_SECONDS), 3),
+        "peak_kib": int(max(result.peak_kib * MEMORY_HEADROOM, MIN_PEAK_KIB)),
+    }
+
+
+def is_throwaway_database() -> bool:
+    """Подключена ли тестовая БД (test_* или TEST.NAME), а не рабочая."""
+    settings_dict = connection.settings_dict
+    name = settings_dict["NAME"] or ""
+    return name.startswith(TEST_DATABASE_PREFIX) or name == settings_dict.get("TEST", {}).get("NAME")
+
+
+def over_budget(name: str, size: int, result: Measurement, budgets: dict) -> list[str]:
+    """Превышения бюджета; путь без записанного бюджета — тоже ошибка."""
+    budget = budgets.get(name, {}).get(str(size))
+    if budget is None:
+        return [f"{name}[{size}]: нет бюджета, запишите его через benchmark_views --record"]
+    return [
+        f"{name}[{size}]: {metric} {value} > {budget[metric]}"
+        for metric, value in asdict(result).items()
+        if value > budget[metric]
+    ]
+
+
+@contextmanager
+def _rolled_back():
+    """Клиент внутри транзакции, которая откатывается при выходе."""
+    if not is_throwaway_database():
+        raise RuntimeError(
+            f"Бенчмарки пишут синтетические потоки и офферы поверх строк с теми же keitaro id; "
+            f"БД {connection.settings_dict['NAME']!r} не тестовая"
+        )
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), transaction.atomic():
+        yield Client()
+        transaction.set_rollback(True)
+
+
+def _check_response(benchmark: Benchmark, response: HttpResponse) -> None:
+    if response.status_code >= 400:
+        raise AssertionError(f"{benchmark.name}: HTTP {response.status_code} {response.content[:200]!r}")
@@ -0,0 +1,149 @@
+"""
+Каталог кампаний для списка редактирования.
+
+Список читается только из локальной таблицы Campaign: keyset-пагинация по
+(name, id), фильтр по состоянию и поиск по началу имени или алиаса — всё по
+индексам. Каталог обновляется в фоне: страница, увидев, что с последней
+синхронизации прошло больше KEITARO_CAMPAIGN_CATALOG_TTL секунд, ставит
+refresh_catalog в background; его же по расписанию запускает
+manage.py sync_campaigns. Одновременно каталог обновляет один процесс
+(блокировка в общем кеше).
+"""
+import base64
+import binascii
+import json
+import logging
+import os
+import time
+from functools import cached_property
+
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+
+from adrobot.settings import KEITARO_CAMPAIGN_CATALOG_TTL, KEITARO_SINGLE_FLIGHT_LOCK_TTL
+from . import background, metrics
+from .api_manager import KeitaroAPIManager
+from .models import Campaign
+from .sync import CampaignSyncReport, mirror_campaigns
+
+
+SYNCED_AT_KEY = "keitaro_campaign_catalog:synced_at"
+LOCK_KEY = "keitaro_campaign_catalog:lock"
+STATES = {value for value, _ in Campaign._meta.get_field("state").choices}
+
+
+def refresh_catalog(api: KeitaroAPIManager | None = None) -> CampaignSyncReport | None:
+    """
+    Загружает список кампаний и зеркалирует его в Campaign.
+    None — каталог уже обновляет другой процесс или Keitaro ответил ошибкой
+    (тогда каталог остаётся прежним).
+    """
+    if not cache.add(LOCK_KEY, os.getpid(), KEITARO_SINGLE_FLIGHT_LOCK_TTL):
+        return None
+    try:
+        result = (api or KeitaroAPIManager()).fetch("campaigns")
+        if not result.ok:
+            logging.warning(f"Keeping previous campaign catalog: {result.error}")
+            return None
+        # Ответ мог не измениться, а таблицу мог изменить кто-то ещё (создание кампании,
+        # другой воркер): зеркалируем всегда, неизменённые строки mirror_campaigns пропустит
+        report = mirror_campaigns(result.data or [])
+        cache.set(SYNCED_AT_KEY, time.time(), None)
+        logging.debug(f"Campaign catalog synced: {report}")
+        return report
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def synced_at_or_schedule() -> float | None:
+    """Время последней синхронизации; устаревший каталог обновляется в фоне."""
+    synced_at = cache.get(SYNCED_AT_KEY)
+    if synced_at is None or synced_at + KEITARO_CAMPAIGN_CATALOG_TTL <= time.time():
+        metrics.count_cache("campaign_catalog", "campaigns", "miss" if synced_at is None else "stale")
+        background.submit(refresh_catalog)
+    else:
+        metrics.count_cache("campaign_catalog", "campaigns", "hit")
+    return synced_at
+
+
+def search_campaigns(query: str = "", state: str = "") -> QuerySet:
+    """Кампании по началу имени или алиаса (или по точному id) и состоянию."""
+    campaigns = Campaign.objects.all()
+    if state:
+        campaigns = campaigns.filter(state=state)
+    if query:
+        match = Q(name__istartswith=query) | Q(alias__istartswith=query)
+        if query.isdigit():
+            match |= Q(keitaro_campaign_id=int(query))
+        campaigns = campaigns.filter(match)
+    return campaigns
+
+
+class CampaignPage:
+    """
+    Страница keyset-пагинации по (name, keitaro_campaign_id).
+    Курсор — последняя (after) или первая (before) строка соседней страницы,
+    поэтому стоимость страницы не зависит от её номера. Запрос выполняется
+    лениво, при первом обращении к items — то есть только если фрагмент
+    шаблона не нашёлся в кеше.
+    """
+
+    def __init__(self, campaigns: QuerySet, size: int, after: str = "", before: str = ""):
+        self.campaigns = campaigns
+        self.size = size
+        self.after = decode_cursor(after)
+        self.before = None if self.after else decode_cursor(before)
+
+    @cached_property
+    def _rows(self) -> tuple[list[Campaign], bool]:
+        """Строки страницы и есть ли ещё строки в направлении чтения."""
+        if self.before:
+            name, campaign_id = self.before
+            rows = list(
+                self.campaigns.filter(Q(name__lt=name) | Q(name=name, keitaro_campaign_id__lt=campaign_id))
+                .order_by("-name", "-keitaro_campaign_id")[:self.size + 1]
+            )
+            return rows[:self.size][::-1], len(rows) > self.size
+
+        campaigns = self.campaigns
+        if self.after:
+            name, campaign_id = self.after
+            campaigns = campaigns.filter(Q(name__gt=name) | Q(name=name, keitaro_campaign_id__gt=campaign_id))
+        rows = list(campaigns.order_by("name", "keitaro_campaign_id")[:self.size + 1])
+        return rows[:self.size], len(rows) > self.size
+
+    @property
+    def items(self) -> list[Campaign]:
+        return self._rows[0]
+
+    @property
+    def has_next(self) -> bool:
+        return bool(self.items) and (self.before is not None or self._rows[1])
+
+    @property
+    def has_previous(self) -> bool:
+        return bool(self.items) and (self.after is not None or (self.before is not None and self._rows[1]))
+
+    @property
+    def next_cursor(self) -> str:
+        return encode_cursor(self.items[-1])
+
+    @property
+    def previous_cursor(self) -> str:
+        return encode_cursor(self.items[0])
+
+
+def encode_cursor(campaign: Campaign) -> str:
+    raw = json.dumps([campaign.name, campaign.keitaro_campaign_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int] | None:
+    """(name, id) из курсора; None для пустого или испорченного — это первая страница."""
+    if not cursor:
+        return None
+    try:
+        name, campaign_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(name), int(campaign_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
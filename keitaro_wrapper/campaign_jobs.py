@@ -0,0 +1,294 @@
+"""
+Фоновое создание кампаний в Keitaro (CampaignCreationJob).
+
+Форма только сохраняет задачу и сразу отвечает; шаги выполняются в фоновом
+потоке процесса (background.submit) после коммита. Задачи, которые не
+завершились — ошибка Keitaro, таймаут, перезапуск воркера, — подхватывает
+manage.py resume_campaign_jobs: повторяются только незавершённые шаги,
+с той же политикой пауз, что и у outbox отправки потоков.
+
+Воркеры не делят задачу: её берут через SELECT ... FOR UPDATE SKIP LOCKED
+с арендой на KEITARO_OUTBOX_LEASE секунд.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from json import JSONDecodeError
+from typing import Iterable
+from uuid import uuid4
+
+import requests
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from adrobot.settings import KEITARO_OUTBOX_LEASE, KEITARO_OUTBOX_MAX_ATTEMPTS
+from . import background
+from .api_manager import KeitaroAPIManager
+from .models import CampaignCreationJob
+from .outbox import retry_delay
+from .sync import mirror_campaigns
+from .types import FlowPayload
+
+
+CAMPAIGN_STEP = "campaign"
+FLOW_STEPS = ["geo_flow", "offer_flow"]
+STEPS = [CAMPAIGN_STEP] + FLOW_STEPS
+# Запрос ушёл в Keitaro, но ответа нет: кампания могла быть создана
+UNCONFIRMED = "unconfirmed"
+
+
+class FlowActionResolver:
+    @staticmethod
+    def pick(actions: list[dict] | None, schema: str) -> str:
+        """Возвращает доступный action_type в зависимости от схемы."""
+        fallback = "redirect" if schema == "redirect" else "offers"
+        if not actions:
+            return fallback
+
+        schema_target_type = "redirect" if schema == "redirect" else "other"
+        filtered = [a for a in actions if a.get("type") == schema_target_type]
+
+        if filtered:
+            return filtered[0].get("key", fallback)
+
+        # fallback на любой action_type
+        return actions[0].get("key", fallback)
+
+
+def create_job(**fields) -> CampaignCreationJob:
+    """Сохраняет задачу и после коммита запускает её в фоне."""
+    # Alias уникален для задачи: по нему повтор найдёт кампанию, созданную попыткой,
+    # не дождавшейся ответа, и не примет за неё чужую с тем же названием
+    payload = fields["campaign_payload"]
+    fields["campaign_payload"] = {**payload, "alias": f"{payload.get('alias') or 'campaign'}-{uuid4().hex[:8]}"}
+    job = CampaignCreationJob.objects.create(
+        steps={step: {"status": "pending", "error": "", "keitaro_id": None} for step in STEPS},
+        **fields,
+    )
+    transaction.on_commit(lambda: background.submit(run_job, job.pk))
+    return job
+
+
+def claim_jobs(limit: int, job_ids: Iterable[int] | None = None) -> list[CampaignCreationJob]:
+    """Забирает готовые к выполнению задачи и задачи с истёкшей арендой."""
+    now = timezone.now()
+    queryset = CampaignCreationJob.objects.select_for_update(skip_locked=True).filter(
+        Q(status="pending", next_attempt_at__lte=now)
+        | Q(status="running", locked_until__lte=now)
+    )
+    if job_ids is not None:
+        queryset = queryset.filter(pk__in=job_ids)
+    with transaction.atomic():
+        jobs = list(queryset.order_by("created_at")[:limit])
+        for job in jobs:
+            job.status = "running"
+            job.attempts += 1
+            job.locked_until = now + timedelta(seconds=KEITARO_OUTBOX_LEASE)
+            # bulk_update не заполняет auto_now
+            job.updated_at = now
+        CampaignCreationJob.objects.bulk_update(jobs, ["status", "attempts", "locked_until", "updated_at"])
+    return jobs
+
+
+def run_job(job_id: int, api: KeitaroAPIManager | None = None) -> CampaignCreationJob | None:
+    """Выполняет задачу, если её не выполняет кто-то другой."""
+    jobs = claim_jobs(1, job_ids=[job_id])
+    if not jobs:
+        return None
+    return execute(jobs[0], api or KeitaroAPIManager())
+
+
+def execute(job: CampaignCreationJob, api: KeitaroAPIManager) -> CampaignCreationJob:
+    """Выполняет незавершённые шаги уже забранной задачи и записывает итог."""
+    try:
+        if _pending(job, CAMPAIGN_STEP):
+            _create_campaign(job, api)
+        if job.campaign_id is not None:
+            _create_flows(job, api, [step for step in FLOW_STEPS if _pending(job, step)])
+    except Exception as exc:
+        logging.exception(f"Campaign job {job.pk} crashed")
+        job.last_error = str(exc)
+
+    now = timezone.now()
+    job.locked_until = None
+    if all(job.steps[step]["status"] == "done" for step in STEPS):
+        job.status = "done"
+        job.last_error = ""
+    elif job.attempts >= KEITARO_OUTBOX_MAX_ATTEMPTS:
+        job.status = "failed"
+    else:
+        job.status = "pending"
+        job.next_attempt_at = now + timedelta(seconds=retry_delay(job.attempts))
+    job.save(update_fields=[
+        "status", "steps", "campaign_id", "last_error", "locked_until", "next_attempt_at", "updated_at",
+    ])
+    return job
+
+
+def retry_failed(job_ids: Iterable[int]) -> int:
+    """Возвращает задачи failed в очередь с обнулённым счётчиком попыток."""
+    return CampaignCreationJob.objects.filter(pk__in=job_ids, status="failed").update(
+        status="pending", attempts=0, next_attempt_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def _pending(job: CampaignCreationJob, step: str) -> bool:
+    return job.steps[step]["status"] != "done"
+
+
+def _set_step(
+    job: CampaignCreationJob,
+    step: str,
+    keitaro_id: int | None,
+    error: str = "",
+    status: str | None = None,
+) -> None:
+    job.steps[step] = {
+        "status": status or ("failed" if error else "done"),
+        "error": error,
+        "keitaro_id": keitaro_id,
+    }
+    if error:
+        job.last_error = f"{step}: {error}"
+
+
+def _create_campaign(job: CampaignCreationJob, api: KeitaroAPIManager) -> None:
+    response = None
+    # Прошлая попытка не узнала, создана ли кампания (таймаут, обрыв соединения,
+    # перезапуск воркера посреди запроса): повторный POST создал бы дубль, поэтому
+    # сначала ищем её по alias. После ответа Keitaro с ошибкой кампании точно нет.
+    if job.steps[CAMPAIGN_STEP]["status"] == UNCONFIRMED:
+        result = api.fetch("campaigns")
+        if not result.ok:
+            _set_step(
+                job, CAMPAIGN_STEP, None, "Не удалось проверить, создана ли кампания прошлой попыткой", UNCONFIRMED,
+            )
+            job.save(update_fields=["steps", "last_error", "updated_at"])
+            return
+        alias = job.campaign_payload["alias"]
+        response = next((c for c in result.data or [] if c.get("alias") == alias), None)
+    if response is None:
+        # Отметка переживёт воркер, который не дождётся ответа
+        job.steps[CAMPAIGN_STEP]["status"] = UNCONFIRMED
+        job.save(update_fields=["steps", "updated_at"])
+        result = api.send("POST", "campaigns", job.campaign_payload)
+        if not result.ok and _outcome_unknown(result.error):
+            error = f"Keitaro не ответил, кампания могла быть создана: {result.error}"
+            _set_step(job, CAMPAIGN_STEP, None, error, UNCONFIRMED)
+            job.save(update_fields=["steps", "last_error", "updated_at"])
+            return
+        response = result.data
+    campaign_id = (response or {}).get("id")
+    if not response:
+        _set_step(job, CAMPAIGN_STEP, None, "Не удалось создать кампанию в Keitaro")
+    elif not campaign_id:
+        _set_step(job, CAMPAIGN_STEP, None, "Keitaro вернул пустой идентификатор кампании")
+    else:
+        job.campaign_id = int(campaign_id)
+        _set_step(job, CAMPAIGN_STEP, job.campaign_id)
+    # Кампания уже есть в Keitaro — фиксируем сразу, чтобы повтор её не дублировал
+    job.save(update_fields=["steps", "campaign_id", "last_error", "updated_at"])
+    if job.campaign_id is not None:
+        # Новая кампания видна в списке редактирования, не дожидаясь синхронизации каталога
+        try:
+            mirror_campaigns([{"name": job.name, **response}], prune=False)
+        except Exception:
+            logging.exception(f"Failed to add campaign {job.campaign_id} to the catalog")
+
+
+def _outcome_unknown(error: Exception) -> bool:
+    """Запрос мог дойти до Keitaro и выполниться: ответа нет или он не разобран."""
+    if isinstance(error, requests.ConnectTimeout):
+        return False
+    return isinstance(error, (requests.Timeout, requests.ConnectionError, JSONDecodeError))
+
+
+def _create_flows(job: CampaignCreationJob, api: KeitaroAPIManager, steps: list[str]) -> None:
+    """Независимые потоки создаются параллельно; потоки пула работают только с HTTP."""
+    if not steps:
+        return
+    payloads = {step: build_flow(job, step) for step in steps}
+    with ThreadPoolExecutor(max_workers=len(payloads)) as executor:
+        futures = {
+            step: executor.submit(background.closing_connections, api.create_flow, payload)
+            for step, payload in payloads.items()
+        }
+    for step, future in futures.items():
+        try:
+            response = future.result()
+        except Exception as exc:
+            _set_step(job, step, None, str(exc))
+            continue
+        if response:
+            _set_step(job, step, response.get("id"))
+        else:
+            _set_step(job, step, None, f"Не удалось создать поток {payloads[step]['name']}")
+
+
+def build_flow(job: CampaignCreationJob, step: str) -> FlowPayload:
+    if step == "geo_flow":
+        return build_geo_redirect_flow(job.campaign_id, job.country_code, job.flow_actions)
+    return build_offer_flow(job.campaign_id, job.offer_id, job.offer_name, job.flow_actions)
+
+
+def build_geo_redirect_flow(campaign_id: int, country_code: str, actions: list[dict] | None) -> FlowPayload:
+    redirect_action = FlowActionResolver.pick(actions, schema="redirect")
+    return {
+        "campaign_id": campaign_id,
+        "schema": "redirect",
+        "type": "forced",
+        "name": f"{campaign_id}-geo-redirect",
+        "action_type": redirect_action,
+        "action_options": {"url": "https://www.google.com"},
+        "comments": "Auto-generated redirect for selected country",
+        "state": "active",
+        "collect_clicks": False,
+        "filter_or": False,
+        "filters": [
+            {
+                "name": "country",
+                "mode": "accept",
+                "payload": [country_code],
+            }
+        ],
+    }
+
+
+def build_offer_flow(
+    campaign_id: int,
+    offer_id: int,
+    offer_name: str,
+    actions: list[dict] | None,
+) -> FlowPayload:
+    offer_action = FlowActionResolver.pick(actions, schema="landings")
+    return {
+        "campaign_id": campaign_id,
+        "schema": "landings",
+        "type": "default",
+        "name": f"{campaign_id}-offer",
+        "action_type": offer_action,
+        "comments": f"Auto flow for offer {offer_name or offer_id}",
+        "state": "active",
+        "collect_clicks": False,
+        "filter_or": False,
+        "offers": [
+            {
+                "offer_id": offer_id,
+                "share": 100,
+                "state": "active",
+            }
+        ],
+    }
+
+
+def serialize_job(job: CampaignCreationJob) -> dict:
+    return {
+        "id": job.pk,
+        "name": job.name,
+        "status": job.status,
+        "campaign_id": job.campaign_id,
+        "steps": job.steps,
+        "attempts": job.attempts,
+        "error": job.last_error or None,
+    }
@@ -0,0 +1,66 @@
+"""
+Условные GET (ETag / If-None-Match) для JSON-эндпоинтов редактора.
+
+Версия ответа считается дёшево — по отпечаткам данных Keitaro или по
+max(updated_at) и числу строк в БД — и сверяется с валидатором клиента
+до сериализации. ETag слабый: тело может отличаться служебными полями
+(например, отчётом синхронизации), но данные для редактора те же.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+from django.db.models import Count, Max, QuerySet
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def version_etag(*parts: Any) -> str:
+    """Слабый ETag из произвольных JSON-сериализуемых частей."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return f'W/"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def rows_version(queryset: QuerySet) -> tuple[int, datetime | None]:
+    """(число строк, последний updated_at) одним агрегирующим запросом."""
+    version = queryset.aggregate(count=Count("pk"), last=Max("updated_at"))
+    return version["count"], version["last"]
+
+
+async def arows_version(queryset: QuerySet) -> tuple[int, datetime | None]:
+    """rows_version для async-представлений."""
+    version = await queryset.aaggregate(count=Count("pk"), last=Max("updated_at"))
+    return version["count"], version["last"]
+
+
+def not_modified(request: HttpRequest, etag: str, last_modified: datetime | None = None) -> HttpResponse | None:
+    """304, если валидатор клиента совпал с текущей версией; иначе None."""
+    timestamp = last_modified.timestamp() if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        _set_validators(response, etag, last_modified)
+    return response
+
+
+def conditional_json(
+    request: HttpRequest,
+    etag: str,
+    build: Callable[[], dict],
+    last_modified: datetime | None = None,
+) -> HttpResponse:
+    """Отдаёт 304 без вызова build() или JsonResponse с валидаторами."""
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = JsonResponse(build())
+        _set_validators(response, etag, last_modified)
+    return response
+
+
+def _set_validators(response: HttpResponse, etag: str, last_modified: datetime | None) -> None:
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    # Браузер не отдаёт ответ из кеша без проверки: данные меняются в Keitaro
+    patch_cache_control(response, private=True, no_cache=True)
@@ -0,0 +1,452 @@
+"""
+Локальная замена Keitaro Admin API для тестов и нагрузочных прогонов.
+
+FakeKeitaro поднимает ThreadingHTTPServer (только stdlib) с маршрутами, которые
+использует KeitaroAPIManager (см. types.py): справочники, кампании, потоки
+кампании, создание кампаний и потоков, обновление потока. Данные генерируются
+детерминированно из seed и масштабируются параметрами FakeKeitaroConfig.
+Там же включаются задержка ответа, ошибки и ответы 429 с Retry-After; на лету
+их меняет POST /_fake/config.
+
+Сервер держит keep-alive соединения (HTTP/1.1) и считает соединения, запросы
+и пик одновременных запросов (GET /_fake/stats, DELETE /_fake/stats — сброс):
+по ним проверяется переиспользование соединений и параллельность клиента.
+
+    with FakeKeitaro(FakeKeitaroConfig(campaigns=1000, latency=0.05)) as keitaro:
+        api = KeitaroAPIManager(api_host=keitaro.url, api_token=keitaro.config.api_key)
+
+Отдельным процессом: manage.py fake_keitaro --port 8100.
+"""
+import hashlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlsplit
+
+
+API_PREFIX = "/admin_api/v1/"
+CONTROL_PREFIX = "/_fake/"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(2025, 1, 1, 10, 0, 0)
+
+FLOW_ACTIONS = [
+    {"key": "http", "name": "HTTP redirect", "field": "url", "type": "redirect", "description": ""},
+    {"key": "meta", "name": "Meta refresh", "field": "url", "type": "redirect", "description": ""},
+    {"key": "campaign", "name": "Send to campaign", "field": "campaign", "type": "other", "description": ""},
+    {"key": "status404", "name": "Not found", "field": "", "type": "other", "description": ""},
+]
+
+
+@dataclass
+class FakeKeitaroConfig:
+    # Размер данных; меняется только при запуске сервера
+    campaigns: int = 20
+    flows_per_campaign: int = 5
+    offers_per_flow: int = 3
+    offers: int = 100
+    domains: int = 10
+    sources: int = 10
+    groups: int = 5
+    seed: int = 0
+    # Задержка каждого ответа: latency секунд плюс равномерный шум до jitter
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Доли ответов с ошибкой error_status и с 429 (Retry-After: retry_after)
+    error_rate: float = 0.0
+    error_status: int = 500
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+    # ETag в ответах GET и 304 на совпавший If-None-Match
+    etags: bool = False
+    # None — заголовок Api-Key не проверяется
+    api_key: str | None = "fake-token"
+
+
+@dataclass
+class FakeKeitaroStats:
+    connections: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    errors: int = 0
+    throttled: int = 0
+    requests: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = asdict(self)
+        stats["requests"] = dict(self.requests)
+        stats["total_requests"] = sum(self.requests.values())
+        return stats
+
+
+class FakeKeitaroData:
+    """Сгенерированные сущности Keitaro; записи меняют их под блокировкой."""
+
+    def __init__(self, config: FakeKeitaroConfig):
+        rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+
+        self.groups = [
+            {"id": group_id, "name": f"Group {group_id}", "position": group_id, "type": "campaigns"}
+            for group_id in range(1, config.groups + 1)
+        ]
+        self.offers = [self._offer(rng, offer_id, config) for offer_id in range(1, config.offers + 1)]
+        self.domains = [self._domain(domain_id) for domain_id in range(1, config.domains + 1)]
+        self.sources = [self._source(source_id) for source_id in range(1, config.sources + 1)]
+        self.flow_actions = [dict(action) for action in FLOW_ACTIONS]
+
+        self.campaigns: dict[int, dict] = {}
+        self.flows: dict[int, dict] = {}
+        self.campaign_flows: dict[int, list[dict]] = {}
+        offer_ids = [offer["id"] for offer in self.offers]
+        for campaign_id in range(1, config.campaigns + 1):
+            self.campaigns[campaign_id] = self._campaign(rng, campaign_id)
+            self.campaign_flows[campaign_id] = []
+            for _ in range(config.flows_per_campaign):
+                flow_id = len(self.flows) + 1
+                count = min(config.offers_per_flow, len(offer_ids))
+                offers = [
+                    self._flow_offer(flow_id, offer_id, 100 // count, stamp(rng))
+                    for offer_id in rng.sample(offer_ids, count)
+                ]
+                self.flows[flow_id] = self._flow(flow_id, campaign_id, offers, stamp(rng))
+                self.campaign_flows[campaign_id].append(self.flows[flow_id])
+
+    def handle(self, method: str, path: str, payload: Any) -> tuple[int, bytes]:
+        """
+        Статус и JSON-тело ответа на запрос к пути относительно API_PREFIX.
+        Тело сериализуется под блокировкой, чтобы запись не меняла его на ходу.
+        """
+        with self.lock:
+            status, body = self._route(method, path.strip("/").split("/"), payload or {})
+            return status, dump(body)
+
+    def _route(self, method: str, parts: list[str], payload: Any) -> tuple[int, Any]:
+        if method == "GET":
+            return self._read(parts)
+        if method == "POST" and parts == ["campaigns"]:
+            return 200, self._create_campaign(payload)
+        if method == "POST" and parts == ["streams"]:
+            return self._create_flow(payload)
+        if method == "PUT" and len(parts) == 2 and parts[0] == "streams" and parts[1].isdigit():
+            return self._update_flow(int(parts[1]), payload)
+        return 404, {"error": "Not found"}
+
+    def _read(self, parts: list[str]) -> tuple[int, Any]:
+        lists = {
+            "offers": self.offers,
+            "domains": self.domains,
+            "traffic_sources": self.sources,
+            "groups": self.groups,
+            "streams_actions": self.flow_actions,
+            "campaigns": list(self.campaigns.values()),
+        }
+        if len(parts) == 1 and parts[0] in lists:
+            return 200, lists[parts[0]]
+        if len(parts) >= 2 and parts[1].isdigit():
+            entity_id = int(parts[1])
+            if parts[0] == "campaigns" and entity_id in self.campaigns:
+                if len(parts) == 2:
+                    return 200, self.campaigns[entity_id]
+                if parts[2:] == ["streams"]:
+                    return 200, self.campaign_flows[entity_id]
+            if parts[0] == "streams" and len(parts) == 2 and entity_id in self.flows:
+                return 200, self.flows[entity_id]
+        return 404, {"error": "Not found"}
+
+    def _create_campaign(self, payload: dict) -> dict:
+        campaign_id = max(self.campaigns, default=0) + 1
+        campaign = self._campaign(random.Random(campaign_id), campaign_id)
+        campaign.update({key: value for key, value in payload.items() if key in campaign})
+        campaign["created_at"] = campaign["updated_at"] = now_stamp()
+        self.campaigns[campaign_id] = campaign
+        self.campaign_flows[campaign_id] = []
+        return campaign
+
+    def _create_flow(self, payload: dict) -> tuple[int, Any]:
+        if payload.get("campaign_id") not in self.campaigns:
+            return 422, {"error": "Campaign not found"}
+        flow_id = max(self.flows, default=0) + 1
+        flow = self._flow(flow_id, payload["campaign_id"], [], now_stamp())
+        self._apply_flow_payload(flow, payload)
+        self.flows[flow_id] = flow
+        self.campaign_flows[flow["campaign_id"]].append(flow)
+        return 200, flow
+
+    def _update_flow(self, flow_id: int, payload: dict) -> tuple[int, Any]:
+        flow = self.flows.get(flow_id)
+        if flow is None:
+            return 404, {"error": "Not found"}
+        self._apply_flow_payload(flow, payload)
+        return 200, flow
+
+    def _apply_flow_payload(self, flow: dict, payload: dict) -> None:
+        updated_at = now_stamp()
+        flow.update({
+            key: value for key, value in payload.items()
+            if key in flow and key not in ("id", "campaign_id", "offers")
+        })
+        if "offers" in payload:
+            flow["offers"] = [
+                self._flow_offer(flow["id"], offer["offer_id"], offer.get("share", 0), updated_at, offer.get("state"))
+                for offer in payload["offers"]
+            ]
+        flow["updated_at"] = updated_at
+
+    def _campaign(self, rng: random.Random, campaign_id: int) -> dict:
+        group = rng.choice(self.groups) if self.groups else {"id": 0, "name": ""}
+        domain = rng.choice(self.domains) if self.domains else None
+        updated_at = stamp(rng)
+        return {
+            "id": campaign_id, "alias": f"campaign-{campaign_id}", "name": f"Campaign {campaign_id:05d}",
+            "type": rng.choice(["position", "weight"]), "uniqueness_method": "ip_ua", "cookies_ttl": 24,
+            "position": campaign_id, "state": "active", "updated_at": updated_at, "cost_type": "CPC",
+            "cost_value": 0, "cost_currency": "USD", "group_id": group["id"], "bind_visitors": "s",
+            "traffic_source_id": self.sources[0]["id"] if self.sources else 0, "token": f"token{campaign_id}",
+            "cost_auto": False, "domain_id": domain["id"] if domain else None, "notes": None, "parameters": [],
+            "uniqueness_use_cookies": True, "traffic_loss": 0, "bypass_cache": False, "created_at": updated_at,
+            "domain": domain["name"] if domain else None, "postbacks": [], "group": group["name"],
+        }
+
+    @staticmethod
+    def _flow(flow_id: int, campaign_id: int, offers: list[dict], updated_at: str) -> dict:
+        return {
+            "id": flow_id, "type": "regular", "name": f"Flow {flow_id}", "campaign_id": campaign_id,
+            "position": flow_id, "action_options": None, "comments": None, "state": "active",
+            "action_type": "http", "action_payload": None, "schema": "landings", "collect_clicks": True,
+            "filter_or": False, "weight": 100, "offer_selection": "before_click", "filters": [],
+            "triggers": [], "landings": [], "offers": offers, "updated_at": updated_at,
+        }
+
+    @staticmethod
+    def _flow_offer(flow_id: int, offer_id: int, share: int, updated_at: str, state: str | None = None) -> dict:
+        return {
+            "id": flow_id * 100_000 + offer_id, "stream_id": flow_id, "offer_id": offer_id,
+            "state": state or "active", "share": share, "created_at": updated_at, "updated_at": updated_at,
+        }
+
+    def _offer(self, rng: random.Random, offer_id: int, config: FakeKeitaroConfig) -> dict:
+        updated_at = stamp(rng)
+        return {
+            "id": offer_id, "name": f"Offer {offer_id:05d}", "group_id": rng.randint(1, max(config.groups, 1)),
+            "action_type": "http", "action_payload": f"https://offer{offer_id}.example.com/",
+            "action_options": {}, "affiliate_network_id": 1, "payout_value": rng.randint(1, 50),
+            "payout_currency": "USD", "payout_type": "CPA", "state": "active", "created_at": updated_at,
+            "updated_at": updated_at, "payout_auto": False, "payout_upsell": False,
+            "country": [rng.choice(["RU", "KZ", "US", "DE"])], "notes": "", "affiliate_network": "Network",
+            "archive": "", "local_path": "", "preview_path": "", "values": [],
+        }
+
+    @staticmethod
+    def _domain(domain_id: int) -> dict:
+        return {
+            "id": domain_id, "name": f"domain{domain_id}.example.com", "network_status": "active",
+            "default_campaign": "", "default_campaign_id": 0, "state": "active",
+            "created_at": EPOCH.strftime(TIMESTAMP_FORMAT), "updated_at": EPOCH.strftime(TIMESTAMP_FORMAT),
+            "catch_not_found": False, "campaigns_count": 0, "ssl_redirect": True, "allow_indexing": False,
+            "admin_dashboard": False, "cloudflare_proxy": False, "group_id": 0, "group": "", "is_ssl": True,
+            "dns_provider": "", "error_solution": "", "status": "active", "notes": "",
+        }
+
+    @staticmethod
+    def _source(source_id: int) -> dict:
+        return {
+            "id": source_id, "name": f"Source {source_id}", "postback_url": "", "postback_statuses": [],
+            "template_name": "", "accept_parameters": True, "parameters": {}, "notes": "", "state": "active",
+            "created_at": EPOCH.strftime(TIMESTAMP_FORMAT), "updated_at": EPOCH.strftime(TIMESTAMP_FORMAT),
+            "traffic_loss": 0, "update_in_campaigns": "",
+        }
+
+
+def stamp(rng: random.Random) -> str:
+    return (EPOCH + timedelta(minutes=rng.randint(0, 60 * 24 * 90))).strftime(TIMESTAMP_FORMAT)
+
+
+def now_stamp() -> str:
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def dump(body: Any) -> bytes:
+    return json.dumps(body, ensure_ascii=False).encode()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: FakeKeitaroConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.data = FakeKeitaroData(config)
+        self.stats = FakeKeitaroStats()
+        self.stats_lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+
+    def handle_error(self, request, client_address):
+        # Клиент не дождался ответа (таймаут) и закрыл соединение — это ожидаемо
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logging.debug(f"fake keitaro: client {client_address} disconnected")
+            return
+        super().handle_error(request, client_address)
+
+    def fault(self) -> tuple[float, int | None]:
+        """Задержка ответа и подменный статус (None — отвечать по-настоящему)."""
+        config = self.config
+        with self.stats_lock:
+            delay = config.latency + (self.rng.uniform(0, config.jitter) if config.jitter else 0)
+            roll = self.rng.random()
+            if roll < config.throttle_rate:
+                self.stats.throttled += 1
+                return delay, 429
+            if roll < config.throttle_rate + config.error_rate:
+                self.stats.errors += 1
+                return delay, config.error_status
+        return delay, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _Server
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats.connections += 1
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        logging.debug("fake keitaro: " + format % args)
+
+    def _handle(self, method: str) -> None:
+        path = urlsplit(self.path).path
+        try:
+            payload = self._read_json()
+        except ValueError:
+            return self._send_json(400, {"error": "Invalid JSON"})
+        if path.startswith(CONTROL_PREFIX):
+            return self._control(method, path.removeprefix(CONTROL_PREFIX), payload)
+
+        server = self.server
+        with server.stats_lock:
+            server.stats.requests[f"{method} {path.removeprefix(API_PREFIX)}"] += 1
+            server.stats.in_flight += 1
+            server.stats.peak_in_flight = max(server.stats.peak_in_flight, server.stats.in_flight)
+        try:
+            delay, status = server.fault()
+            if delay:
+                time.sleep(delay)
+            if status == 429:
+                return self._send_json(429, {"error": "Too many requests"}, {"Retry-After": str(server.config.retry_after)})
+            if status is not None:
+                return self._send_json(status, {"error": "Injected failure"})
+            if server.config.api_key is not None and self.headers.get("Api-Key") != server.config.api_key:
+                return self._send_json(401, {"error": "Unauthorized"})
+            status, raw = server.data.handle(method, path.removeprefix(API_PREFIX), payload)
+            self._send(status, raw, etag=method == "GET")
+        finally:
+            with server.stats_lock:
+                server.stats.in_flight -= 1
+
+    def _control(self, method: str, path: str, payload: Any) -> None:
+        server = self.server
+        if path == "stats" and method == "GET":
+            with server.stats_lock:
+                return self._send_json(200, server.stats.as_dict())
+        if path == "stats" and method == "DELETE":
+            with server.stats_lock:
+                server.stats = FakeKeitaroStats()
+            return self._send_json(200, {})
+        if path == "config" and method == "GET":
+            return self._send_json(200, asdict(server.config))
+        if path == "config" and method == "POST":
+            known = {f.name for f in fields(FakeKeitaroConfig)}
+            for name, value in (payload or {}).items():
+                if name in known:
+                    setattr(server.config, name, value)
+            return self._send_json(200, asdict(server.config))
+        self._send_json(404, {"error": "Not found"})
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _send_json(self, status: int, body: Any, headers: dict[str, str] | None = None) -> None:
+        self._send(status, dump(body), headers)
+
+    def _send(self, status: int, raw: bytes, headers: dict[str, str] | None = None, etag: bool = False) -> None:
+        headers = dict(headers or {})
+        if etag and status == 200 and self.server.config.etags:
+            headers["ETag"] = f'"{hashlib.sha256(raw).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, raw = 304, b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class FakeKeitaro:
+    """Фейковый Keitaro в фоновом потоке; url — значение для KEITARO_API_HOST."""
+
+    def __init__(self, config: FakeKeitaroConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.server = _Server((host, port), config or FakeKeitaroConfig())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    @property
+    def config(self) -> FakeKeitaroConfig:
+        return self.server.config
+
+    @property
+    def data(self) -> FakeKeitaroData:
+        return self.server.data
+
+    @property
+    def stats(self) -> FakeKeitaroStats:
+        return self.server.stats
+
+    def reset_stats(self) -> None:
+        with self.server.stats_lock:
+            self.server.stats = FakeKeitaroStats()
+
+    def start(self) -> "FakeKeitaro":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-keitaro", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeKeitaro":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
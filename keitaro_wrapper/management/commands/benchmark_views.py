@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from keitaro_wrapper.benchmarks import BENCHMARKS, SIZES, load_budgets, measure, over_budget, record_budgets
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время, число SQL-запросов и память путей редактора на синтетических кампаниях "
+        "и сверяет их с бюджетами benchmark_budgets.json. Замеры идут в отдельной тестовой БД, "
+        "как у manage.py test; рабочая БД не затрагивается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default=",".join(map(str, SIZES)),
+            help="Размеры кампаний (потоков и офферов) через запятую.",
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            choices=[benchmark.name for benchmark in BENCHMARKS],
+            help="Замерить только эти пути.",
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Записать замеры как новые бюджеты вместо проверки.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Не пересоздавать и не удалять тестовую БД между запусками.",
+        )
+
+    def handle(self, *args, **options):
+        keepdb = options["keepdb"]
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+        try:
+            self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+    def run_benchmarks(self, options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        budgets = load_budgets()
+        results = {}
+        violations = []
+
+        self.stdout.write(f"{'путь':<22}{'размер':>8}{'сек':>10}{'запросов':>10}{'KiB':>10}")
+        for benchmark in BENCHMARKS:
+            if options["only"] and benchmark.name not in options["only"]:
+                continue
+            results[benchmark.name] = {}
+            for size in sizes:
+                result = measure(benchmark, size)
+                results[benchmark.name][size] = result
+                problems = [] if options["record"] else over_budget(benchmark.name, size, result, budgets)
+                violations += problems
+                line = f"{benchmark.name:<22}{size:>8}{result.seconds:>10.3f}{result.queries:>10}{result.peak_kib:>10}"
+                self.stdout.write(self.style.ERROR(line) if problems else line)
+
+        if options["record"]:
+            record_budgets(results)
+            self.stdout.write(self.style.SUCCESS("Бюджеты записаны"))
+        elif violations:
+            raise CommandError("Превышены бюджеты:\n" + "\n".join(violations))
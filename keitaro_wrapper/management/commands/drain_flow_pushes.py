@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from keitaro_wrapper.outbox import drain_once
+
+
+class Command(BaseCommand):
+    help = "Отправляет в Keitaro потоки из outbox (FlowPush) с повторами при ошибках."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда outbox пуст.",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=20,
+            help="Сколько записей забирать за один проход.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить один проход и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            pushes = drain_once(limit=options["batch"])
+            if pushes:
+                counts = {}
+                for push in pushes:
+                    counts[push.status] = counts.get(push.status, 0) + 1
+                summary = ", ".join(f"{status}={count}" for status, count in sorted(counts.items()))
+                self.stdout.write(f"Outbox: {summary}")
+            if options["once"]:
+                return
+            # Долгоживущий процесс: не держим упавшее или устаревшее соединение с БД
+            close_old_connections()
+            if not pushes:
+                time.sleep(options["interval"])
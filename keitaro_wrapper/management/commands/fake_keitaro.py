@@ -0,0 +1,40 @@
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand
+
+from keitaro_wrapper.fake_keitaro import FakeKeitaro, FakeKeitaroConfig
+
+
+class Command(BaseCommand):
+    help = "Запускает локальный фейковый Keitaro Admin API с заданным объёмом данных, задержкой и ошибками."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8100)
+        # Параметры FakeKeitaroConfig: --campaigns 1000 --latency 0.05 --throttle-rate 0.1 ...
+        defaults = FakeKeitaroConfig()
+        for option in fields(FakeKeitaroConfig):
+            default = getattr(defaults, option.name)
+            flag = f"--{option.name.replace('_', '-')}"
+            if isinstance(default, bool):
+                parser.add_argument(flag, dest=option.name, action="store_true")
+            else:
+                parser.add_argument(flag, dest=option.name, type=type(default), default=default)
+
+    def handle(self, *args, **options):
+        config = FakeKeitaroConfig(**{option.name: options[option.name] for option in fields(FakeKeitaroConfig)})
+        # --api-key "" — ключ не проверяется
+        config.api_key = config.api_key or None
+        keitaro = FakeKeitaro(config, host=options["host"], port=options["port"])
+        self.stdout.write(
+            f"Фейковый Keitaro: KEITARO_API_HOST={keitaro.url} KEITARO_API_TOKEN={config.api_key or ''}\n"
+            f"Кампаний {config.campaigns}, потоков {config.campaigns * config.flows_per_campaign}, "
+            f"офферов {config.offers}; задержка {config.latency}+{config.jitter} с, "
+            f"ошибки {config.error_rate:.0%}, 429 {config.throttle_rate:.0%}"
+        )
+        try:
+            keitaro.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            keitaro.server.server_close()
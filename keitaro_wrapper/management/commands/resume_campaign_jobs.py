@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from keitaro_wrapper.api_manager import KeitaroAPIManager
+from keitaro_wrapper.campaign_jobs import claim_jobs, execute, retry_failed
+
+
+class Command(BaseCommand):
+    help = "Возобновляет незавершённые задачи создания кампаний (CampaignCreationJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "job_ids",
+            nargs="*",
+            type=int,
+            help="Задачи, которые нужно повторить, в том числе failed (по умолчанию — все готовые к повтору).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Проверять очередь каждые N секунд (0 — выполнить один проход).",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=10,
+            help="Сколько задач забирать за один проход.",
+        )
+
+    def handle(self, *args, **options):
+        job_ids = options["job_ids"] or None
+        if job_ids:
+            requeued = retry_failed(job_ids)
+            if requeued:
+                self.stdout.write(f"Возвращено в очередь задач: {requeued}")
+
+        api = KeitaroAPIManager()
+        while True:
+            for job in claim_jobs(options["batch"], job_ids=job_ids):
+                job = execute(job, api)
+                self.stdout.write(f"Задача #{job.pk}: {job.status}" + (f" ({job.last_error})" if job.last_error else ""))
+            if not options["interval"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
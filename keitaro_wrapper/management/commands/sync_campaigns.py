@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from keitaro_wrapper.campaign_catalog import refresh_catalog
+
+
+class Command(BaseCommand):
+    help = "Синхронизирует каталог кампаний (список редактирования) с Keitaro."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Повторять синхронизацию каждые N секунд (0 — выполнить один раз).",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+
+        while True:
+            report = refresh_catalog()
+            if report is None:
+                self.stdout.write("Каталог кампаний не обновлён: Keitaro недоступен или синхронизация уже идёт")
+            else:
+                self.stdout.write(
+                    f"Каталог кампаний обновлён: создано {report.created}, изменено {report.updated}, "
+                    f"без изменений {report.skipped}, удалено {report.deleted}"
+                )
+            if not interval:
+                return
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from keitaro_wrapper.reference_data import REFERENCE_RESOURCES, refresh
+
+
+class Command(BaseCommand):
+    help = "Прогревает кеш справочников Keitaro (домены, офферы, источники, группы, действия потоков)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "resources",
+            nargs="*",
+            help="Какие справочники прогреть (по умолчанию все).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Повторять прогрев каждые N секунд (0 — выполнить один раз).",
+        )
+
+    def handle(self, *args, **options):
+        resources = options["resources"] or REFERENCE_RESOURCES
+        unknown = set(resources) - set(REFERENCE_RESOURCES)
+        if unknown:
+            raise CommandError(f"Неизвестные справочники: {', '.join(sorted(unknown))}")
+        interval = options["interval"]
+
+        while True:
+            data = refresh(resources)
+            counts = ", ".join(f"{name}={len(value)}" for name, value in data.items())
+            self.stdout.write(f"Кеш справочников обновлён: {counts}")
+            if not interval:
+                return
+            # Долгоживущий процесс: не держим упавшее или устаревшее соединение с БД
+            close_old_connections()
+            time.sleep(interval)
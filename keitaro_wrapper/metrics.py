@@ -0,0 +1,147 @@
+"""
+Метрики клиента Keitaro и кешей в формате Prometheus.
+
+Запросы к Keitaro (оба клиента, все методы) помечаются эндпоинтом — путём
+относительно api_host, где id заменены на {id}, чтобы число серий не росло
+с числом кампаний, — и HTTP-методом: гистограмма времени ответа, счётчик
+ответов по статусу (или timeout / connection_error), повторы после сбоя,
+отказы разомкнутой цепи и число запросов в полёте. Время ожидания общих
+лимитов в задержку не входит, таймауты лимитов считаются отдельно.
+
+Обращения к кешам считаются по паре (кеш, ключ) с результатом hit, miss или stale.
+
+Воркеры uvicorn — отдельные процессы, поэтому при заданном
+PROMETHEUS_MULTIPROC_DIR метрики пишутся в общий каталог (multiprocess-режим
+prometheus_client) и /metrics отдаёт их сумму по всем воркерам. Каталог
+очищается при старте сервиса.
+"""
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from adrobot.settings import PROMETHEUS_MULTIPROC_DIR
+
+
+ENDPOINT_LABELS = ["endpoint", "method"]
+# Keitaro отвечает от десятков миллисекунд до десятков секунд (read timeout)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_DURATION = Histogram(
+    "keitaro_request_duration_seconds",
+    "Время ответа Keitaro без ожидания лимитов запросов.",
+    ENDPOINT_LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    "keitaro_responses_total",
+    "Ответы Keitaro по статусу: HTTP-код, timeout или connection_error.",
+    ENDPOINT_LABELS + ["status"],
+)
+RETRIES = Counter(
+    "keitaro_retries_total",
+    "Запросы к эндпоинту, у которого записан недавний сбой (пробные и повторные).",
+    ENDPOINT_LABELS,
+)
+SHORT_CIRCUITED = Counter(
+    "keitaro_short_circuited_total",
+    "Запросы, не отправленные в Keitaro из-за разомкнутой цепи эндпоинта.",
+    ENDPOINT_LABELS,
+)
+IN_FLIGHT = Gauge(
+    "keitaro_requests_in_flight",
+    "Запросы к Keitaro, ожидающие ответа.",
+    ENDPOINT_LABELS,
+    multiprocess_mode="livesum",
+)
+RATE_LIMIT_TIMEOUTS = Counter(
+    "keitaro_rate_limit_timeouts_total",
+    "Запросы, не дождавшиеся общего лимита класса эндпоинтов.",
+    ["limit"],
+)
+RATE_LIMIT_BYPASSED = Counter(
+    "keitaro_rate_limit_bypassed_total",
+    "Запросы из транзакции БД, ушедшие в Keitaro в обход общих лимитов.",
+    ["limit"],
+)
+CACHE_LOOKUPS = Counter(
+    "keitaro_cache_lookups_total",
+    "Обращения к кешам: hit — свежее значение, stale — устаревшее, miss — значения нет.",
+    ["cache", "key", "result"],
+)
+
+
+@dataclass
+class _Call:
+    status: int | str | None = None
+
+
+def endpoint_label(path: str) -> str:
+    """campaigns/123/streams → campaigns/{id}/streams."""
+    return "/".join("{id}" if part.isdigit() else part for part in path.strip("/").split("/"))
+
+
+@contextmanager
+def track_request(endpoint: str, method: str):
+    """
+    Замеряет один HTTP-запрос к Keitaro. Получив ответ, вызывающий код
+    записывает его статус в call.status; исключение превращается в статус само.
+    """
+    call = _Call()
+    in_flight = IN_FLIGHT.labels(endpoint, method)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as exc:
+        call.status = call.status or error_status(exc)
+        raise
+    finally:
+        in_flight.dec()
+        REQUEST_DURATION.labels(endpoint, method).observe(time.perf_counter() - started)
+        RESPONSES.labels(endpoint, method, str(call.status or "unknown")).inc()
+
+
+def error_status(exc: Exception) -> str:
+    # requests и httpx называют таймауты одинаково: ConnectTimeout, ReadTimeout, PoolTimeout...
+    return "timeout" if "Timeout" in type(exc).__name__ else "connection_error"
+
+
+def count_retry(endpoint: str, method: str) -> None:
+    RETRIES.labels(endpoint, method).inc()
+
+
+def count_short_circuit(endpoint: str, method: str) -> None:
+    SHORT_CIRCUITED.labels(endpoint, method).inc()
+
+
+def count_rate_limit_timeout(limit: str) -> None:
+    RATE_LIMIT_TIMEOUTS.labels(limit).inc()
+
+
+def count_rate_limit_bypass(limit: str) -> None:
+    RATE_LIMIT_BYPASSED.labels(limit).inc()
+
+
+def count_cache(cache: str, key: str, result: str) -> None:
+    CACHE_LOOKUPS.labels(cache, key, result).inc()
+
+
+def render() -> tuple[bytes, str]:
+    """Тело и Content-Type ответа /metrics: сумма по воркерам в multiprocess-режиме."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
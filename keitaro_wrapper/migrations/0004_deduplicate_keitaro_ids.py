@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:29
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(model, fk_name, other_fk_name, keitaro_field, OfferFlow):
+    """
+    Оставляет по одной строке на keitaro id (с минимальным pk).
+    Связи OfferFlow дублей переносятся на оставшуюся строку; если такая связь
+    уже есть, дубль связи удаляется.
+    """
+    groups = (
+        model.objects.values(keitaro_field)
+        .annotate(rows=Count("id"), keep_id=Min("id"))
+        .filter(rows__gt=1)
+    )
+    for group in groups:
+        keep_id = group["keep_id"]
+        duplicate_ids = list(
+            model.objects.filter(**{keitaro_field: group[keitaro_field]})
+            .exclude(id=keep_id)
+            .values_list("id", flat=True)
+        )
+        linked = set(
+            OfferFlow.objects.filter(**{f"{fk_name}_id": keep_id})
+            .values_list(f"{other_fk_name}_id", flat=True)
+        )
+        for offerflow in OfferFlow.objects.filter(**{f"{fk_name}_id__in": duplicate_ids}).order_by("-updated_at"):
+            other_id = getattr(offerflow, f"{other_fk_name}_id")
+            if other_id in linked:
+                offerflow.delete()
+            else:
+                setattr(offerflow, f"{fk_name}_id", keep_id)
+                offerflow.save(update_fields=[f"{fk_name}_id"])
+                linked.add(other_id)
+        model.objects.filter(id__in=duplicate_ids).delete()
+
+
+def deduplicate(apps, schema_editor):
+    Offer = apps.get_model("keitaro_wrapper", "Offer")
+    Flow = apps.get_model("keitaro_wrapper", "Flow")
+    OfferFlow = apps.get_model("keitaro_wrapper", "OfferFlow")
+    merge_duplicates(Offer, "offer", "flow", "keitaro_offer_id", OfferFlow)
+    merge_duplicates(Flow, "flow", "offer", "keitaro_flow_id", OfferFlow)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0003_alter_offerflow_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
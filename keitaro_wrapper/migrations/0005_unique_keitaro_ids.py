@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0004_deduplicate_keitaro_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flow',
+            name='keitaro_flow_id',
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name='offer',
+            name='keitaro_offer_id',
+            field=models.IntegerField(unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0005_unique_keitaro_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flow',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='flow',
+            name='upstream_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0006_flow_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flow',
+            name='published_payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
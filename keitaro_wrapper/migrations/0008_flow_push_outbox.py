@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0007_flow_published_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowPush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('in_progress', 'Отправляется'), ('done', 'Отправлен'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('skipped', models.BooleanField(default=False)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('flow', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='keitaro_wrapper.flow')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='keitaro_wra_status_99d4de_idx')],
+            },
+        ),
+    ]
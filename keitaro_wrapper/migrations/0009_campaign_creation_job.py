@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0008_flow_push_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignCreationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('campaign_payload', models.JSONField()),
+                ('country_code', models.CharField(max_length=8)),
+                ('offer_id', models.IntegerField()),
+                ('offer_name', models.CharField(blank=True, default='', max_length=100)),
+                ('flow_actions', models.JSONField(default=list)),
+                ('campaign_id', models.IntegerField(blank=True, null=True)),
+                ('steps', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='keitaro_wra_status_6935bb_idx')],
+            },
+        ),
+    ]
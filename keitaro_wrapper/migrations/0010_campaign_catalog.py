@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:48
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keitaro_wrapper', '0009_campaign_creation_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keitaro_campaign_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('alias', models.CharField(blank=True, default='', max_length=255)),
+                ('state', models.CharField(choices=[('active', 'Активна'), ('disabled', 'Отключена'), ('deleted', 'Удалена')], max_length=30)),
+                ('type', models.CharField(blank=True, default='', max_length=30)),
+                ('group', models.CharField(blank=True, default='', max_length=255)),
+                ('domain', models.CharField(blank=True, default='', max_length=255)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('upstream_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name', 'keitaro_campaign_id'], name='campaign_name_keyset_idx'), models.Index(fields=['state', 'name', 'keitaro_campaign_id'], name='campaign_state_keyset_idx'), models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='campaign_name_prefix_idx'), models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('alias'), name='text_pattern_ops'), name='campaign_alias_prefix_idx')],
+            },
+        ),
+    ]
@@ -1,13 +1,52 @@
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 
 class Offer(models.Model):
-    keitaro_offer_id = models.IntegerField()
+    keitaro_offer_id = models.IntegerField(unique=True)
     name = models.CharField(max_length=100)
 
 
+class Campaign(models.Model):
+    """
+    Каталог кампаний Keitaro для списка редактирования: зеркалируется
+    в фоне (campaign_catalog.refresh_catalog), страница читает только его.
+    """
+
+    keitaro_campaign_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    alias = models.CharField(max_length=255, blank=True, default="")
+    state = models.CharField(
+        max_length=30,
+        choices=[
+            ("active", "Активна"),
+            ("disabled", "Отключена"),
+            ("deleted", "Удалена"),
+        ],
+    )
+    type = models.CharField(max_length=30, blank=True, default="")
+    group = models.CharField(max_length=255, blank=True, default="")
+    domain = models.CharField(max_length=255, blank=True, default="")
+    # Отпечаток зеркалируемых полей: неизменившиеся кампании не перезаписываются
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    upstream_updated_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset-пагинация по (name, id), в том числе внутри одного состояния
+            models.Index(fields=["name", "keitaro_campaign_id"], name="campaign_name_keyset_idx"),
+            models.Index(fields=["state", "name", "keitaro_campaign_id"], name="campaign_state_keyset_idx"),
+            # Поиск по началу имени или алиаса без учёта регистра (istartswith)
+            models.Index(OpClass(Upper("name"), name="text_pattern_ops"), name="campaign_name_prefix_idx"),
+            models.Index(OpClass(Upper("alias"), name="text_pattern_ops"), name="campaign_alias_prefix_idx"),
+        ]
+
+
 class Flow(models.Model):
-    keitaro_flow_id = models.IntegerField()
+    keitaro_flow_id = models.IntegerField(unique=True)
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=100)
     campaign_id = models.IntegerField()
@@ -25,6 +64,13 @@ class Flow(models.Model):
     filters = models.JSONField(default=list)
     triggers = models.JSONField(default=list)
     landings = models.JSONField(default=list)
+    # Отпечаток содержимого потока в Keitaro (поля + офферы) и последний
+    # увиденный updated_at: неизменившиеся потоки синхронизация пропускает
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    upstream_updated_at = models.DateTimeField(null=True, blank=True)
+    # Последний известный payload потока в Keitaro — отправленный нами или
+    # полученный синхронизацией; его отпечаток хранится в content_hash
+    published_payload = models.JSONField(null=True, blank=True)
 
 
 class OfferFlow(models.Model):
@@ -46,4 +92,96 @@ class OfferFlow(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = [['flow', 'offer']]
\ No newline at end of file
+        unique_together = [['flow', 'offer']]
+
+
+class FlowPush(models.Model):
+    """
+    Outbox отправки потока в Keitaro: запрос фиксирует намерение в своей
+    транзакции и сразу отвечает, а PUT делает воркер drain_flow_pushes.
+    """
+
+    flow = models.ForeignKey(Flow, on_delete=models.PROTECT)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("pending", "Ожидает отправки"),
+            ("in_progress", "Отправляется"),
+            ("done", "Отправлен"),
+            ("failed", "Ошибка"),
+        ],
+        default="pending",
+    )
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Пока не истекло, запись принадлежит воркеру; после — её может забрать другой
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Payload совпал с состоянием в Keitaro, PUT не понадобился
+    skipped = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+
+class CampaignCreationJob(models.Model):
+    """
+    Создание кампании в Keitaro как сохраняемая задача из шагов:
+    кампания, затем параллельно поток-георедирект и поток оффера.
+    Итог каждого шага хранится в steps, поэтому повтор выполняет только
+    незавершённые шаги и не создаёт кампанию второй раз.
+    """
+
+    name = models.CharField(max_length=100)
+    campaign_payload = models.JSONField()
+    country_code = models.CharField(max_length=8)
+    offer_id = models.IntegerField()
+    offer_name = models.CharField(max_length=100, blank=True, default="")
+    flow_actions = models.JSONField(default=list)
+    campaign_id = models.IntegerField(null=True, blank=True)
+    # {шаг: {"status": "pending" | "done" | "failed" | "unconfirmed", "error": str, "keitaro_id": int | None}}
+    steps = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("pending", "Ожидает"),
+            ("running", "Выполняется"),
+            ("done", "Готово"),
+            ("failed", "Ошибка"),
+        ],
+        default="pending",
+    )
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket одного класса запросов к Keitaro, общий для всех процессов."""
+
+    name = models.CharField(max_length=30, unique=True)
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+
+
+class RateLimitSlot(models.Model):
+    """
+    Место в семафоре одновременных запросов класса к Keitaro.
+    Занято, пока не истёк locked_until; holder — кто его занял.
+    """
+
+    name = models.CharField(max_length=30)
+    slot = models.IntegerField()
+    holder = models.CharField(max_length=32, blank=True, default="")
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [["name", "slot"]]
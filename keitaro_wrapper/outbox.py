@@ -0,0 +1,127 @@
+"""
+Transactional outbox для отправки потоков в Keitaro.
+
+Веб-запрос только записывает FlowPush в своей транзакции и отвечает 202.
+Воркер (manage.py drain_flow_pushes) забирает записи через
+SELECT ... FOR UPDATE SKIP LOCKED, отправляет потоки через publish_flows
+и переводит записи в done; упавшие повторяются с экспоненциальной паузой,
+после KEITARO_OUTBOX_MAX_ATTEMPTS попыток запись помечается failed.
+
+Payload собирается в момент отправки из текущих данных, поэтому несколько
+нажатий «Отправить» до отправки схлопываются в одну запись.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from adrobot.settings import (
+    KEITARO_OUTBOX_LEASE,
+    KEITARO_OUTBOX_MAX_ATTEMPTS,
+    KEITARO_OUTBOX_MAX_RETRY_DELAY,
+    KEITARO_OUTBOX_RETRY_DELAY,
+)
+from .api_manager import KeitaroAPIManager
+from .models import Flow, FlowPush
+from .publishing import publish_flows, with_offer_flows
+
+
+def enqueue_flow_push(flow: Flow) -> FlowPush:
+    """Записывает намерение отправить поток; ожидающая запись переиспользуется."""
+    with transaction.atomic():
+        push = (
+            FlowPush.objects.select_for_update(of=("self",))
+            .select_related("flow")
+            .filter(flow=flow, status="pending")
+            .order_by("pk")
+            .first()
+        )
+        if push is None:
+            push = FlowPush.objects.create(flow=flow)
+        elif push.next_attempt_at > timezone.now():
+            # Новое нажатие — повторяем сразу, не дожидаясь паузы после ошибки
+            push.next_attempt_at = timezone.now()
+            push.save(update_fields=["next_attempt_at", "updated_at"])
+    return push
+
+
+def claim_pushes(limit: int) -> list[FlowPush]:
+    """
+    Забирает готовые к отправке записи и записи с истёкшей арендой.
+    Параллельные воркеры не получают одни и те же строки (SKIP LOCKED)
+    и не берут поток, который сейчас отправляет кто-то другой.
+    """
+    now = timezone.now()
+    busy_flows = FlowPush.objects.filter(status="in_progress", locked_until__gt=now).values("flow_id")
+    with transaction.atomic():
+        pushes = list(
+            FlowPush.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", next_attempt_at__lte=now)
+                | Q(status="in_progress", locked_until__lte=now)
+            )
+            .exclude(flow_id__in=busy_flows)
+            .order_by("created_at")[:limit]
+        )
+        # Один поток — одна отправка за проход
+        by_flow = {}
+        for push in pushes:
+            by_flow.setdefault(push.flow_id, push)
+        pushes = list(by_flow.values())
+        for push in pushes:
+            push.status = "in_progress"
+            push.attempts += 1
+            push.locked_until = now + timedelta(seconds=KEITARO_OUTBOX_LEASE)
+            # bulk_update не заполняет auto_now
+            push.updated_at = now
+        FlowPush.objects.bulk_update(pushes, ["status", "attempts", "locked_until", "updated_at"])
+    return pushes
+
+
+def drain_once(api: KeitaroAPIManager | None = None, limit: int = 20) -> list[FlowPush]:
+    """Один проход воркера: забрать, отправить параллельно, записать итоги."""
+    pushes = claim_pushes(limit)
+    if not pushes:
+        return []
+    flows = list(with_offer_flows(Flow.objects.filter(pk__in=[push.flow_id for push in pushes])))
+    results = {result.flow_id: result for result in publish_flows(api or KeitaroAPIManager(), flows)}
+    kid_by_pk = {flow.pk: flow.keitaro_flow_id for flow in flows}
+
+    now = timezone.now()
+    for push in pushes:
+        result = results[kid_by_pk[push.flow_id]]
+        push.locked_until = None
+        push.updated_at = now
+        if result.ok:
+            push.status = "done"
+            push.skipped = result.skipped
+            push.last_error = ""
+        else:
+            push.last_error = result.error or ""
+            if push.attempts >= KEITARO_OUTBOX_MAX_ATTEMPTS:
+                push.status = "failed"
+            else:
+                push.status = "pending"
+                push.next_attempt_at = now + timedelta(seconds=retry_delay(push.attempts))
+    FlowPush.objects.bulk_update(
+        pushes,
+        ["status", "skipped", "last_error", "locked_until", "next_attempt_at", "updated_at"],
+    )
+    return pushes
+
+
+def retry_delay(attempts: int) -> int:
+    return min(KEITARO_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), KEITARO_OUTBOX_MAX_RETRY_DELAY)
+
+
+def serialize_push(push: FlowPush) -> dict:
+    return {
+        "id": push.pk,
+        "flow_id": push.flow.keitaro_flow_id,
+        "status": push.status,
+        "attempts": push.attempts,
+        "skipped": push.skipped,
+        "error": push.last_error or None,
+        "next_attempt_at": push.next_attempt_at.isoformat() if push.status == "pending" else None,
+    }
@@ -0,0 +1,207 @@
+"""
+Публикация локальных правок потоков в Keitaro.
+
+Поток «грязный», если у него есть OfferFlow в pending_add/pending_delete
+или если payload, собранный из локальных данных, отличается от последнего
+увиденного в Keitaro (сравниваются отпечатки, см. sync.flow_fingerprint).
+PUT-запросы уходят параллельно с ограничением KEITARO_PUBLISH_CONCURRENCY;
+потоки пула работают только с HTTP, БД обновляется в вызывающем потоке.
+
+Payload, совпадающий с последним известным состоянием потока в Keitaro
+(Flow.published_payload / content_hash), не отправляется: такой push
+ничего не меняет. В режиме dry_run ничего не отправляется и не пишется в БД,
+а в результате возвращается diff относительно этого состояния.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from adrobot.settings import KEITARO_PUBLISH_CONCURRENCY
+from .api_manager import KeitaroAPIManager
+from .background import closing_connections
+from .models import Flow, OfferFlow
+from .sync import FLOW_FIELDS, flow_fingerprint
+from .types import FlowPayload
+
+
+PENDING_STATES = ("pending_add", "pending_delete")
+# Эти OfferFlow попадают в payload потока
+PUBLISHED_STATES = ("pending_add", "published")
+
+
+@dataclass
+class PublishResult:
+    flow_id: int
+    ok: bool
+    error: str | None = None
+    # Payload совпал с состоянием в Keitaro, запрос не отправлялся
+    skipped: bool = False
+    # Отличия payload от последнего известного состояния в Keitaro
+    diff: dict[str, Any] = field(default_factory=dict)
+    # Ответ Keitaro на PUT
+    flow: dict[str, Any] | None = field(default=None, repr=False)
+
+
+def with_offer_flows(flows):
+    """Подгружает OfferFlow с офферами в flow.offer_flows одним дополнительным запросом."""
+    return flows.prefetch_related(
+        Prefetch(
+            "offerflow_set",
+            queryset=OfferFlow.objects.select_related("offer").order_by("pk"),
+            to_attr="offer_flows",
+        )
+    )
+
+
+def build_flow_payload(flow: Flow) -> FlowPayload:
+    """
+    Полный payload потока для PUT streams/<id>: поля потока и его офферы.
+    Состояние оффера (active/disabled) берётся из последнего известного
+    состояния потока в Keitaro, новые офферы отправляются активными.
+    """
+    upstream_states = {
+        o["offer_id"]: o.get("state", "active")
+        for o in (flow.published_payload or {}).get("offers", [])
+    }
+    payload = {"id": flow.keitaro_flow_id}
+    payload.update({name: getattr(flow, name) for name in FLOW_FIELDS})
+    payload["offers"] = [
+        {
+            "offer_id": of.offer.keitaro_offer_id,
+            "share": of.share,
+            "state": upstream_states.get(of.offer.keitaro_offer_id, "active"),
+        }
+        for of in flow.offer_flows
+        if of.state in PUBLISHED_STATES
+    ]
+    return payload
+
+
+def is_dirty(flow: Flow) -> bool:
+    if any(of.state in PENDING_STATES for of in flow.offer_flows):
+        return True
+    return flow_fingerprint(build_flow_payload(flow)) != flow.content_hash
+
+
+def dirty_flows(campaign_id: int) -> tuple[list[Flow], int]:
+    """Потоки кампании, которые нужно отправить, и число чистых."""
+    flows = list(with_offer_flows(Flow.objects.filter(campaign_id=campaign_id).order_by("position", "pk")))
+    dirty = [flow for flow in flows if is_dirty(flow)]
+    return dirty, len(flows) - len(dirty)
+
+
+def diff_payload(old: dict | None, new: FlowPayload) -> dict[str, Any]:
+    """
+    {поле: {"from", "to"}} для полей потока и {"offers": {"added", "removed", "changed"}}
+    для офферов; пустой словарь, если отличий нет.
+    """
+    old = old or {}
+    diff: dict[str, Any] = {
+        name: {"from": old.get(name), "to": new.get(name)}
+        for name in FLOW_FIELDS
+        if old.get(name) != new.get(name)
+    }
+
+    old_offers = {o["offer_id"]: o for o in old.get("offers", [])}
+    new_offers = {o["offer_id"]: o for o in new.get("offers", [])}
+    offers = {
+        "added": [new_offers[offer_id] for offer_id in new_offers.keys() - old_offers.keys()],
+        "removed": [old_offers[offer_id] for offer_id in old_offers.keys() - new_offers.keys()],
+        "changed": [
+            {"offer_id": offer_id, "from": old_offers[offer_id], "to": new_offers[offer_id]}
+            for offer_id in new_offers.keys() & old_offers.keys()
+            if old_offers[offer_id] != new_offers[offer_id]
+        ],
+    }
+    if any(offers.values()):
+        diff["offers"] = {key: sorted(items, key=lambda o: o["offer_id"]) for key, items in offers.items()}
+    return diff
+
+
+def publish_flows(
+    api: KeitaroAPIManager,
+    flows: list[Flow],
+    max_workers: int = KEITARO_PUBLISH_CONCURRENCY,
+    dry_run: bool = False,
+) -> list[PublishResult]:
+    """
+    Отправляет потоки (с подгруженными offer_flows) в Keitaro параллельно.
+    Потоки, payload которых совпал с состоянием в Keitaro, не отправляются.
+    Для отправленных и пропущенных фиксирует состояния OfferFlow, вошедших в payload.
+    """
+    if not flows:
+        return []
+    payloads = {flow.keitaro_flow_id: build_flow_payload(flow) for flow in flows}
+    diffs = {
+        flow.keitaro_flow_id: diff_payload(flow.published_payload, payloads[flow.keitaro_flow_id])
+        for flow in flows
+    }
+    unchanged = {
+        flow.keitaro_flow_id for flow in flows
+        if flow_fingerprint(payloads[flow.keitaro_flow_id]) == flow.content_hash
+    }
+    if dry_run:
+        return [
+            PublishResult(flow_id, ok=True, skipped=flow_id in unchanged, diff=diffs[flow_id])
+            for flow_id in payloads
+        ]
+
+    to_push = {flow_id: payload for flow_id, payload in payloads.items() if flow_id not in unchanged}
+    pushed = {}
+    if to_push:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(to_push))) as executor:
+            futures = {
+                flow_id: executor.submit(closing_connections, _push, api, flow_id, payload)
+                for flow_id, payload in to_push.items()
+            }
+        pushed = {flow_id: future.result() for flow_id, future in futures.items()}
+
+    results = []
+    for flow_id in payloads:
+        result = pushed.get(flow_id) or PublishResult(flow_id, ok=True, skipped=True)
+        result.diff = diffs[flow_id]
+        results.append(result)
+
+    succeeded = {result.flow_id for result in results if result.ok}
+    _mark_published([flow for flow in flows if flow.keitaro_flow_id in succeeded], payloads)
+    return results
+
+
+def _push(api: KeitaroAPIManager, flow_id: int, payload: FlowPayload) -> PublishResult:
+    try:
+        response = api.update_flow(flow_id, payload)
+    except Exception as exc:
+        logging.warning(f"Publishing flow {flow_id} failed: {exc}")
+        return PublishResult(flow_id, ok=False, error=str(exc))
+    # _send_put_request логирует ошибку и возвращает None
+    if response is None:
+        return PublishResult(flow_id, ok=False, error="Keitaro rejected the update")
+    return PublishResult(flow_id, ok=True, flow=response)
+
+
+def _mark_published(flows: list[Flow], payloads: dict[int, FlowPayload]) -> None:
+    """
+    Переводит отправленные pending_add в published, pending_delete — в deleted.
+    Трогаем только строки, прочитанные до отправки: правки, сделанные во время
+    публикации, остаются staged до следующей.
+    """
+    if not flows:
+        return
+    added = [of.pk for flow in flows for of in flow.offer_flows if of.state == "pending_add"]
+    removed = [of.pk for flow in flows for of in flow.offer_flows if of.state == "pending_delete"]
+    for flow in flows:
+        flow.published_payload = payloads[flow.keitaro_flow_id]
+        flow.content_hash = flow_fingerprint(flow.published_payload)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if added:
+            OfferFlow.objects.filter(pk__in=added, state="pending_add").update(state="published", updated_at=now)
+        if removed:
+            OfferFlow.objects.filter(pk__in=removed, state="pending_delete").update(state="deleted", updated_at=now)
+        Flow.objects.bulk_update(flows, ["content_hash", "published_payload"])
@@ -0,0 +1,208 @@
+"""
+Общие для всех процессов лимиты исходящих запросов к Keitaro.
+
+У каждого класса эндпоинтов (read — GET, write — POST/PUT) свои
+token bucket (RateLimitBucket: скорость и всплеск) и семафор одновременных
+запросов (RateLimitSlot: места с арендой на KEITARO_RATE_LIMIT_LEASE секунд).
+Состояние лежит в Postgres — единственном хранилище, общем для веб-воркеров
+и management-команд, — и меняется короткими транзакциями с SELECT ... FOR UPDATE.
+
+Запрос не падает, упёршись в лимит, а ждёт своей очереди до дедлайна
+(KEITARO_RATE_LIMIT_WAIT) и только потом получает RateLimitTimeout.
+
+Внутри transaction.atomic лимиты не применяются: блокировка строки лимита
+держалась бы до конца чужой транзакции и останавливала остальные процессы.
+Запросы к Keitaro и так делаются вне транзакций; каждый обход пишется в лог
+и считается в метрике keitaro_rate_limit_bypassed_total, чтобы вызов Keitaro
+из транзакции не проходил незамеченным. Потоки пула (fetch_many, publish_flows)
+работают на своих соединениях вне транзакции вызывающего и лимиты берут всегда.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from adrobot.settings import KEITARO_RATE_LIMIT_LEASE, KEITARO_RATE_LIMIT_WAIT, KEITARO_RATE_LIMITS
+from . import metrics
+from .models import RateLimitBucket, RateLimitSlot
+
+
+# Как часто ждущий запрос проверяет, не освободилось ли место в семафоре
+SLOT_POLL_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float
+    burst: int
+    max_in_flight: int
+
+
+LIMITS = {name: Limit(*values) for name, values in KEITARO_RATE_LIMITS.items()}
+
+
+class RateLimitTimeout(Exception):
+    """Лимит класса запросов не освободился до дедлайна."""
+
+    def __init__(self, name: str, waited: float):
+        super().__init__(f"Keitaro {name} limit did not free up in {waited:.0f}s")
+        self.name = name
+
+
+@dataclass
+class Permit:
+    """Разрешение на один запрос; занятое место семафора возвращается в release."""
+    name: str
+    holder: str
+    slot_id: int | None = None
+
+
+def endpoint_class(method: str) -> str:
+    return "read" if method.upper() in ("GET", "HEAD") else "write"
+
+
+@contextmanager
+def limited(name: str, wait: float = KEITARO_RATE_LIMIT_WAIT):
+    """Разрешение на один запрос класса name; внутри transaction.atomic — без лимита (см. выше)."""
+    permit = acquire(name, wait)
+    try:
+        yield permit
+    finally:
+        release(permit)
+
+
+@asynccontextmanager
+async def alimited(name: str, wait: float = KEITARO_RATE_LIMIT_WAIT):
+    permit = await aacquire(name, wait)
+    try:
+        yield permit
+    finally:
+        await sync_to_async(release)(permit)
+
+
+def acquire(name: str, wait: float = KEITARO_RATE_LIMIT_WAIT) -> Permit | None:
+    """Ждёт место в семафоре и токен класса name; None — лимиты не применяются."""
+    permit = _start(name)
+    if permit is None:
+        return None
+    deadline = time.monotonic() + wait
+    try:
+        while (delay := _attempt(permit)) > 0:
+            if time.monotonic() + delay > deadline:
+                metrics.count_rate_limit_timeout(name)
+                raise RateLimitTimeout(name, wait)
+            time.sleep(delay)
+    except BaseException:
+        release(permit)
+        raise
+    return permit
+
+
+async def aacquire(name: str, wait: float = KEITARO_RATE_LIMIT_WAIT) -> Permit | None:
+    """acquire для async-кода: ожидание не занимает поток."""
+    permit = await sync_to_async(_start)(name)
+    if permit is None:
+        return None
+    deadline = time.monotonic() + wait
+    try:
+        while (delay := await sync_to_async(_attempt)(permit)) > 0:
+            if time.monotonic() + delay > deadline:
+                metrics.count_rate_limit_timeout(name)
+                raise RateLimitTimeout(name, wait)
+            await asyncio.sleep(delay)
+    except BaseException:
+        await sync_to_async(release)(permit)
+        raise
+    return permit
+
+
+def release(permit: Permit | None) -> None:
+    if permit is None or permit.slot_id is None:
+        return
+    # Аренда могла истечь, и место уже занял другой — его не трогаем
+    RateLimitSlot.objects.filter(pk=permit.slot_id, holder=permit.holder).update(holder="", locked_until=None)
+    permit.slot_id = None
+
+
+def _start(name: str) -> Permit | None:
+    limit = LIMITS[name]
+    if not (limit.rate or limit.max_in_flight):
+        return None
+    if connection.in_atomic_block:
+        logging.info(f"Keitaro {name} limit bypassed: request made inside a DB transaction")
+        metrics.count_rate_limit_bypass(name)
+        return None
+    return Permit(name, uuid4().hex)
+
+
+def _attempt(permit: Permit) -> float:
+    """Один шаг: занять место, затем взять токен. 0 — разрешение получено, иначе сколько ждать."""
+    limit = LIMITS[permit.name]
+    if limit.max_in_flight and permit.slot_id is None:
+        permit.slot_id = _take_slot(permit, limit)
+        if permit.slot_id is None:
+            return SLOT_POLL_INTERVAL
+    if limit.rate:
+        return _take_token(permit.name, limit)
+    return 0
+
+
+def _take_slot(permit: Permit, limit: Limit) -> int | None:
+    now = timezone.now()
+    with transaction.atomic():
+        free = (
+            RateLimitSlot.objects.select_for_update(skip_locked=True)
+            .filter(name=permit.name, slot__lt=limit.max_in_flight)
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+            .order_by("slot")
+        )
+        slot = free.first()
+        if slot is None and _ensure_slots(permit.name, limit.max_in_flight):
+            slot = free.first()
+        if slot is None:
+            return None
+        slot.holder = permit.holder
+        slot.locked_until = now + timedelta(seconds=KEITARO_RATE_LIMIT_LEASE)
+        slot.save(update_fields=["holder", "locked_until"])
+    return slot.pk
+
+
+def _ensure_slots(name: str, count: int) -> bool:
+    """Создаёт недостающие места семафора; False — все уже есть."""
+    if RateLimitSlot.objects.filter(name=name, slot__lt=count).count() >= count:
+        return False
+    RateLimitSlot.objects.bulk_create(
+        [RateLimitSlot(name=name, slot=slot) for slot in range(count)],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def _take_token(name: str, limit: Limit) -> float:
+    """Берёт токен; если его нет — возвращает, через сколько секунд он накопится."""
+    now = timezone.now()
+    with transaction.atomic():
+        bucket = RateLimitBucket.objects.select_for_update().filter(name=name).first()
+        if bucket is None:
+            RateLimitBucket.objects.bulk_create(
+                [RateLimitBucket(name=name, tokens=limit.burst, refilled_at=now)],
+                ignore_conflicts=True,
+            )
+            bucket = RateLimitBucket.objects.select_for_update().get(name=name)
+
+        elapsed = max((now - bucket.refilled_at).total_seconds(), 0)
+        tokens = min(limit.burst, bucket.tokens + elapsed * limit.rate)
+        if tokens < 1:
+            return (1 - tokens) / limit.rate
+        bucket.tokens = tokens - 1
+        bucket.refilled_at = now
+        bucket.save(update_fields=["tokens", "refilled_at"])
+    return 0
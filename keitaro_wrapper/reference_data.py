@@ -0,0 +1,255 @@
+"""
+Справочники Keitaro (домены, офферы, источники, группы, действия потоков)
+с кешированием в режиме stale-while-revalidate.
+
+Каждый справочник описан в REGISTRY: свой ключ кеша, свой TTL и свой эндпоинт,
+поэтому промах по одному ресурсу не перезагружает остальные.
+
+В кеше хранится конверт {"value": ..., "fresh_until": ..., "fetched_at": ...}.
+Пока не истёк мягкий TTL, значение свежее. После него значение ещё отдаётся
+до жёсткого TTL, а обновление уходит в фон. Синхронно ресурс грузится только
+при полном отсутствии записи в кеше: пустой список — это тоже значение,
+а ошибка API значением не считается и в кеш не попадает.
+
+Загрузка идёт в режиме single-flight: одновременные промахи по одному ресурсу
+внутри процесса ждут один Future, а между воркерами gunicorn — блокировку
+в общем кеше (cache.add). Остальные ждут, пока лидер положит значение в кеш.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from django.core.cache import cache
+
+from adrobot.settings import (
+    KEITARO_REFERENCE_TTL,
+    KEITARO_REFERENCE_TTL_DEFAULT,
+    KEITARO_SINGLE_FLIGHT_LOCK_TTL,
+    KEITARO_SINGLE_FLIGHT_WAIT,
+)
+from . import background, metrics
+from .api_manager import KeitaroAPIManager
+
+
+@dataclass(frozen=True)
+class ReferenceResource:
+    """Справочник Keitaro: собственный ключ кеша, TTL и эндпоинт, из которого он грузится."""
+    name: str
+    endpoint: str
+    soft_ttl: int
+    hard_ttl: int
+
+    @property
+    def cache_key(self) -> str:
+        return f"keitaro_{self.name}"
+
+
+def _resource(name: str, endpoint: str) -> ReferenceResource:
+    soft_ttl, hard_ttl = KEITARO_REFERENCE_TTL.get(name, KEITARO_REFERENCE_TTL_DEFAULT)
+    return ReferenceResource(name, endpoint, soft_ttl, hard_ttl)
+
+
+REGISTRY = {
+    resource.name: resource
+    for resource in [
+        _resource("domains", "domains"),
+        _resource("offers", "offers"),
+        _resource("sources", "traffic_sources"),
+        _resource("groups", "groups"),
+        _resource("flow_actions", "streams_actions"),
+    ]
+}
+REFERENCE_RESOURCES = list(REGISTRY)
+
+# Как часто ждущий воркер проверяет кеш, пока лидер из другого процесса грузит данные
+POLL_INTERVAL = 0.05
+
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def cache_key(resource: str) -> str:
+    return REGISTRY[resource].cache_key
+
+
+def lock_key(resource: str) -> str:
+    return f"{cache_key(resource)}:lock"
+
+
+def get_reference_data(resources: Iterable[str] = REFERENCE_RESOURCES) -> dict[str, Any]:
+    """Отдаёт справочники из кеша, устаревшие обновляет в фоне."""
+    resources = list(resources)
+    keys = {resource: cache_key(resource) for resource in resources}
+    entries = cache.get_many(keys.values())
+
+    now = time.time()
+    data = {}
+    missing = []
+    stale = []
+    for resource, key in keys.items():
+        entry = entries.get(key)
+        if entry is None:
+            metrics.count_cache("reference", resource, "miss")
+            missing.append(resource)
+            continue
+        data[resource] = entry["value"]
+        if entry["fresh_until"] <= now:
+            metrics.count_cache("reference", resource, "stale")
+            stale.append(resource)
+        else:
+            metrics.count_cache("reference", resource, "hit")
+
+    if stale:
+        schedule_refresh(stale)
+    if missing:
+        data.update(refresh(missing))
+
+    return data
+
+
+def schedule_refresh(resources: list[str]) -> None:
+    """Ставит фоновое обновление ресурсов, которые ещё никто не обновляет."""
+    claimed, _ = _claim(resources)
+    if claimed:
+        background.submit(_run_claimed, claimed, wait=False)
+
+
+def refresh(resources: Iterable[str]) -> dict[str, Any]:
+    """
+    Загружает ресурсы из Keitaro и кладёт их в кеш.
+    Если ресурс уже грузится в этом или другом процессе, дожидается его результата.
+    """
+    claimed, waiting = _claim(resources)
+    data = _run_claimed(claimed, wait=True) if claimed else {}
+    for resource, future in waiting.items():
+        try:
+            data[resource] = future.result(timeout=KEITARO_SINGLE_FLIGHT_WAIT)
+        except FutureTimeoutError:
+            # Лидер всё ещё ждёт Keitaro: второй запрос к нему не отправляем,
+            # отдаём прежнее значение (или пустой список), а кеш заполнит лидер
+            logging.warning(f"Keitaro is slow, serving previous {resource}")
+            data[resource] = _stored_value(resource)
+
+    # Лидер из другого запроса мог не дождаться чужой блокировки
+    unresolved = [resource for resource, value in data.items() if value is None]
+    if unresolved:
+        data.update(_fetch_and_store(unresolved))
+    return data
+
+
+def _claim(resources: Iterable[str]) -> tuple[list[str], dict[str, Future]]:
+    """Делит ресурсы на те, что грузит этот поток, и те, что уже грузятся в процессе."""
+    claimed = []
+    waiting = {}
+    with _inflight_lock:
+        for resource in resources:
+            if resource in _inflight:
+                waiting[resource] = _inflight[resource]
+            else:
+                _inflight[resource] = Future()
+                claimed.append(resource)
+    return claimed, waiting
+
+
+def _run_claimed(claimed: list[str], wait: bool) -> dict[str, Any]:
+    data = {}
+    try:
+        owned = [
+            resource for resource in claimed
+            if cache.add(lock_key(resource), os.getpid(), KEITARO_SINGLE_FLIGHT_LOCK_TTL)
+        ]
+        try:
+            if owned:
+                data.update(_fetch_and_store(owned))
+        finally:
+            if owned:
+                cache.delete_many([lock_key(resource) for resource in owned])
+
+        # Эти ресурсы прямо сейчас грузит другой воркер
+        foreign = [resource for resource in claimed if resource not in owned]
+        if foreign and wait:
+            data.update(_wait_for_foreign(foreign))
+    except BaseException as exc:
+        _resolve(claimed, exc=exc)
+        raise
+    _resolve(claimed, data=data)
+    return data
+
+
+def _resolve(resources: list[str], data: dict[str, Any] | None = None, exc: BaseException | None = None) -> None:
+    with _inflight_lock:
+        futures = [_inflight.pop(resource) for resource in resources]
+    for resource, future in zip(resources, futures):
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(data.get(resource))
+
+
+def _wait_for_foreign(resources: list[str]) -> dict[str, Any]:
+    """
+    Ждёт, пока другой воркер положит ресурсы в кеш. Не дождавшись, отдаёт
+    прежнее значение, а сам грузит только ресурсы, которых в кеше нет вовсе.
+    """
+    started = time.time()
+    deadline = started + KEITARO_SINGLE_FLIGHT_WAIT
+    pending = list(resources)
+    data = {}
+
+    while pending and time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        # Сначала блокировки, потом значения: если блокировка снята, значение уже записано
+        locks = cache.get_many([lock_key(resource) for resource in pending])
+        entries = cache.get_many([cache_key(resource) for resource in pending])
+        for resource in list(pending):
+            entry = entries.get(cache_key(resource))
+            if entry is not None and entry["fetched_at"] >= started:
+                data[resource] = entry["value"]
+                pending.remove(resource)
+        if not any(lock_key(resource) in locks for resource in pending):
+            break
+
+    # Лидер всё ещё ждёт Keitaro или не получил ответа: не дублируем его запрос
+    stored = cache.get_many([cache_key(resource) for resource in pending])
+    for resource in list(pending):
+        entry = stored.get(cache_key(resource))
+        if entry is not None:
+            logging.warning(f"Keitaro is slow, serving previous {resource}")
+            data[resource] = entry["value"]
+            pending.remove(resource)
+    if pending:
+        data.update(_fetch_and_store(pending))
+    return data
+
+
+def _stored_value(resource: str) -> Any:
+    entry = cache.get(cache_key(resource))
+    return entry["value"] if entry else []
+
+
+def _fetch_and_store(resources: list[str]) -> dict[str, Any]:
+    results = KeitaroAPIManager().fetch_many(
+        {resource: REGISTRY[resource].endpoint for resource in resources}
+    )
+    now = time.time()
+    data = {}
+    for resource, result in results.items():
+        spec = REGISTRY[resource]
+        if not result.ok:
+            # Ошибку не кешируем как данные: отдаём прежнее значение, если оно есть,
+            # а повторные запросы к упавшему эндпоинту сдерживает отрицательный кеш API
+            logging.warning(f"Keeping previous {resource}: {result.error}")
+            data[resource] = _stored_value(resource)
+            continue
+        value = result.data or []
+        cache.set(
+            spec.cache_key,
+            {"value": value, "fresh_until": now + spec.soft_ttl, "fetched_at": now},
+            spec.hard_ttl,
+        )
+        data[resource] = value
+    return data
@@ -0,0 +1,332 @@
+"""
+Синхронизация потоков кампании и их офферов с локальной БД.
+
+Вся кампания сверяется за фиксированное число запросов, независимо от
+количества потоков и офферов: выборки по спискам id и bulk_create/bulk_update.
+Потоки и офферы зеркалируются upsert-ом (INSERT ... ON CONFLICT DO UPDATE)
+по уникальным keitaro_*_id, причём в запрос попадают только изменившиеся строки.
+
+Для каждого потока хранится отпечаток содержимого (поля + офферы). Потоки,
+отпечаток которых совпал с сохранённым, пропускаются целиком — вместе с их
+OfferFlow, поэтому синхронизация без изменений в Keitaro стоит один SELECT.
+
+Так же, по отпечаткам, зеркалируется каталог кампаний (mirror_campaigns).
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Campaign, Offer, Flow, OfferFlow
+from .types import Campaign as CampaignJSON, Flow as FlowJSON, Offer as OfferJSON
+
+
+# Поля Flow, которые приходят из Keitaro и обновляются при зеркалировании
+FLOW_FIELDS = [
+    "name", "type", "campaign_id", "position", "action_options", "comments",
+    "state", "action_type", "action_payload", "schema", "collect_clicks",
+    "filter_or", "weight", "offer_selection", "filters", "triggers", "landings",
+]
+
+# Поля Campaign, которые приходят из Keitaro и обновляются при зеркалировании
+CAMPAIGN_FIELDS = ["name", "alias", "state", "type", "group", "domain"]
+
+
+@dataclass
+class SyncReport:
+    flows_created: int = 0
+    flows_updated: int = 0
+    flows_skipped: int = 0
+    offers_created: int = 0
+    offer_flows_created: int = 0
+    offer_flows_updated: int = 0
+    offer_flows_deleted: int = 0
+    queries: int = 0
+
+
+@dataclass
+class CampaignSyncReport:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    deleted: int = 0
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы внутри блока."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def sync_campaign_flows(flows: list[FlowJSON]) -> SyncReport:
+    """Сверяет потоки, офферы и связи OfferFlow одной кампании с данными Keitaro."""
+    report = SyncReport()
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter), transaction.atomic():
+        flows_by_kid, changed = _mirror_flows(flows, report)
+        if changed:
+            offers_by_kid, report.offers_created = ensure_offers(
+                {o["offer_id"] for f in changed for o in f.get("offers", [])}
+            )
+            _reconcile_offer_flows(changed, flows_by_kid, offers_by_kid, report)
+    report.queries = counter.count
+    return report
+
+
+def _mirror_flows(flows: list[FlowJSON], report: SyncReport) -> tuple[dict[int, Flow], list[FlowJSON]]:
+    """
+    Upsert-ит новые и изменившиеся потоки.
+    Возвращает {keitaro_flow_id: Flow} и JSON потоков, которые нужно сверять дальше.
+    """
+    existing = {
+        flow.keitaro_flow_id: flow
+        for flow in Flow.objects.filter(keitaro_flow_id__in=[f["id"] for f in flows])
+    }
+    to_upsert = []
+    changed = []
+    # Повтор одного id в одном upsert Postgres не допускает
+    for f in {f["id"]: f for f in flows}.values():
+        incoming = flow_from_json(f)
+        current = existing.get(f["id"])
+        if current is None:
+            report.flows_created += 1
+        elif current.content_hash != incoming.content_hash:
+            report.flows_updated += 1
+        else:
+            report.flows_skipped += 1
+            continue
+        to_upsert.append(incoming)
+        changed.append(f)
+
+    if to_upsert:
+        # На Postgres upsert возвращает первичные ключи и для вставленных, и для обновлённых строк
+        Flow.objects.bulk_create(
+            to_upsert,
+            update_conflicts=True,
+            unique_fields=["keitaro_flow_id"],
+            update_fields=FLOW_FIELDS + ["content_hash", "upstream_updated_at", "published_payload"],
+        )
+        existing.update({flow.keitaro_flow_id: flow for flow in to_upsert})
+    return existing, changed
+
+
+def mirror_offers(offers: list[OfferJSON]) -> int:
+    """Upsert-ит новые и переименованные офферы; возвращает число затронутых строк."""
+    names = {o["id"]: o["name"] for o in offers}
+    existing = dict(
+        Offer.objects.filter(keitaro_offer_id__in=names)
+                     .values_list("keitaro_offer_id", "name")
+    )
+    changed = [
+        Offer(keitaro_offer_id=offer_id, name=name)
+        for offer_id, name in names.items()
+        if existing.get(offer_id) != name
+    ]
+    if changed:
+        Offer.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["keitaro_offer_id"],
+            update_fields=["name"],
+        )
+    return len(changed)
+
+
+def mirror_campaigns(campaigns: list[CampaignJSON], prune: bool = True) -> CampaignSyncReport:
+    """
+    Upsert-ит новые и изменившиеся кампании одним запросом.
+    prune — campaigns это полный список аккаунта: остальные кампании удаляются из каталога.
+    """
+    report = CampaignSyncReport()
+    incoming = {c["id"]: campaign_from_json(c) for c in campaigns}
+    with transaction.atomic():
+        existing = dict(
+            Campaign.objects.filter(keitaro_campaign_id__in=incoming)
+                            .values_list("keitaro_campaign_id", "content_hash")
+        )
+        changed = []
+        for campaign_id, campaign in incoming.items():
+            if campaign_id not in existing:
+                report.created += 1
+            elif existing[campaign_id] != campaign.content_hash:
+                report.updated += 1
+            else:
+                report.skipped += 1
+                continue
+            changed.append(campaign)
+        if changed:
+            Campaign.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["keitaro_campaign_id"],
+                update_fields=CAMPAIGN_FIELDS + ["content_hash", "upstream_updated_at", "updated_at"],
+            )
+        if prune:
+            report.deleted, _ = Campaign.objects.exclude(keitaro_campaign_id__in=incoming).delete()
+    return report
+
+
+def ensure_offers(offer_ids: Iterable[int]) -> tuple[dict[int, Offer], int]:
+    """
+    Создаёт отсутствующие офферы-заглушки.
+    Возвращает {keitaro_offer_id: Offer} и число созданных.
+    Имена существующих не трогаем — их зеркалирует mirror_offers.
+    """
+    offer_ids = set(offer_ids)
+    existing = {
+        offer.keitaro_offer_id: offer
+        for offer in Offer.objects.filter(keitaro_offer_id__in=offer_ids)
+    }
+    missing = offer_ids - existing.keys()
+    if missing:
+        Offer.objects.bulk_create(
+            [Offer(keitaro_offer_id=offer_id, name=f"offer #{offer_id}") for offer_id in missing],
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts не возвращает pk — перечитываем созданные одним запросом
+        existing.update({
+            offer.keitaro_offer_id: offer
+            for offer in Offer.objects.filter(keitaro_offer_id__in=missing)
+        })
+    return existing, len(missing)
+
+
+def _reconcile_offer_flows(
+    flows: list[FlowJSON],
+    flows_by_kid: dict[int, Flow],
+    offers_by_kid: dict[int, Offer],
+    report: SyncReport,
+) -> None:
+    # {(flow.pk, offer.pk): share} — как должно быть по данным Keitaro
+    incoming = {
+        (flows_by_kid[f["id"]].pk, offers_by_kid[o["offer_id"]].pk): o.get("share", 0)
+        for f in flows
+        for o in f.get("offers", [])
+    }
+    flow_pks = {flows_by_kid[f["id"]].pk for f in flows}
+    existing = {
+        (of.flow_id, of.offer_id): of
+        for of in OfferFlow.objects.filter(flow_id__in=flow_pks)
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    deleted = 0
+    for key, share in incoming.items():
+        offerflow = existing.get(key)
+        if offerflow is None:
+            to_create.append(OfferFlow(
+                flow_id=key[0],
+                offer_id=key[1],
+                share=share,
+                state="published",
+                is_pinned=False,
+            ))
+        elif offerflow.share != share or offerflow.state != "published":
+            # Обновляем долю и восстанавливаем ранее удалённые офферы
+            offerflow.share = share
+            offerflow.state = "published"
+            offerflow.updated_at = now
+            to_update.append(offerflow)
+
+    for key, offerflow in existing.items():
+        # Оффер пропал из Keitaro — помечаем опубликованную связь удалённой
+        if key not in incoming and offerflow.state == "published":
+            offerflow.share = 0
+            offerflow.state = "deleted"
+            offerflow.updated_at = now
+            to_update.append(offerflow)
+            deleted += 1
+
+    if to_create:
+        OfferFlow.objects.bulk_create(to_create)
+    if to_update:
+        OfferFlow.objects.bulk_update(to_update, ["share", "state", "updated_at"])
+
+    report.offer_flows_created = len(to_create)
+    report.offer_flows_updated = len(to_update) - deleted
+    report.offer_flows_deleted = deleted
+
+
+def flow_from_json(f: FlowJSON) -> Flow:
+    return Flow(
+        keitaro_flow_id=f["id"],
+        name=f["name"],
+        type=f["type"],
+        campaign_id=f["campaign_id"],
+        position=f["position"],
+        action_options=f["action_options"],
+        comments=f["comments"],
+        state=f["state"],
+        action_type=f["action_type"],
+        action_payload=f["action_payload"],
+        schema=f["schema"],
+        collect_clicks=f["collect_clicks"],
+        filter_or=f["filter_or"],
+        weight=f["weight"],
+        offer_selection=f["offer_selection"],
+        filters=f["filters"],
+        triggers=f["triggers"],
+        landings=f["landings"],
+        content_hash=flow_fingerprint(f),
+        upstream_updated_at=upstream_updated_at(f),
+        published_payload=upstream_payload(f),
+    )
+
+
+def campaign_from_json(c: CampaignJSON) -> Campaign:
+    fields = {name: c.get(name) or "" for name in CAMPAIGN_FIELDS}
+    return Campaign(
+        keitaro_campaign_id=c["id"],
+        content_hash=_fingerprint(fields),
+        upstream_updated_at=upstream_updated_at(c),
+        **fields,
+    )
+
+
+def upstream_payload(f: FlowJSON) -> dict:
+    """Поток из Keitaro в форме payload публикации (см. publishing.build_flow_payload)."""
+    payload = {"id": f["id"]}
+    payload.update({field: f.get(field) for field in FLOW_FIELDS})
+    payload["offers"] = [
+        {"offer_id": o["offer_id"], "share": o.get("share", 0), "state": o.get("state", "active")}
+        for o in f.get("offers", [])
+    ]
+    return payload
+
+
+def flow_fingerprint(f: FlowJSON) -> str:
+    """sha256 от нормализованного содержимого потока: зеркалируемые поля и офферы."""
+    content = {field: f.get(field) for field in FLOW_FIELDS}
+    content["offers"] = sorted(
+        [o["offer_id"], o.get("share", 0), o.get("state", "active")]
+        for o in f.get("offers", [])
+    )
+    return _fingerprint(content)
+
+
+def _fingerprint(content: dict) -> str:
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def upstream_updated_at(f: FlowJSON | CampaignJSON) -> datetime | None:
+    """Самый поздний updated_at потока (кампании) и его офферов в Keitaro."""
+    stamps = [f.get("updated_at")] + [o.get("updated_at") for o in f.get("offers", [])]
+    parsed = [parse_datetime(stamp) for stamp in stamps if stamp]
+    parsed = [
+        timezone.make_aware(stamp) if timezone.is_naive(stamp) else stamp
+        for stamp in parsed if stamp
+    ]
+    return max(parsed, default=None)
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import httpx
+from django.test import TestCase
+
+from keitaro_wrapper.api_manager import EndpointBackoff, clear_validators
+from keitaro_wrapper.async_api_manager import AsyncKeitaroAPIManager
+
+
+class TestAsyncKeitaroAPIManager(TestCase):
+    def setUp(self):
+        clear_validators()
+        self.requests = []
+        self.routes = {}
+
+    def make_api(self, handler=None) -> AsyncKeitaroAPIManager:
+        async def route(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return self.routes[request.url.path](request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler or route))
+        return AsyncKeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token", client=client)
+
+    async def test_get_campaigns_sends_api_key(self):
+        self.routes["/campaigns"] = lambda request: httpx.Response(200, json=[{"id": 1}])
+        campaigns = await self.make_api().get_campaigns()
+        self.assertEqual(campaigns, [{"id": 1}])
+        self.assertEqual(self.requests[0].headers["Api-Key"], "fake-token")
+
+    async def test_fetch_many_keeps_requests_in_flight_concurrently(self):
+        in_flight = 0
+        peak = 0
+
+        async def slow(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return httpx.Response(200, json={"path": request.url.path})
+
+        api = self.make_api(slow)
+        results = await api.fetch_many({f"c{i}": f"campaigns/{i}" for i in range(50)})
+
+        self.assertEqual(peak, 50)
+        self.assertEqual(results["c7"].data, {"path": "/campaigns/7"})
+
+    async def test_failed_endpoint_is_backed_off_and_others_are_unaffected(self):
+        self.routes["/groups"] = lambda request: httpx.Response(400)
+        self.routes["/offers"] = lambda request: httpx.Response(200, json=[])
+        api = self.make_api()
+
+        first = await api.fetch_many({"groups": "groups", "offers": "offers"})
+        self.assertIsInstance(first["groups"].error, httpx.HTTPStatusError)
+        self.assertTrue(first["offers"].empty)
+
+        second = await api.fetch("groups")
+        self.assertIsInstance(second.error, EndpointBackoff)
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_etag_is_sent_back_and_304_reuses_parsed_body(self):
+        self.routes["/offers"] = lambda request: httpx.Response(200, json=[{"id": 1}], headers={"ETag": '"v1"'})
+        api = self.make_api()
+        first = await api.fetch_offers()
+
+        self.routes["/offers"] = lambda request: httpx.Response(304)
+        second = await api.fetch_offers()
+
+        self.assertEqual(self.requests[1].headers["If-None-Match"], '"v1"')
+        self.assertTrue(second.not_modified)
+        self.assertIs(second.data, first.data)
+
+    async def test_post_and_put_return_json_or_none(self):
+        self.routes["/streams"] = lambda request: httpx.Response(200, json=json.loads(request.content))
+        self.routes["/streams/5"] = lambda request: httpx.Response(500)
+        api = self.make_api()
+
+        self.assertEqual(await api.create_flow({"name": "f"}), {"name": "f"})
+        self.assertIsNone(await api.update_flow(5, {"name": "f"}))
+        self.assertEqual(self.requests[1].method, "PUT")
+
+
+class AsyncViewsTests(TestCase):
+
+    def test_io_bound_views_are_async(self):
+        from keitaro_wrapper import views
+
+        for view in (
+            views.CampaignEditListView,
+            views.CampaignDetailView,
+            views.CampaignFlowsView,
+            views.CampaignSnapshotView,
+            views.OffersView,
+            views.FlowUpdateView,
+        ):
+            self.assertTrue(view.view_is_async, view.__name__)
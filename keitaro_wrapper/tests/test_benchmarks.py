@@ -0,0 +1,62 @@
+import os
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, tag
+
+from ..benchmarks import (
+    BENCHMARKS,
+    SIZES,
+    Measurement,
+    budget_for,
+    count_queries,
+    load_budgets,
+    measure,
+    over_budget,
+)
+
+
+class BudgetTests(TestCase):
+
+    def test_query_regression_is_reported(self):
+        budgets = {"offers_warm": {"10": budget_for(Measurement(seconds=0.01, queries=1, peak_kib=100))}}
+
+        self.assertEqual(over_budget("offers_warm", 10, Measurement(0.01, 1, 100), budgets), [])
+        self.assertEqual(
+            over_budget("offers_warm", 10, Measurement(0.01, 2, 100), budgets),
+            ["offers_warm[10]: queries 2 > 1"],
+        )
+        self.assertEqual(len(over_budget("offers_warm", 100, Measurement(0.01, 1, 100), budgets)), 1)
+
+    def test_every_path_and_size_has_a_budget(self):
+        budgets = load_budgets()
+        for benchmark in BENCHMARKS:
+            self.assertEqual(sorted(budgets[benchmark.name], key=int), [str(size) for size in SIZES])
+
+    def test_query_counts_match_budgets(self):
+        # Число запросов не зависит ни от машины, ни от размера кампании — хватает малых размеров
+        budgets = load_budgets()
+        for benchmark in BENCHMARKS:
+            for size in SIZES[:2]:
+                with self.subTest(benchmark=benchmark.name, size=size):
+                    self.assertEqual(count_queries(benchmark, size), budgets[benchmark.name][str(size)]["queries"])
+
+    def test_refuses_to_run_on_a_non_test_database(self):
+        with patch.dict(connection.settings_dict, {"NAME": "adrobot", "TEST": {}}):
+            with self.assertRaises(RuntimeError):
+                count_queries(BENCHMARKS[0], SIZES[0])
+
+
+# Время и память записаны на одной машине и на других будут ложно падать;
+# полный прогон (около минуты): RUN_BENCHMARKS=1 manage.py test --tag benchmark
+@tag("benchmark")
+@skipUnless(os.environ.get("RUN_BENCHMARKS"), "бюджеты времени и памяти проверяются только с RUN_BENCHMARKS=1")
+class BenchmarkBudgetTests(TestCase):
+
+    def test_paths_stay_within_budgets(self):
+        budgets = load_budgets()
+        for benchmark in BENCHMARKS:
+            for size in SIZES:
+                with self.subTest(benchmark=benchmark.name, size=size):
+                    self.assertEqual(over_budget(benchmark.name, size, measure(benchmark, size), budgets), [])
@@ -0,0 +1,17 @@
+from django.core.cache import cache, caches
+from django.test import TestCase
+
+
+class SharedCacheTests(TestCase):
+
+    def test_cache_is_shared_between_independent_connections(self):
+        # Отдельный экземпляр бэкенда — как в другом воркере gunicorn
+        other_worker_cache = caches.create_connection("default")
+
+        cache.set("keitaro_domains", [{"id": 1}], 60)
+
+        self.assertEqual(other_worker_cache.get("keitaro_domains"), [{"id": 1}])
+
+    def test_expired_entries_are_not_returned(self):
+        cache.set("keitaro_offers", [{"id": 1}], -1)
+        self.assertIsNone(cache.get("keitaro_offers"))
@@ -0,0 +1,126 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..api_manager import FetchResult
+from ..campaign_catalog import CampaignPage, refresh_catalog, search_campaigns
+from ..models import Campaign
+from ..sync import mirror_campaigns
+
+
+def make_campaigns(count: int, first_id: int = 1, state: str = "active") -> list[dict]:
+    return [
+        {
+            "id": campaign_id, "name": f"Campaign {campaign_id:04d}", "alias": f"alias-{campaign_id}",
+            "state": state, "type": "position", "group": "", "domain": "example.com",
+            "updated_at": "2025-01-01 10:00:00",
+        }
+        for campaign_id in range(first_id, first_id + count)
+    ]
+
+
+def fake_api(campaigns=None, error=None):
+    api = MagicMock()
+    api.fetch.return_value = FetchResult(data=campaigns, error=error)
+    return api
+
+
+class CampaignCatalogTests(TestCase):
+
+    def test_mirror_skips_unchanged_and_prunes_missing(self):
+        campaigns = make_campaigns(5)
+        mirror_campaigns(campaigns)
+
+        campaigns[0]["name"] = "Renamed"
+        report = mirror_campaigns(campaigns[:4])
+
+        self.assertEqual((report.created, report.updated, report.skipped, report.deleted), (0, 1, 3, 1))
+        self.assertEqual(Campaign.objects.get(keitaro_campaign_id=1).name, "Renamed")
+        self.assertFalse(Campaign.objects.filter(keitaro_campaign_id=5).exists())
+
+    def test_failed_refresh_keeps_catalog(self):
+        refresh_catalog(fake_api(make_campaigns(3)))
+        self.assertIsNone(refresh_catalog(fake_api(error=RuntimeError("boom"))))
+        self.assertEqual(Campaign.objects.count(), 3)
+
+    def test_unchanged_response_still_reconciles_catalog(self):
+        campaigns = make_campaigns(3)
+        refresh_catalog(fake_api(campaigns))
+        # Другой процесс записал в каталог иное, а ответ Keitaro не изменился
+        mirror_campaigns([{**campaigns[0], "name": "Drifted"}], prune=False)
+        Campaign.objects.filter(keitaro_campaign_id=3).delete()
+
+        api = fake_api(campaigns)
+        api.fetch.return_value = FetchResult(data=campaigns, not_modified=True)
+        report = refresh_catalog(api)
+
+        self.assertEqual((report.created, report.updated, report.skipped), (1, 1, 1))
+        self.assertEqual(Campaign.objects.get(keitaro_campaign_id=1).name, "Campaign 0001")
+
+    def test_keyset_pages_cover_catalog_in_both_directions(self):
+        mirror_campaigns(make_campaigns(7))
+        campaigns = search_campaigns()
+
+        first = CampaignPage(campaigns, 3)
+        second = CampaignPage(campaigns, 3, after=first.next_cursor)
+        third = CampaignPage(campaigns, 3, after=second.next_cursor)
+        self.assertEqual([c.keitaro_campaign_id for c in second.items], [4, 5, 6])
+        self.assertEqual([c.keitaro_campaign_id for c in third.items], [7])
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = CampaignPage(campaigns, 3, before=third.previous_cursor)
+        self.assertEqual([c.keitaro_campaign_id for c in back.items], [4, 5, 6])
+        self.assertTrue(back.has_previous and back.has_next)
+
+        # Испорченный курсор — первая страница
+        self.assertEqual(CampaignPage(campaigns, 3, after="garbage!").items, first.items)
+
+    def test_search_by_name_alias_id_and_state(self):
+        mirror_campaigns(make_campaigns(3) + make_campaigns(2, first_id=20, state="disabled"))
+
+        self.assertEqual(search_campaigns("campaign 002").count(), 2)
+        self.assertEqual(list(search_campaigns("ALIAS-3").values_list("keitaro_campaign_id", flat=True)), [3])
+        self.assertEqual(list(search_campaigns("21").values_list("keitaro_campaign_id", flat=True)), [21])
+        self.assertEqual(search_campaigns(state="disabled").count(), 2)
+
+
+class CampaignEditListTests(TestCase):
+    url = reverse("keitaro_wrapper:edit_company")
+
+    @patch("keitaro_wrapper.campaign_catalog.background.submit")
+    def test_unsynced_catalog_is_loaded_in_background(self, submit):
+        resp = self.client.get(self.url)
+        self.assertContains(resp, "Каталог кампаний загружается")
+        submit.assert_called_once_with(refresh_catalog)
+
+    @patch("keitaro_wrapper.views.KEITARO_CAMPAIGNS_PAGE_SIZE", 2)
+    @patch("keitaro_wrapper.campaign_catalog.background.submit")
+    def test_list_renders_one_page_from_catalog(self, submit):
+        refresh_catalog(fake_api(make_campaigns(5)))
+
+        resp = self.client.get(self.url)
+        self.assertContains(resp, "Campaign 0002")
+        self.assertNotContains(resp, "Campaign 0003")
+        submit.assert_not_called()
+
+        page = CampaignPage(search_campaigns(), 2)
+        resp = self.client.get(self.url, {"after": page.next_cursor})
+        self.assertContains(resp, "Campaign 0003")
+        self.assertContains(resp, "before=")
+
+    @patch("keitaro_wrapper.campaign_catalog.background.submit")
+    def test_page_fragment_is_cached_until_catalog_changes(self, submit):
+        refresh_catalog(fake_api(make_campaigns(2)))
+        self.client.get(self.url)
+
+        # Версия каталога не изменилась — страница берётся из кеша фрагментов
+        campaign = Campaign.objects.get(keitaro_campaign_id=1)
+        Campaign.objects.filter(pk=campaign.pk).update(name="Stale", updated_at=campaign.updated_at)
+        self.assertContains(self.client.get(self.url), "Campaign 0001")
+
+        campaigns = make_campaigns(2)
+        campaigns[0]["name"] = "Fresh"
+        mirror_campaigns(campaigns)
+        self.assertContains(self.client.get(self.url), "Fresh")
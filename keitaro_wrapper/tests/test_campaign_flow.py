@@ -2,14 +2,15 @@ from unittest.mock import patch
 from django.test import TestCase
 from django.urls import reverse
 
+from ..api_manager import FetchResult
 from ..models import Flow, Offer, OfferFlow
 
 
 class CampaignFlowsTests(TestCase):
 
-    @patch("keitaro_wrapper.views.KeitaroAPIManager")
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
     def test_flows_insert_and_offerflows(self, mock_api):
-        mock_api.return_value.get_flows.return_value = [
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=[
             {
                 "id": 1,
                 "name": "Main",
@@ -34,7 +35,7 @@ class CampaignFlowsTests(TestCase):
                     {"offer_id": 200, "share": 30}
                 ]
             }
-        ]
+        ])
 
         url = reverse("keitaro_wrapper:campaign_streams", args=[123])
         response = self.client.get(url)
@@ -52,7 +53,7 @@ class CampaignFlowsTests(TestCase):
         self.assertEqual(of200.share, 30)
         self.assertEqual(of200.state, "published")
 
-    @patch("keitaro_wrapper.views.KeitaroAPIManager")
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
     def test_offerflow_deleted_when_missing(self, mock_api):
         flow = Flow.objects.create(
             keitaro_flow_id=1, name="x", type="x", campaign_id=123,
@@ -69,7 +70,7 @@ class CampaignFlowsTests(TestCase):
         OfferFlow.objects.create(flow=flow, offer=offer1, share=50, state="published")
         OfferFlow.objects.create(flow=flow, offer=offer2, share=50, state="published")
 
-        mock_api.return_value.get_flows.return_value = [
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=[
             {
                 "id": 1, "name": "x", "type": "x", "campaign_id": 123,
                 "position": 0, "action_options": {}, "comments": "",
@@ -79,7 +80,7 @@ class CampaignFlowsTests(TestCase):
                 "triggers": [], "landings": [],
                 "offers": [{"offer_id": 100, "share": 50}]
             }
-        ]
+        ])
 
         url = reverse("keitaro_wrapper:campaign_streams", args=[123])
         self.client.get(url)
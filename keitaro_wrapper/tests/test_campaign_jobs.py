@@ -0,0 +1,190 @@
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+import requests
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..api_manager import FetchResult
+from ..campaign_jobs import create_job, run_job
+from ..models import CampaignCreationJob
+
+
+def inline_submit(fn, *args, **kwargs):
+    fn(*args, **kwargs)
+
+
+REFERENCE_DATA = {
+    "domains": [{"id": 1}],
+    "sources": [{"id": 2}],
+    "groups": [],
+    "offers": [{"id": 10, "name": "Offer A"}],
+    "flow_actions": [{"key": "http", "type": "redirect"}],
+}
+
+
+def make_api(campaign=None, flows=None):
+    api = MagicMock()
+    api.send.return_value = FetchResult(data=campaign if campaign is not None else {"id": 55, "name": "Test"})
+    api.create_flow.side_effect = flows or (lambda payload: {"id": payload["name"]})
+    api.fetch.return_value = FetchResult(data=[])
+    return api
+
+
+class CampaignCreationJobTests(TestCase):
+
+    def make_job(self):
+        with patch("keitaro_wrapper.campaign_jobs.background.submit"):
+            return create_job(
+                name="Test",
+                campaign_payload={"name": "Test", "alias": "test"},
+                country_code="DE",
+                offer_id=10,
+                offer_name="Offer A",
+            )
+
+    @patch("keitaro_wrapper.campaign_jobs.background.submit", side_effect=inline_submit)
+    @patch("keitaro_wrapper.views.get_reference_data", return_value=REFERENCE_DATA)
+    @patch("keitaro_wrapper.campaign_jobs.KeitaroAPIManager")
+    def test_form_returns_immediately_and_job_runs_after_commit(self, mock_api, _data, _submit):
+        mock_api.return_value = make_api()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            resp = self.client.post(
+                reverse("keitaro_wrapper:create_company"),
+                {"name": "Test", "country": "DE", "offer": "10"},
+            )
+        job = CampaignCreationJob.objects.get()
+        self.assertRedirects(resp, f"{reverse('keitaro_wrapper:create_company')}?job={job.pk}", fetch_redirect_response=False)
+        mock_api.return_value.send.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.campaign_id, 55)
+        self.assertRegex(job.campaign_payload["alias"], r"^test-[0-9a-f]{8}$")
+        self.assertEqual(job.steps["geo_flow"]["keitaro_id"], "55-geo-redirect")
+        self.assertEqual(job.steps["offer_flow"]["keitaro_id"], "55-offer")
+
+        status = self.client.get(reverse("keitaro_wrapper:campaign_job_status", args=[job.pk])).json()["job"]
+        self.assertEqual(status["status"], "done")
+
+    def test_failed_flow_is_retried_without_recreating_campaign(self):
+        job = self.make_job()
+
+        def flaky(payload):
+            return None if payload["name"].endswith("offer") else {"id": 1}
+
+        api = make_api(flows=flaky)
+        job = run_job(job.pk, api=api)
+        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.steps["campaign"]["status"], "done")
+        self.assertEqual(job.steps["geo_flow"]["status"], "done")
+        self.assertEqual(job.steps["offer_flow"]["status"], "failed")
+        self.assertGreater(job.next_attempt_at, timezone.now())
+
+        CampaignCreationJob.objects.update(next_attempt_at=timezone.now())
+        api.create_flow.side_effect = lambda payload: {"id": 2}
+        job = run_job(job.pk, api=api)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(api.send.call_count, 1)
+        # Второй раз создаётся только упавший поток
+        self.assertEqual(api.create_flow.call_count, 3)
+
+    @patch("keitaro_wrapper.campaign_jobs.KEITARO_OUTBOX_MAX_ATTEMPTS", 1)
+    def test_failed_campaign_step_skips_flows_and_can_be_resumed(self):
+        job = self.make_job()
+        api = make_api(campaign={})
+        job = run_job(job.pk, api=api)
+        self.assertEqual(job.status, "failed")
+        api.create_flow.assert_not_called()
+
+        api.send.return_value = FetchResult(data={"id": 77})
+        with patch("keitaro_wrapper.management.commands.resume_campaign_jobs.KeitaroAPIManager", return_value=api):
+            out = StringIO()
+            call_command("resume_campaign_jobs", str(job.pk), stdout=out)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.campaign_id), ("done", 77))
+        self.assertIn("done", out.getvalue())
+
+    def test_campaign_created_by_a_timed_out_attempt_is_adopted(self):
+        job = self.make_job()
+        alias = job.campaign_payload["alias"]
+        # POST упал по таймауту, но кампанию Keitaro создал
+        api = make_api()
+        api.send.return_value = FetchResult(error=requests.ReadTimeout("timeout"))
+        job = run_job(job.pk, api=api)
+        self.assertEqual(job.steps["campaign"]["status"], "unconfirmed")
+
+        CampaignCreationJob.objects.update(next_attempt_at=timezone.now())
+        api.fetch.return_value = FetchResult(data=[
+            {"id": 87, "name": "Test", "alias": "test"},
+            {"id": 88, "name": "Test", "alias": alias},
+        ])
+        job = run_job(job.pk, api=api)
+
+        self.assertEqual((job.status, job.campaign_id), ("done", 88))
+        self.assertEqual(api.send.call_count, 1)
+        api.fetch.assert_called_once_with("campaigns")
+
+    def test_campaign_is_posted_again_when_timed_out_attempt_created_nothing(self):
+        job = self.make_job()
+        api = make_api()
+        api.send.return_value = FetchResult(error=requests.ConnectionError("reset"))
+        run_job(job.pk, api=api)
+
+        CampaignCreationJob.objects.update(next_attempt_at=timezone.now())
+        api.fetch.return_value = FetchResult(data=[{"id": 87, "name": "Test", "alias": "test"}])
+        api.send.return_value = FetchResult(data={"id": 89})
+        job = run_job(job.pk, api=api)
+
+        self.assertEqual((job.status, job.campaign_id), ("done", 89))
+        self.assertEqual(api.send.call_count, 2)
+
+    def test_campaign_is_not_posted_again_when_lookup_fails(self):
+        job = self.make_job()
+        api = make_api()
+        api.send.return_value = FetchResult(error=requests.ReadTimeout("timeout"))
+        run_job(job.pk, api=api)
+
+        CampaignCreationJob.objects.update(next_attempt_at=timezone.now())
+        api.fetch.return_value = FetchResult(error=Exception("timeout"))
+        job = run_job(job.pk, api=api)
+
+        self.assertEqual(job.steps["campaign"]["status"], "unconfirmed")
+        self.assertEqual(api.send.call_count, 1)
+
+    def test_http_error_is_retried_without_lookup(self):
+        job = self.make_job()
+        api = make_api()
+        api.send.return_value = FetchResult(error=requests.HTTPError("502 Bad Gateway"))
+        job = run_job(job.pk, api=api)
+        self.assertEqual(job.steps["campaign"]["status"], "failed")
+
+        CampaignCreationJob.objects.update(next_attempt_at=timezone.now())
+        api.send.return_value = FetchResult(data={"id": 90})
+        job = run_job(job.pk, api=api)
+
+        self.assertEqual((job.status, job.campaign_id), ("done", 90))
+        api.fetch.assert_not_called()
+
+    def test_worker_lost_during_post_looks_campaign_up(self):
+        job = self.make_job()
+        api = make_api()
+        api.send.side_effect = RuntimeError("worker killed")
+        run_job(job.pk, api=api)
+
+        job.refresh_from_db()
+        self.assertEqual(job.steps["campaign"]["status"], "unconfirmed")
+
+    def test_running_job_is_not_picked_twice(self):
+        job = self.make_job()
+        CampaignCreationJob.objects.update(
+            status="running", locked_until=timezone.now() + timezone.timedelta(minutes=1)
+        )
+        api = make_api()
+        self.assertIsNone(run_job(job.pk, api=api))
+        api.send.assert_not_called()
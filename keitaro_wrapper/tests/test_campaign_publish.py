@@ -0,0 +1,127 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Flow, FlowPush, Offer, OfferFlow
+from ..outbox import drain_once
+from ..publishing import build_flow_payload, dirty_flows, with_offer_flows
+from ..sync import sync_campaign_flows
+from .test_sync import make_flows
+
+
+class CampaignPublishTests(TestCase):
+
+    def setUp(self):
+        sync_campaign_flows(make_flows(5, 2))
+        self.url = reverse("keitaro_wrapper:campaign_publish", args=[123])
+
+    def stage(self):
+        # Поток 2: новый оффер; поток 3: изменённая доля опубликованного оффера
+        offer = Offer.objects.create(keitaro_offer_id=999, name="New")
+        OfferFlow.objects.create(flow=Flow.objects.get(keitaro_flow_id=2), offer=offer, share=0, state="pending_add")
+        OfferFlow.objects.filter(flow__keitaro_flow_id=3, offer__keitaro_offer_id=300).update(share=70)
+
+    def test_freshly_synced_campaign_is_clean(self):
+        flows, clean = dirty_flows(123)
+        self.assertEqual(flows, [])
+        self.assertEqual(clean, 5)
+
+    def test_payload_matches_keitaro_shape(self):
+        flow = with_offer_flows(Flow.objects.all()).get(keitaro_flow_id=1)
+        payload = build_flow_payload(flow)
+        self.assertEqual(payload["id"], 1)
+        self.assertEqual(payload["campaign_id"], 123)
+        self.assertEqual(
+            payload["offers"],
+            [{"offer_id": 100, "share": 50, "state": "active"}, {"offer_id": 101, "share": 50, "state": "active"}],
+        )
+
+    def test_disabled_upstream_offer_is_not_published(self):
+        flows = make_flows(1, 2, first_id=10)
+        flows[0]["offers"][1]["state"] = "disabled"
+        sync_campaign_flows(flows)
+
+        flow = with_offer_flows(Flow.objects.all()).get(keitaro_flow_id=10)
+        self.assertEqual(build_flow_payload(flow)["offers"][1]["state"], "disabled")
+        self.assertEqual(dirty_flows(123), ([], 6))
+
+        resp = self.client.post(self.url)
+        self.assertEqual(resp.json()["pushes"], [])
+        self.assertFalse(FlowPush.objects.exists())
+
+    @patch("keitaro_wrapper.outbox.KeitaroAPIManager")
+    def test_enqueues_only_dirty_flows_and_reports_per_push(self, mock_api):
+        self.stage()
+        mock_api.return_value.update_flow.side_effect = (
+            lambda flow_id, payload: None if flow_id == 3 else {"id": flow_id}
+        )
+
+        resp = self.client.post(self.url)
+        self.assertEqual(resp.status_code, 202)
+        data = resp.json()
+        mock_api.return_value.update_flow.assert_not_called()
+        self.assertEqual(sorted(p["push"]["flow_id"] for p in data["pushes"]), [2, 3])
+        self.assertEqual(data["skipped"], 3)
+
+        drain_once()
+        statuses = {
+            push["flow_id"]: push["status"]
+            for push in (self.client.get(p["status_url"]).json()["push"] for p in data["pushes"])
+        }
+        self.assertEqual(statuses, {2: "done", 3: "pending"})
+        self.assertEqual(
+            OfferFlow.objects.get(flow__keitaro_flow_id=2, offer__keitaro_offer_id=999).state, "published"
+        )
+
+        # Упавший поток остаётся грязным, отправленный — нет
+        flows, _ = dirty_flows(123)
+        self.assertEqual([flow.keitaro_flow_id for flow in flows], [3])
+
+    def test_clean_campaign_enqueues_nothing(self):
+        resp = self.client.post(self.url)
+        self.assertEqual((resp.json()["pushes"], resp.json()["skipped"]), ([], 5))
+        self.assertFalse(FlowPush.objects.exists())
+
+    def test_single_flow_dry_run_shows_diff(self):
+        self.stage()
+        resp = self.client.put(reverse("keitaro_wrapper:flow_update", args=[2]) + "?dry_run=1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.json()["skipped"])
+        self.assertEqual(resp.json()["diff"]["offers"]["added"][0]["offer_id"], 999)
+
+    @patch("keitaro_wrapper.views.KeitaroAPIManager")
+    def test_dry_run_returns_diff_without_side_effects(self, mock_api):
+        self.stage()
+
+        resp = self.client.post(f"{self.url}?dry_run=1")
+        data = resp.json()
+        self.assertTrue(data["dry_run"])
+        diffs = {r["flow_id"]: r["diff"] for r in data["results"]}
+        self.assertEqual(
+            diffs[2]["offers"]["added"], [{"offer_id": 999, "share": 0, "state": "active"}]
+        )
+        self.assertEqual(
+            diffs[3]["offers"]["changed"],
+            [{
+                "offer_id": 300,
+                "from": {"offer_id": 300, "share": 50, "state": "active"},
+                "to": {"offer_id": 300, "share": 70, "state": "active"},
+            }],
+        )
+        mock_api.return_value.update_flow.assert_not_called()
+        self.assertEqual(OfferFlow.objects.filter(state="pending_add").count(), 1)
+
+    @patch("keitaro_wrapper.outbox.KeitaroAPIManager")
+    def test_republish_after_success_is_a_no_op(self, mock_api):
+        self.stage()
+        mock_api.return_value.update_flow.side_effect = lambda flow_id, payload: {"id": flow_id}
+        self.client.post(self.url)
+        drain_once()
+        self.assertEqual(mock_api.return_value.update_flow.call_count, 2)
+        self.assertEqual(
+            Flow.objects.get(keitaro_flow_id=3).published_payload["offers"][0]["share"], 70
+        )
+
+        resp = self.client.post(self.url)
+        self.assertEqual((resp.json()["pushes"], resp.json()["skipped"]), ([], 5))
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Offer, OfferFlow
+from ..api_manager import FetchResult
+from .test_sync import make_flows
+
+
+class CampaignSnapshotTests(TestCase):
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_snapshot_returns_flows_offer_flows_and_offer_names(self, mock_api):
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=make_flows(2, 2))
+        Offer.objects.create(keitaro_offer_id=100, name="Offer A")
+
+        resp = self.client.get(reverse("keitaro_wrapper:campaign_snapshot", args=[123]))
+        self.assertEqual(resp.status_code, 200)
+
+        data = resp.json()
+        self.assertEqual([f["id"] for f in data["flows"]], [1, 2])
+        self.assertEqual(
+            data["flows"][0]["offer_flows"],
+            [
+                {"offer": 100, "flow": 1, "share": 50, "state": "published", "is_pinned": False},
+                {"offer": 101, "flow": 1, "share": 50, "state": "published", "is_pinned": False},
+            ],
+        )
+        self.assertEqual(data["offers"]["100"], "Offer A")
+        self.assertEqual(data["offers"]["201"], "offer #201")
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_query_count_does_not_depend_on_flow_count(self, mock_api):
+        url = reverse("keitaro_wrapper:campaign_snapshot", args=[123])
+
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=make_flows(2, 2))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=make_flows(40, 5, first_id=10))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+
+        self.assertEqual(OfferFlow.objects.filter(flow__keitaro_flow_id__gte=10).count(), 200)
+        self.assertEqual(len(small), len(large))
@@ -0,0 +1,183 @@
+import time
+from unittest.mock import patch
+
+import httpx
+import requests
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from keitaro_wrapper.api_manager import (
+    EndpointBackoff,
+    FetchResult,
+    KeitaroAPIManager,
+    clear_validators,
+    failure_key,
+    probe_key,
+)
+from keitaro_wrapper.async_api_manager import AsyncKeitaroAPIManager
+from keitaro_wrapper.models import Offer
+from keitaro_wrapper.rate_limit import RateLimitTimeout
+
+from .test_keitaro_api import make_response
+
+
+class CircuitBreakerTests(TestCase):
+    url = "https://fakehost/campaigns"
+
+    def setUp(self):
+        clear_validators()
+        self.api = KeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token")
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_open_circuit_serves_last_known_good_as_stale(self, mock_get):
+        mock_get.return_value = make_response([{"id": 1}])
+        self.assertEqual(self.api.get_campaigns(), [{"id": 1}])
+
+        mock_get.return_value = make_response(status=503, body=b"")
+        failed = self.api.fetch("campaigns")
+        self.assertTrue(failed.stale)
+        self.assertEqual(failed.status, "stale")
+        self.assertEqual(failed.data, [{"id": 1}])
+        self.assertIsNotNone(failed.fetched_at)
+
+        # Цепь разомкнута: Keitaro не запрашивается, но данные те же
+        self.assertEqual(self.api.get_campaigns(), [{"id": 1}])
+        self.assertIsInstance(self.api.fetch("campaigns").error, EndpointBackoff)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_without_snapshot_failure_is_plain_error(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError("down")
+        result = self.api.fetch("campaigns")
+        self.assertEqual(result.status, "error")
+        self.assertEqual(self.api.get_campaigns(), [])
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_half_open_circuit_lets_single_probe_through(self, mock_get):
+        mock_get.return_value = make_response([{"id": 1}])
+        cache.set(failure_key(self.url), {"failures": 3, "retry_at": time.time() - 1})
+
+        # Пробный запрос уже делает другой процесс
+        cache.add(probe_key(self.url), 1)
+        self.assertIsInstance(self.api.fetch("campaigns").error, EndpointBackoff)
+        mock_get.assert_not_called()
+
+        cache.delete(probe_key(self.url))
+        self.assertTrue(self.api.fetch("campaigns").ok)
+        self.assertIsNone(cache.get(failure_key(self.url)))
+        self.assertIsNone(cache.get(probe_key(self.url)))
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_rate_limited_probe_keeps_circuit_open(self, mock_get):
+        failure = {"failures": 3, "retry_at": time.time() - 1}
+        cache.set(failure_key(self.url), failure)
+
+        # Пробный запрос не дождался своего лимита и до Keitaro не дошёл
+        with patch("keitaro_wrapper.api_manager.limited", side_effect=RateLimitTimeout("read", 30)):
+            self.assertIsInstance(self.api.fetch("campaigns").error, RateLimitTimeout)
+
+        mock_get.assert_not_called()
+        self.assertEqual(cache.get(failure_key(self.url)), failure)
+        self.assertIsNone(cache.get(probe_key(self.url)))
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.put")
+    def test_rate_limited_write_probe_keeps_circuit_open(self, mock_put):
+        url = "https://fakehost/streams/5"
+        failure = {"failures": 3, "retry_at": time.time() - 1}
+        cache.set(failure_key(url, "PUT"), failure)
+
+        with patch("keitaro_wrapper.api_manager.limited", side_effect=RateLimitTimeout("write", 30)):
+            self.assertIsNone(self.api.update_flow(5, {"name": "f"}))
+
+        mock_put.assert_not_called()
+        self.assertEqual(cache.get(failure_key(url, "PUT")), failure)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.put")
+    def test_write_fails_fast_while_circuit_is_open(self, mock_put):
+        mock_put.return_value = make_response(status=503, body=b"")
+        self.assertIsNone(self.api.update_flow(5, {"name": "f"}))
+        self.assertIsNone(self.api.update_flow(5, {"name": "f"}))
+        self.assertEqual(mock_put.call_count, 1)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.post")
+    def test_failing_writes_do_not_open_circuit_for_reads(self, mock_post, mock_get):
+        mock_post.return_value = make_response(status=503, body=b"")
+        mock_get.return_value = make_response([{"id": 1}])
+
+        self.assertIsNone(self.api.create_campaign({"name": "c"}))
+        self.assertIsNone(self.api.create_campaign({"name": "c"}))
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self.api.get_campaigns(), [{"id": 1}])
+        self.assertIsNotNone(cache.get(failure_key(self.url, "POST")))
+        self.assertIsNone(cache.get(failure_key(self.url)))
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.post")
+    def test_client_error_does_not_open_circuit_for_writes(self, mock_post):
+        mock_post.return_value = make_response(status=422, body=b"")
+        self.assertIsNone(self.api.create_flow({"name": "f"}))
+
+        mock_post.return_value = make_response({"id": 7})
+        self.assertEqual(self.api.create_flow({"name": "f"}), {"id": 7})
+        self.assertEqual(mock_post.call_count, 2)
+
+
+class AsyncCircuitBreakerTests(TestCase):
+
+    def setUp(self):
+        clear_validators()
+        self.status = 200
+
+    def make_api(self) -> AsyncKeitaroAPIManager:
+        def handler(request):
+            return httpx.Response(self.status, json=[{"id": 1}])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return AsyncKeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token", client=client)
+
+    async def test_open_circuit_serves_last_known_good_as_stale(self):
+        api = self.make_api()
+        await api.fetch_flows(1)
+
+        self.status = 500
+        result = await api.fetch_flows(1)
+        self.assertTrue(result.stale)
+        self.assertEqual(result.data, [{"id": 1}])
+        self.assertIsInstance((await api.fetch_flows(1)).error, EndpointBackoff)
+
+    async def test_rate_limited_probe_keeps_circuit_open(self):
+        api = self.make_api()
+        url = "https://fakehost/campaigns/1/streams"
+        failure = {"failures": 3, "retry_at": time.time() - 1}
+        await cache.aset(failure_key(url), failure)
+
+        with patch("keitaro_wrapper.async_api_manager.alimited", side_effect=RateLimitTimeout("read", 30)):
+            self.assertIsInstance((await api.fetch_flows(1)).error, RateLimitTimeout)
+
+        self.assertEqual(await cache.aget(failure_key(url)), failure)
+
+
+@patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+class StaleViewsTests(TestCase):
+
+    def stale(self, data) -> FetchResult:
+        return FetchResult(data=data, error=EndpointBackoff("u", time.time() + 5), stale=True, fetched_at=time.time())
+
+    def test_stale_offers_are_served_but_not_mirrored(self, mock_api):
+        mock_api.return_value.fetch_offers.return_value = self.stale([{"id": 10, "name": "Offer A"}])
+
+        resp = self.client.get(reverse("keitaro_wrapper:offers"))
+
+        self.assertTrue(resp.json()["stale"])
+        self.assertEqual(resp.json()["offers"], [{"id": 10, "name": "Offer A"}])
+        self.assertFalse(Offer.objects.exists())
+
+    def test_campaign_detail_shows_stale_banner(self, mock_api):
+        mock_api.return_value.fetch_campaign.return_value = self.stale({"id": 3, "name": "Saved"})
+
+        resp = self.client.get(reverse("keitaro_wrapper:campaign_detail", args=[3]))
+
+        self.assertContains(resp, "Saved")
+        self.assertContains(resp, "Keitaro недоступен")
@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Offer, OfferFlow
+from ..api_manager import FetchResult
+from ..sync import sync_campaign_flows
+from .test_sync import make_flows
+
+
+class ConditionalGetTests(TestCase):
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_offers_answer_304_without_mirroring(self, mock_api):
+        mock_api.return_value.fetch_offers.return_value = FetchResult(data=[{"id": 10, "name": "Offer A"}])
+        url = reverse("keitaro_wrapper:offers")
+
+        resp = self.client.get(url)
+        etag = resp.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn("no-cache", resp.headers["Cache-Control"])
+
+        with patch("keitaro_wrapper.views.mirror_offers") as mirror:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp.headers["ETag"], etag)
+        mirror.assert_not_called()
+
+        mock_api.return_value.fetch_offers.return_value = FetchResult(data=[{"id": 10, "name": "Offer B"}])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_campaign_flows_304_skips_sync(self, mock_api):
+        flows = make_flows(3, 2)
+        flows[0]["updated_at"] = "2025-03-01 10:00:00"
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=flows)
+        url = reverse("keitaro_wrapper:campaign_streams", args=[123])
+
+        resp = self.client.get(url)
+        etag = resp.headers["ETag"]
+        self.assertIn("Last-Modified", resp.headers)
+
+        with patch("keitaro_wrapper.views.sync_campaign_flows") as sync, self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        sync.assert_not_called()
+
+        flows[1]["offers"][0]["share"] = 90
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["sync"]["flows_updated"], 1)
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_offer_flows_etag_follows_local_edits(self, mock_api):
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=make_flows(1, 2))
+        self.client.get(reverse("keitaro_wrapper:campaign_streams", args=[123]))
+        url = reverse("keitaro_wrapper:offer_flows", args=[1])
+
+        etag = self.client.get(url).headers["ETag"]
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self.client.post(
+            reverse("keitaro_wrapper:flow_update_offer", args=[1]),
+            {"offer_id": 100, "share": 70, "state": "published"},
+            content_type="application/json",
+        )
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["offer_flows"][0]["share"], 70)
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_snapshot_revalidates_after_sync_and_local_edits(self, mock_api):
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=make_flows(2, 2))
+        url = reverse("keitaro_wrapper:campaign_snapshot", args=[123])
+
+        # ETag первого ответа считается уже после синхронизации
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(OfferFlow.objects.count(), 4)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        OfferFlow.objects.filter(offer__keitaro_offer_id=101).get().save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(Offer.objects.filter(keitaro_offer_id=101).exists())
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_unchanged_keitaro_response_still_reconciles_the_db(self, mock_api):
+        flows = make_flows(2, 2)
+        url = reverse("keitaro_wrapper:campaign_streams", args=[123])
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=flows)
+        self.client.get(url)
+
+        # Другой воркер синхронизировал иной ответ, а Keitaro вернулся к прежнему:
+        # этот процесс видит not_modified, но БД должна снова совпасть с Keitaro
+        changed = make_flows(2, 2)
+        changed[0]["offers"][0]["share"] = 90
+        sync_campaign_flows(changed)
+        mock_api.return_value.fetch_flows.return_value = FetchResult(data=flows, not_modified=True)
+        resp = self.client.get(url)
+
+        self.assertEqual(resp.json()["sync"]["flows_updated"], 1)
+        self.assertEqual(OfferFlow.objects.get(offer__keitaro_offer_id=100).share, 50)
+        self.assertEqual(self.client.get(url).json()["sync"]["flows_skipped"], 2)
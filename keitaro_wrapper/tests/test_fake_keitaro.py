@@ -0,0 +1,83 @@
+import requests
+from django.test import TestCase
+
+from keitaro_wrapper.api_manager import KeitaroAPIManager, clear_validators
+from keitaro_wrapper.fake_keitaro import FakeKeitaro, FakeKeitaroConfig, FakeKeitaroData
+from keitaro_wrapper.sync import mirror_campaigns, sync_campaign_flows
+from keitaro_wrapper.tests.test_keitaro_api import reset_rate_limits
+
+
+class FakeKeitaroTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.keitaro = FakeKeitaro(FakeKeitaroConfig(campaigns=10, flows_per_campaign=4, offers=30)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.keitaro.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        clear_validators()
+        reset_rate_limits()
+        self.addCleanup(reset_rate_limits)
+        self.keitaro.reset_stats()
+        self.session = requests.Session()
+        self.api = KeitaroAPIManager(api_host=self.keitaro.url, api_token="fake-token", session=self.session)
+
+    def tearDown(self):
+        self.session.close()
+        self.keitaro.config.latency = self.keitaro.config.throttle_rate = self.keitaro.config.error_rate = 0
+
+    def test_seeded_data_is_deterministic_and_syncs(self):
+        config = FakeKeitaroConfig(campaigns=3, seed=7)
+        self.assertEqual(FakeKeitaroData(config).flows, FakeKeitaroData(config).flows)
+
+        campaigns = self.api.get_campaigns()
+        flows = self.api.get_flows(2)
+        self.assertEqual(len(campaigns), 10)
+        self.assertEqual({flow["campaign_id"] for flow in flows}, {2})
+        self.assertEqual(mirror_campaigns(campaigns).created, 10)
+        self.assertEqual(sync_campaign_flows(flows).flows_created, 4)
+
+    def test_keep_alive_connection_is_reused(self):
+        for _ in range(5):
+            self.api.get_offers()
+        self.assertEqual(self.keitaro.stats.connections, 1)
+        self.assertEqual(self.keitaro.stats.requests["GET offers"], 5)
+
+    def test_concurrent_requests_are_counted(self):
+        self.keitaro.config.latency = 0.1
+        self.api.fetch_many({name: name for name in ("offers", "domains", "groups", "traffic_sources")})
+        self.assertEqual(self.keitaro.stats.peak_in_flight, 4)
+
+    def test_injected_throttling_and_errors(self):
+        self.keitaro.config.throttle_rate = 1
+        response = self.session.get(f"{self.keitaro.url}offers", headers={"Api-Key": "fake-token"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+        self.keitaro.config.throttle_rate = 0
+        self.keitaro.config.error_rate = 1
+        self.assertEqual(self.api.fetch("domains").status, "error")
+        self.assertEqual((self.keitaro.stats.throttled, self.keitaro.stats.errors), (1, 1))
+
+    def test_latency_beyond_read_timeout_times_out(self):
+        self.keitaro.config.latency = 0.3
+        api = KeitaroAPIManager(api_host=self.keitaro.url, api_token="fake-token", session=self.session, timeout=(1, 0.05))
+        self.assertIsInstance(api.fetch("groups").error, requests.exceptions.ReadTimeout)
+
+    def test_writes_change_served_data(self):
+        flow = self.api.create_flow({"campaign_id": 5, "name": "New", "offers": [{"offer_id": 3, "share": 100}]})
+        self.api.update_flow(flow["id"], {"name": "Renamed", "offers": [{"offer_id": 4, "share": 100}]})
+
+        [served] = [f for f in self.api.get_flows(5) if f["id"] == flow["id"]]
+        self.assertEqual(served["name"], "Renamed")
+        self.assertEqual([offer["offer_id"] for offer in served["offers"]], [4])
+
+    def test_wrong_api_key_is_rejected(self):
+        api = KeitaroAPIManager(api_host=self.keitaro.url, api_token="wrong", session=self.session)
+        result = api.fetch("offers")
+        self.assertEqual(result.error.response.status_code, 401)
@@ -3,11 +3,12 @@ from unittest.mock import patch
 from django.test import TestCase
 from django.urls import reverse
 from ..models import Flow, Offer, OfferFlow
+from ..outbox import drain_once
 
 
 class FlowUpdateTests(TestCase):
 
-    @patch("keitaro_wrapper.views.KeitaroAPIManager")
+    @patch("keitaro_wrapper.outbox.KeitaroAPIManager")
     def test_flow_update_changes_pending_add_to_published(self, mock_api):
         mock_api.return_value.update_flow.return_value = {"ok": True}
 
@@ -24,7 +25,12 @@ class FlowUpdateTests(TestCase):
 
         url = reverse("keitaro_wrapper:flow_update", args=[1])
         response = self.client.put(url)
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(OfferFlow.objects.get(offer=offer).state, "pending_add")
+
+        # Отправку делает воркер outbox
+        drain_once()
+        mock_api.return_value.update_flow.assert_called_once()
 
         of = OfferFlow.objects.get(offer=offer)
         self.assertEqual(of.state, "published")
\ No newline at end of file
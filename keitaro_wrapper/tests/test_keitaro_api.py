@@ -1,92 +1,101 @@
 import json
+import threading
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 
 import unittest
 from unittest.mock import patch, MagicMock
-from keitaro_wrapper.api_manager import KeitaroAPIManager
+import requests
+from keitaro_wrapper.api_manager import KeitaroAPIManager, clear_validators
+from keitaro_wrapper.background import closing_connections
+from keitaro_wrapper.models import RateLimitBucket, RateLimitSlot
+
+
+def make_response(data=None, status=200, headers=None, body=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = body if body is not None else json.dumps(data).encode()
+    return response
+
+
+def reset_rate_limits() -> None:
+    """
+    Потоки пула fetch_many берут лимиты на своих соединениях, вне транзакции
+    теста, и фиксируют RateLimitSlot/RateLimitBucket. Удаление в транзакции
+    теста откатилось бы вместе с ней, поэтому оно тоже идёт из отдельного потока.
+    """
+    def delete():
+        RateLimitSlot.objects.all().delete()
+        RateLimitBucket.objects.all().delete()
+
+    thread = threading.Thread(target=closing_connections, args=(delete,))
+    thread.start()
+    thread.join()
 
 
 class TestKeitaroAPIManager(TestCase):
     def setUp(self):
+        clear_validators()
+        reset_rate_limits()
+        self.addCleanup(reset_rate_limits)
         self.api = KeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token")
         self.sample_data = [{"id": 1, "name": "Test"}]
 
     # ----------------- GET Methods -----------------
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_offers_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         offers = self.api.get_offers()
         self.assertEqual(offers, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_domains_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         domains = self.api.get_domains()
         self.assertEqual(domains, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_sources_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         sources = self.api.get_sources()
         self.assertEqual(sources, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_groups_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         groups = self.api.get_groups()
         self.assertEqual(groups, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_flow_actions_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         actions = self.api.get_flow_actions()
         self.assertEqual(actions, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_campaigns_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         campaigns = self.api.get_campaigns()
         self.assertEqual(campaigns, self.sample_data)
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_campaign_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data[0]),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data[0])
         campaign = self.api.get_campaign(1)
         self.assertEqual(campaign, self.sample_data[0])
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_flows_success(self, mock_get):
-        mock_get.return_value = MagicMock(
-            json=MagicMock(return_value=self.sample_data),
-            raise_for_status=MagicMock()
-        )
+        mock_get.return_value = make_response(self.sample_data)
         flows = self.api.get_flows(1)
         self.assertEqual(flows, self.sample_data)
 
     # ----------------- POST Methods -----------------
-    @patch("keitaro_wrapper.api_manager.requests.post")
+    @patch("keitaro_wrapper.api_manager.requests.Session.post")
     def test_create_campaign_success(self, mock_post):
         mock_post.return_value = MagicMock(
             json=MagicMock(return_value=self.sample_data[0]),
@@ -96,7 +105,7 @@ class TestKeitaroAPIManager(TestCase):
         response = self.api.create_campaign(payload)
         self.assertEqual(response, self.sample_data[0])
 
-    @patch("keitaro_wrapper.api_manager.requests.post")
+    @patch("keitaro_wrapper.api_manager.requests.Session.post")
     def test_create_flow_success(self, mock_post):
         mock_post.return_value = MagicMock(
             json=MagicMock(return_value=self.sample_data[0]),
@@ -106,8 +115,18 @@ class TestKeitaroAPIManager(TestCase):
         response = self.api.create_flow(payload)
         self.assertEqual(response, self.sample_data[0])
 
+    @patch("keitaro_wrapper.api_manager.requests.Session.post")
+    def test_send_reports_why_write_failed(self, mock_post):
+        mock_post.return_value = MagicMock(json=MagicMock(return_value={"id": 5}), raise_for_status=MagicMock())
+        self.assertEqual(self.api.send("POST", "campaigns", {"name": "Test"}).data, {"id": 5})
+
+        mock_post.side_effect = requests.ReadTimeout("timeout")
+        result = self.api.send("POST", "campaigns", {"name": "Test"})
+        self.assertIsInstance(result.error, requests.ReadTimeout)
+        self.assertIsNone(result.data)
+
     # ----------------- PUT Methods -----------------
-    @patch("keitaro_wrapper.api_manager.requests.put")
+    @patch("keitaro_wrapper.api_manager.requests.Session.put")
     def test_update_flow_success(self, mock_put):
         mock_put.return_value = MagicMock(
             json=MagicMock(return_value=self.sample_data),
@@ -118,25 +137,150 @@ class TestKeitaroAPIManager(TestCase):
         self.assertEqual(response, self.sample_data)
 
     # ----------------- Error Handling -----------------
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_error_returns_empty_list(self, mock_get):
-        mock_response = MagicMock()
-        # raise_for_status должен выбрасывать requests.exceptions.HTTPError
-        from requests.exceptions import HTTPError
-        mock_response.raise_for_status.side_effect = HTTPError("HTTP Error")
-        mock_response.json = MagicMock(return_value=[])
-        mock_get.return_value = mock_response
+        # raise_for_status выбрасывает requests.exceptions.HTTPError
+        mock_get.return_value = make_response([], status=500)
 
         result = self.api.get_offers()
         self.assertEqual(result, [])
 
-    @patch("keitaro_wrapper.api_manager.requests.get")
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
     def test_get_invalid_json_returns_empty_list(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.raise_for_status = MagicMock()
-        mock_response.json.side_effect = json.JSONDecodeError("Expecting value", "doc", 0)
-        mock_get.return_value = mock_response
+        mock_get.return_value = make_response(body=b"<html>")
 
         result = self.api.get_offers()
         self.assertEqual(result, [])
 
+    # ----------------- Transport -----------------
+    def test_managers_share_pooled_session(self):
+        other = KeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token")
+        self.assertIs(self.api.session, other.session)
+
+        adapter = self.api.session.get_adapter("https://fakehost/")
+        self.assertEqual(adapter._pool_maxsize, settings.KEITARO_API_POOL_SIZE)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_get_uses_explicit_timeouts(self, mock_get):
+        mock_get.return_value = make_response(self.sample_data)
+        self.api.get_offers()
+        self.assertEqual(
+            mock_get.call_args.kwargs["timeout"],
+            (settings.KEITARO_API_CONNECT_TIMEOUT, settings.KEITARO_API_READ_TIMEOUT)
+        )
+
+    # ----------------- Concurrent fetch -----------------
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_fetch_many_returns_result_per_resource(self, mock_get):
+        from requests.exceptions import HTTPError
+
+        def fake_get(url, **kwargs):
+            if url.endswith("groups"):
+                return make_response(status=400)
+            return make_response([{"id": 1, "url": url}])
+
+        mock_get.side_effect = fake_get
+
+        results = self.api.fetch_many({"domains": "domains", "offers": "offers", "groups": "groups"})
+
+        self.assertEqual(set(results), {"domains", "offers", "groups"})
+        self.assertTrue(results["domains"].ok)
+        self.assertEqual(results["offers"].data, [{"id": 1, "url": "https://fakehost/offers"}])
+        self.assertFalse(results["groups"].ok)
+        self.assertIsInstance(results["groups"].error, HTTPError)
+        self.assertEqual(mock_get.call_count, 3)
+
+    # ----------------- Typed results / negative cache -----------------
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_fetch_separates_ok_empty_and_error(self, mock_get):
+        def fake_get(url, **kwargs):
+            if url.endswith("groups"):
+                return make_response(status=400)
+            if url.endswith("domains"):
+                return make_response([])
+            return make_response(self.sample_data)
+
+        mock_get.side_effect = fake_get
+
+        self.assertEqual(self.api.fetch("offers").status, "ok")
+        self.assertEqual(self.api.fetch("domains").status, "empty")
+        self.assertEqual(self.api.fetch("groups").status, "error")
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_failed_endpoint_is_not_requested_during_backoff(self, mock_get):
+        from requests.exceptions import HTTPError
+        from keitaro_wrapper.api_manager import EndpointBackoff
+
+        mock_get.return_value = make_response(status=400)
+
+        first = self.api.fetch("groups")
+        second = self.api.fetch("groups")
+
+        self.assertIsInstance(first.error, HTTPError)
+        self.assertIsInstance(second.error, EndpointBackoff)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_backoff_grows_exponentially_and_resets_on_success(self, mock_get):
+        mock_get.return_value = make_response(status=500)
+        key = self.api._failure_key("https://fakehost/groups")
+
+        self.api.fetch("groups")
+        self.assertEqual(cache.get(key)["failures"], 1)
+        self.assertAlmostEqual(
+            cache.get(key)["retry_at"], time.time() + settings.KEITARO_NEGATIVE_CACHE_TTL, delta=1
+        )
+
+        # Пауза истекла — следующий сбой удваивает её
+        cache.set(key, {**cache.get(key), "retry_at": time.time() - 1}, 60)
+        self.api.fetch("groups")
+        self.assertEqual(cache.get(key)["failures"], 2)
+        self.assertAlmostEqual(
+            cache.get(key)["retry_at"], time.time() + 2 * settings.KEITARO_NEGATIVE_CACHE_TTL, delta=1
+        )
+
+        cache.set(key, {**cache.get(key), "retry_at": time.time() - 1}, 60)
+        mock_get.return_value = make_response(self.sample_data)
+        self.assertTrue(self.api.fetch("groups").ok)
+        self.assertIsNone(cache.get(key))
+
+    # ----------------- Conditional requests -----------------
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_etag_is_sent_back_and_304_reuses_parsed_body(self, mock_get):
+        mock_get.return_value = make_response(self.sample_data, headers={"ETag": '"v1"'})
+        first = self.api.fetch("offers")
+        self.assertFalse(first.not_modified)
+        self.assertNotIn("If-None-Match", mock_get.call_args.kwargs["headers"])
+
+        mock_get.return_value = make_response(status=304, body=b"")
+        second = self.api.fetch("offers")
+
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertTrue(second.not_modified)
+        self.assertIs(second.data, first.data)
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_identical_body_without_validators_is_not_parsed_again(self, mock_get):
+        mock_get.return_value = make_response(self.sample_data)
+        first = self.api.fetch("offers")
+
+        mock_get.return_value = make_response(self.sample_data)
+        with patch.object(requests.Response, "json") as parse:
+            second = self.api.fetch("offers")
+        parse.assert_not_called()
+        self.assertTrue(second.not_modified)
+        self.assertIs(second.data, first.data)
+
+        mock_get.return_value = make_response([{"id": 2, "name": "Other"}])
+        third = self.api.fetch("offers")
+        self.assertFalse(third.not_modified)
+        self.assertEqual(third.data, [{"id": 2, "name": "Other"}])
+
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_forget_drops_validators(self, mock_get):
+        mock_get.return_value = make_response(self.sample_data, headers={"ETag": '"v1"'})
+        self.api.fetch("offers")
+        self.api.forget("offers")
+
+        self.api.fetch("offers")
+        self.assertNotIn("If-None-Match", mock_get.call_args.kwargs["headers"])
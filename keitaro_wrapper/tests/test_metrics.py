@@ -0,0 +1,157 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+import requests
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from keitaro_wrapper import metrics
+from keitaro_wrapper.api_manager import KeitaroAPIManager, clear_validators, failure_key
+from keitaro_wrapper.fake_keitaro import FakeKeitaro, FakeKeitaroConfig
+from keitaro_wrapper.reference_data import cache_key, get_reference_data
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.keitaro = FakeKeitaro(FakeKeitaroConfig(campaigns=3, flows_per_campaign=2, offers=5)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.keitaro.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        clear_validators()
+        self.session = requests.Session()
+        self.api = KeitaroAPIManager(api_host=self.keitaro.url, api_token="fake-token", session=self.session)
+
+    def tearDown(self):
+        self.session.close()
+        self.keitaro.config.latency = self.keitaro.config.error_rate = 0
+
+    def test_endpoint_label_hides_ids(self):
+        self.assertEqual(metrics.endpoint_label("campaigns/12/streams"), "campaigns/{id}/streams")
+        self.assertEqual(metrics.endpoint_label("offers"), "offers")
+
+    def test_responses_latency_and_validators_are_counted(self):
+        labels = {"endpoint": "campaigns/{id}/streams", "method": "GET"}
+        responses = sample("keitaro_responses_total", status="200", **labels)
+        observed = sample("keitaro_request_duration_seconds_count", **labels)
+        hits = sample("keitaro_cache_lookups_total", cache="validators", key=labels["endpoint"], result="hit")
+
+        self.api.get_flows(1)
+        self.api.get_flows(1)
+
+        self.assertEqual(sample("keitaro_responses_total", status="200", **labels) - responses, 2)
+        self.assertEqual(sample("keitaro_request_duration_seconds_count", **labels) - observed, 2)
+        self.assertEqual(
+            sample("keitaro_cache_lookups_total", cache="validators", key=labels["endpoint"], result="hit") - hits, 1,
+        )
+        self.assertEqual(sample("keitaro_requests_in_flight", **labels), 0)
+
+    def test_failures_short_circuits_and_retries_are_counted(self):
+        labels = {"endpoint": "domains", "method": "GET"}
+        before = {
+            "errors": sample("keitaro_responses_total", status="500", **labels),
+            "short_circuited": sample("keitaro_short_circuited_total", **labels),
+            "retries": sample("keitaro_retries_total", **labels),
+            "stale": sample("keitaro_cache_lookups_total", cache="snapshot", key="domains", result="stale"),
+        }
+        self.api.fetch("domains")
+        self.keitaro.config.error_rate = 1
+
+        self.assertEqual(self.api.fetch("domains").status, "stale")
+        self.api.fetch("domains")
+        key = failure_key(f"{self.keitaro.url}domains")
+        cache.set(key, {**cache.get(key), "retry_at": 0})
+        self.api.fetch("domains")
+
+        after = {
+            "errors": sample("keitaro_responses_total", status="500", **labels),
+            "short_circuited": sample("keitaro_short_circuited_total", **labels),
+            "retries": sample("keitaro_retries_total", **labels),
+            "stale": sample("keitaro_cache_lookups_total", cache="snapshot", key="domains", result="stale"),
+        }
+        self.assertEqual({name: after[name] - before[name] for name in before}, {
+            "errors": 2, "short_circuited": 1, "retries": 1, "stale": 3,
+        })
+
+    def test_timeouts_are_counted(self):
+        self.keitaro.config.latency = 0.3
+        api = KeitaroAPIManager(api_host=self.keitaro.url, api_token="fake-token", session=self.session, timeout=(1, 0.05))
+        before = sample("keitaro_responses_total", endpoint="groups", method="GET", status="timeout")
+
+        api.fetch("groups")
+
+        self.assertEqual(sample("keitaro_responses_total", endpoint="groups", method="GET", status="timeout") - before, 1)
+
+    def test_writes_are_counted_by_method(self):
+        labels = {"endpoint": "streams/{id}", "method": "PUT"}
+        before = sample("keitaro_responses_total", status="200", **labels)
+        flow = self.api.get_flows(2)[0]
+
+        self.api.update_flow(flow["id"], {"name": "Renamed"})
+
+        self.assertEqual(sample("keitaro_responses_total", status="200", **labels) - before, 1)
+
+
+class CacheMetricsTests(TestCase):
+
+    def test_reference_data_hits_misses_and_stale(self):
+        cache.set(cache_key("domains"), {"value": [], "fresh_until": 2**40, "fetched_at": 0})
+        cache.set(cache_key("groups"), {"value": [], "fresh_until": 0, "fetched_at": 0})
+        before = {
+            result: sample("keitaro_cache_lookups_total", cache="reference", key=key, result=result)
+            for key, result in [("domains", "hit"), ("groups", "stale"), ("offers", "miss")]
+        }
+
+        with patch("keitaro_wrapper.reference_data.schedule_refresh"), \
+                patch("keitaro_wrapper.reference_data.refresh", return_value={"offers": []}):
+            get_reference_data(["domains", "groups", "offers"])
+
+        for (key, result) in [("domains", "hit"), ("groups", "stale"), ("offers", "miss")]:
+            self.assertEqual(
+                sample("keitaro_cache_lookups_total", cache="reference", key=key, result=result) - before[result], 1,
+            )
+
+
+class MetricsViewTests(TestCase):
+
+    def test_exposes_prometheus_text(self):
+        metrics.count_cache("reference", "domains", "hit")
+
+        response = self.client.get(reverse("keitaro_wrapper:metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b'keitaro_cache_lookups_total{cache="reference",key="domains",result="hit"}', response.content)
+
+    def test_sums_metrics_of_all_workers(self):
+        # Каждый процесс пишет свои значения в каталог, как воркеры uvicorn
+        worker = (
+            "from prometheus_client import Counter;"
+            "Counter('keitaro_responses_total', '', ['endpoint', 'method', 'status'])"
+            ".labels('offers', 'GET', '200').inc(3)"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(2):
+                subprocess.run(
+                    [sys.executable, "-c", worker], check=True,
+                    env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory},
+                )
+            with patch.object(metrics, "PROMETHEUS_MULTIPROC_DIR", directory):
+                body, _ = metrics.render()
+
+        self.assertIn(b'keitaro_responses_total{endpoint="offers",method="GET",status="200"} 6.0', body)
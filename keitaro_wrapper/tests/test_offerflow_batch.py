@@ -0,0 +1,91 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Offer, OfferFlow
+from ..sync import sync_campaign_flows
+from .test_sync import make_flows
+
+
+class OfferFlowBatchUpdateTests(TestCase):
+
+    def setUp(self):
+        # Потоки 1 и 2, офферы 100, 101 и 200, 201
+        sync_campaign_flows(make_flows(2, 2))
+        self.url = reverse("keitaro_wrapper:offer_flows_batch")
+
+    def post(self, changes):
+        return self.client.post(
+            self.url, data=json.dumps({"changes": changes}), content_type="application/json"
+        )
+
+    def test_rebalance_creates_and_updates_in_one_request(self):
+        resp = self.post([
+            {"flow_id": 1, "offer_id": 100, "share": 34, "state": "published", "is_pinned": True},
+            {"flow_id": 1, "offer_id": 101, "share": 33, "state": "published"},
+            {"flow_id": 1, "offer_id": 777, "share": 33, "state": "pending_add"},
+            {"flow_id": 2, "offer_id": 200, "share": 0, "state": "pending_delete"},
+        ])
+        self.assertEqual(resp.status_code, 200)
+
+        state = {(of["flow"], of["offer"]): of for of in resp.json()["offer_flows"]}
+        self.assertEqual(len(state), 5)
+        self.assertEqual(state[(1, 100)]["share"], 34)
+        self.assertTrue(state[(1, 100)]["is_pinned"])
+        self.assertEqual(state[(1, 777)]["state"], "pending_add")
+        self.assertEqual(state[(2, 200)]["state"], "pending_delete")
+        self.assertEqual(state[(2, 201)]["state"], "published")
+
+        self.assertEqual(Offer.objects.get(keitaro_offer_id=777).name, "offer #777")
+        self.assertEqual(OfferFlow.objects.count(), 5)
+
+    def test_query_count_does_not_depend_on_change_count(self):
+        def changes(share):
+            return [
+                {"flow_id": flow_id, "offer_id": flow_id * 100 + n, "share": share, "state": "published"}
+                for flow_id in (1, 2) for n in range(2)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.post(changes(50)[:1])
+        with CaptureQueriesContext(connection) as large:
+            self.post(changes(25))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(set(OfferFlow.objects.values_list("share", flat=True)), {25})
+
+    def test_unknown_flow_rolls_back_whole_batch(self):
+        resp = self.post([
+            {"flow_id": 1, "offer_id": 100, "share": 10, "state": "published"},
+            {"flow_id": 999, "offer_id": 100, "share": 90, "state": "published"},
+        ])
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.json()["flow_ids"], [999])
+        self.assertEqual(OfferFlow.objects.get(flow__keitaro_flow_id=1, offer__keitaro_offer_id=100).share, 50)
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{"flow_id": 1}]).status_code, 400)
+        self.assertEqual(self.post([{"flow_id": 1, "offer_id": 100, "state": "bogus"}]).status_code, 400)
+
+    def test_malformed_bodies_are_rejected(self):
+        valid = {"flow_id": 1, "offer_id": 100, "share": 10, "state": "published"}
+        bodies = [
+            [valid],
+            {"changes": valid},
+            {"changes": "oops"},
+            {"changes": [valid, 42]},
+            {"changes": [valid, None]},
+            {"changes": [{**valid, "share": 101}]},
+            {"changes": [{**valid, "share": -1}]},
+            {"changes": [{**valid, "share": "many"}]},
+            {"changes": [{**valid, "state": None}]},
+            {"changes": [{**valid, "is_pinned": "false"}]},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                resp = self.client.post(self.url, data=json.dumps(body), content_type="application/json")
+                self.assertEqual(resp.status_code, 400)
+        self.assertEqual(OfferFlow.objects.get(flow__keitaro_flow_id=1, offer__keitaro_offer_id=100).share, 50)
@@ -1,21 +1,37 @@
 from unittest.mock import patch
 from django.test import TestCase
 from django.urls import reverse
+from ..api_manager import FetchResult
 from ..models import Offer
 
 
 class OffersTests(TestCase):
 
-    @patch("keitaro_wrapper.views.KeitaroAPIManager")
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
     def test_offers_creation(self, mock_api):
-        mock_api.return_value.get_offers.return_value = [
+        mock_api.return_value.fetch_offers.return_value = FetchResult(data=[
             {"id": 10, "name": "Offer A"},
             {"id": 20, "name": "Offer B"},
-        ]
+        ])
 
         url = reverse("keitaro_wrapper:offers")
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
 
         self.assertTrue(Offer.objects.filter(keitaro_offer_id=10).exists())
-        self.assertTrue(Offer.objects.filter(keitaro_offer_id=20).exists())
\ No newline at end of file
+        self.assertTrue(Offer.objects.filter(keitaro_offer_id=20).exists())
+
+    @patch("keitaro_wrapper.views.AsyncKeitaroAPIManager", autospec=True)
+    def test_renamed_offer_is_updated(self, mock_api):
+        Offer.objects.create(keitaro_offer_id=10, name="offer #10")
+        Offer.objects.create(keitaro_offer_id=20, name="Offer B")
+        mock_api.return_value.fetch_offers.return_value = FetchResult(data=[
+            {"id": 10, "name": "Offer A"},
+            {"id": 20, "name": "Offer B"},
+        ])
+
+        resp = self.client.get(reverse("keitaro_wrapper:offers"))
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(Offer.objects.get(keitaro_offer_id=10).name, "Offer A")
+        self.assertEqual(Offer.objects.count(), 2)
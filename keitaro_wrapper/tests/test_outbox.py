@@ -0,0 +1,86 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Flow, FlowPush, Offer, OfferFlow
+from ..outbox import claim_pushes, drain_once
+from ..sync import sync_campaign_flows
+from .test_sync import make_flows
+
+
+@patch("keitaro_wrapper.outbox.KeitaroAPIManager")
+class FlowPushOutboxTests(TestCase):
+
+    def setUp(self):
+        sync_campaign_flows(make_flows(2, 2))
+        offer = Offer.objects.create(keitaro_offer_id=999, name="New")
+        OfferFlow.objects.create(flow=Flow.objects.get(keitaro_flow_id=1), offer=offer, share=0, state="pending_add")
+
+    def push(self, flow_id=1):
+        return self.client.put(reverse("keitaro_wrapper:flow_update", args=[flow_id]))
+
+    def test_put_enqueues_and_status_follows_the_worker(self, mock_api):
+        mock_api.return_value.update_flow.return_value = {"id": 1}
+
+        resp = self.push()
+        self.assertEqual(resp.status_code, 202)
+        mock_api.return_value.update_flow.assert_not_called()
+        status_url = resp.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["push"]["status"], "pending")
+
+        drain_once()
+        push = self.client.get(status_url).json()["push"]
+        self.assertEqual((push["status"], push["attempts"], push["skipped"]), ("done", 1, False))
+        self.assertEqual(OfferFlow.objects.get(offer__keitaro_offer_id=999).state, "published")
+
+    def test_repeated_clicks_coalesce_into_one_push(self, mock_api):
+        first = self.push().json()["push"]["id"]
+        second = self.push().json()["push"]["id"]
+        self.assertEqual(first, second)
+        self.assertEqual(FlowPush.objects.count(), 1)
+
+    def test_unchanged_flow_is_settled_without_put(self, mock_api):
+        self.push(flow_id=2)
+        [push] = drain_once()
+        self.assertEqual(push.status, "done")
+        self.assertTrue(push.skipped)
+        mock_api.return_value.update_flow.assert_not_called()
+
+    @patch("keitaro_wrapper.outbox.KEITARO_OUTBOX_MAX_ATTEMPTS", 2)
+    def test_failures_back_off_then_give_up(self, mock_api):
+        mock_api.return_value.update_flow.return_value = None
+        self.push()
+
+        [push] = drain_once()
+        self.assertEqual((push.status, push.attempts), ("pending", 1))
+        self.assertTrue(push.last_error)
+        self.assertGreater(push.next_attempt_at, timezone.now())
+        # Пауза ещё не истекла
+        self.assertEqual(drain_once(), [])
+
+        FlowPush.objects.update(next_attempt_at=timezone.now())
+        [push] = drain_once()
+        self.assertEqual((push.status, push.attempts), ("failed", 2))
+        self.assertEqual(OfferFlow.objects.get(offer__keitaro_offer_id=999).state, "pending_add")
+
+    def test_expired_lease_is_reclaimed(self, mock_api):
+        self.push()
+        [claimed] = claim_pushes(10)
+        self.assertEqual(claim_pushes(10), [])
+
+        # Воркер умер, аренда истекла
+        FlowPush.objects.filter(pk=claimed.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [reclaimed] = claim_pushes(10)
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (claimed.pk, 2))
+
+    def test_management_command_drains_once(self, mock_api):
+        mock_api.return_value.update_flow.return_value = {"id": 1}
+        self.push()
+        out = StringIO()
+        call_command("drain_flow_pushes", "--once", stdout=out)
+        self.assertIn("done=1", out.getvalue())
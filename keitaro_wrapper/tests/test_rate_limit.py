@@ -0,0 +1,108 @@
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from ..api_manager import KeitaroAPIManager, clear_validators
+from ..models import RateLimitSlot
+from ..rate_limit import Limit, RateLimitTimeout, acquire, limited, release
+from .test_keitaro_api import make_response
+
+
+def limits(rate=0.0, burst=1, max_in_flight=0):
+    return patch.dict("keitaro_wrapper.rate_limit.LIMITS", {"read": Limit(rate, burst, max_in_flight)})
+
+
+class RateLimitTests(TransactionTestCase):
+    """Лимиты работают в autocommit, поэтому транзакции теста здесь нет."""
+
+    def test_token_bucket_spaces_calls_after_burst(self):
+        with limits(rate=20, burst=2):
+            started = time.monotonic()
+            for _ in range(4):
+                release(acquire("read"))
+            elapsed = time.monotonic() - started
+        # Два токена всплеска сразу, ещё два — по 1/20 секунды
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 1)
+
+    def test_caller_queues_until_deadline(self):
+        with limits(rate=0.1, burst=1):
+            release(acquire("read"))
+            started = time.monotonic()
+            with self.assertRaises(RateLimitTimeout):
+                acquire("read", wait=0.2)
+        # Токен накопится только через 10 секунд — ждать его бессмысленно
+        self.assertLess(time.monotonic() - started, 0.2)
+
+    def test_in_flight_cap_is_shared_between_connections(self):
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal in_flight, peak
+            try:
+                with limited("read"):
+                    with lock:
+                        in_flight += 1
+                        peak = max(peak, in_flight)
+                    time.sleep(0.05)
+                    with lock:
+                        in_flight -= 1
+            finally:
+                connections.close_all()
+
+        with limits(max_in_flight=2):
+            threads = [threading.Thread(target=call) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(peak, 2)
+        self.assertFalse(RateLimitSlot.objects.exclude(holder="").exists())
+
+    def test_slot_of_dead_process_is_reclaimed_after_lease(self):
+        with limits(max_in_flight=1):
+            acquire("read")
+            with self.assertRaises(RateLimitTimeout):
+                acquire("read", wait=0.1)
+            RateLimitSlot.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+            self.assertIsNotNone(acquire("read", wait=0.1))
+
+    def test_limits_are_skipped_inside_transaction_but_counted(self):
+        before = REGISTRY.get_sample_value("keitaro_rate_limit_bypassed_total", {"limit": "read"}) or 0
+        with limits(rate=0.1, burst=1, max_in_flight=1), transaction.atomic():
+            self.assertIsNone(acquire("read"))
+            self.assertIsNone(acquire("read"))
+        self.assertEqual(REGISTRY.get_sample_value("keitaro_rate_limit_bypassed_total", {"limit": "read"}) - before, 2)
+
+
+class RateLimitedAPITests(TestCase):
+
+    def setUp(self):
+        clear_validators()
+        self.api = KeitaroAPIManager(api_host="https://fakehost/", api_token="fake-token")
+
+    @patch("keitaro_wrapper.api_manager.limited", side_effect=RateLimitTimeout("read", 30))
+    @patch("keitaro_wrapper.api_manager.requests.Session.get")
+    def test_limit_timeout_is_an_error_but_not_an_endpoint_failure(self, mock_get, _limited):
+        result = self.api.fetch("offers")
+
+        self.assertIsInstance(result.error, RateLimitTimeout)
+        mock_get.assert_not_called()
+        self.assertIsNone(cache.get(self.api._failure_key("https://fakehost/offers")))
+
+    @patch("keitaro_wrapper.api_manager.limited")
+    @patch("keitaro_wrapper.api_manager.requests.Session.put")
+    def test_writes_use_write_limit(self, mock_put, mock_limited):
+        mock_put.return_value = make_response({"id": 1})
+        self.api.update_flow(1, {"name": "f"})
+        mock_limited.assert_called_once_with("write")
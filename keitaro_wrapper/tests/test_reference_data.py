@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import Future
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+
+from ..api_manager import FetchResult
+from ..reference_data import _inflight, cache_key, get_reference_data, lock_key, refresh
+
+
+def run_inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+@patch("keitaro_wrapper.reference_data.background.submit", side_effect=run_inline)
+@patch("keitaro_wrapper.reference_data.KeitaroAPIManager")
+class ReferenceDataTests(TestCase):
+
+    def _mock_fetch(self, mock_api, value):
+        mock_api.return_value.fetch_many.side_effect = lambda resources: {
+            name: FetchResult(data=value) for name in resources
+        }
+
+    def test_miss_loads_synchronously_and_caches(self, mock_api, mock_submit):
+        self._mock_fetch(mock_api, [{"id": 1}])
+
+        data = get_reference_data(["domains", "offers"])
+        self.assertEqual(data, {"domains": [{"id": 1}], "offers": [{"id": 1}]})
+
+        get_reference_data(["domains", "offers"])
+        self.assertEqual(mock_api.return_value.fetch_many.call_count, 1)
+        mock_submit.assert_not_called()
+
+    def test_only_missing_resource_is_fetched(self, mock_api, mock_submit):
+        cache.set(cache_key("domains"), {"value": [{"id": 1}], "fresh_until": time.time() + 60}, 60)
+        self._mock_fetch(mock_api, [{"id": 2}])
+
+        data = get_reference_data(["domains", "offers"])
+
+        self.assertEqual(data, {"domains": [{"id": 1}], "offers": [{"id": 2}]})
+        requested = mock_api.return_value.fetch_many.call_args.args[0]
+        self.assertEqual(requested, {"offers": "offers"})
+
+    def test_empty_list_is_cached_value_not_a_miss(self, mock_api, mock_submit):
+        self._mock_fetch(mock_api, [])
+
+        self.assertEqual(get_reference_data(["offers"]), {"offers": []})
+        self.assertEqual(get_reference_data(["offers"]), {"offers": []})
+        self.assertEqual(mock_api.return_value.fetch_many.call_count, 1)
+
+    def test_error_keeps_previous_value_and_is_not_cached(self, mock_api, mock_submit):
+        cache.set(cache_key("groups"), {"value": [{"id": 1}], "fresh_until": time.time() - 1}, 60)
+        mock_api.return_value.fetch_many.return_value = {"groups": FetchResult(error=Exception("400"))}
+
+        data = get_reference_data(["groups"])
+
+        self.assertEqual(data["groups"], [{"id": 1}])
+        self.assertEqual(cache.get(cache_key("groups"))["value"], [{"id": 1}])
+
+        cache.delete(cache_key("groups"))
+        self.assertEqual(get_reference_data(["groups"]), {"groups": []})
+        self.assertIsNone(cache.get(cache_key("groups")))
+
+    def test_stale_value_served_and_refreshed_in_background(self, mock_api, mock_submit):
+        cache.set(cache_key("domains"), {"value": [{"id": 1}], "fresh_until": time.time() - 1}, 60)
+        self._mock_fetch(mock_api, [{"id": 2}])
+
+        data = get_reference_data(["domains"])
+
+        self.assertEqual(data["domains"], [{"id": 1}])
+        mock_submit.assert_called_once()
+        self.assertEqual(cache.get(cache_key("domains"))["value"], [{"id": 2}])
+
+    def test_warm_command_refreshes_all_resources(self, mock_api, mock_submit):
+        self._mock_fetch(mock_api, [{"id": 3}])
+
+        call_command("warm_keitaro_cache", stdout=StringIO())
+
+        for resource in ["domains", "offers", "sources", "groups", "flow_actions"]:
+            self.assertEqual(cache.get(cache_key(resource))["value"], [{"id": 3}])
+
+    def test_waits_for_worker_holding_the_lock(self, mock_api, mock_submit):
+        self._mock_fetch(mock_api, [{"id": 1}])
+        cache.add(lock_key("offers"), "other-worker", 60)
+
+        def other_worker_finishes(seconds):
+            cache.set(cache_key("offers"), {
+                "value": [{"id": 9}],
+                "fresh_until": time.time() + 60,
+                "fetched_at": time.time(),
+            }, 60)
+            cache.delete(lock_key("offers"))
+
+        with patch("keitaro_wrapper.reference_data.time.sleep", side_effect=other_worker_finishes):
+            data = get_reference_data(["offers"])
+
+        self.assertEqual(data["offers"], [{"id": 9}])
+        mock_api.return_value.fetch_many.assert_not_called()
+
+    @patch("keitaro_wrapper.reference_data.KEITARO_SINGLE_FLIGHT_WAIT", 0.01)
+    def test_slow_worker_holding_the_lock_serves_previous_value(self, mock_api, mock_submit):
+        self._mock_fetch(mock_api, [{"id": 2}])
+        cache.set(cache_key("groups"), {"value": [{"id": 1}], "fresh_until": 0, "fetched_at": 0}, 60)
+        # Другой воркер держит блокировки обоих ресурсов дольше, чем мы готовы ждать
+        cache.add(lock_key("groups"), "other-worker", 60)
+        cache.add(lock_key("domains"), "other-worker", 60)
+
+        data = refresh(["groups", "domains"])
+
+        self.assertEqual(data, {"groups": [{"id": 1}], "domains": [{"id": 2}]})
+        mock_api.return_value.fetch_many.assert_called_once_with({"domains": "domains"})
+
+    @patch("keitaro_wrapper.reference_data.KEITARO_SINGLE_FLIGHT_WAIT", 0.01)
+    def test_slow_leader_in_process_serves_previous_value(self, mock_api, mock_submit):
+        cache.set(cache_key("groups"), {"value": [{"id": 1}], "fresh_until": 0, "fetched_at": 0}, 60)
+        # Другой поток этого процесса уже грузит оба ресурса и не успевает
+        with patch.dict(_inflight, {"groups": Future(), "domains": Future()}):
+            data = refresh(["groups", "domains"])
+
+        self.assertEqual(data, {"groups": [{"id": 1}], "domains": []})
+        mock_api.return_value.fetch_many.assert_not_called()
+
+
+class ReferenceDataSingleFlightTests(TransactionTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    @patch("keitaro_wrapper.reference_data.KeitaroAPIManager")
+    def test_concurrent_misses_share_one_fetch(self, mock_api):
+        def slow_fetch(resources):
+            time.sleep(0.2)
+            return {name: FetchResult(data=[{"id": 1}]) for name in resources}
+
+        mock_api.return_value.fetch_many.side_effect = slow_fetch
+        results = []
+
+        def request():
+            try:
+                results.append(get_reference_data(["offers"]))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_api.return_value.fetch_many.call_count, 1)
+        self.assertEqual(results, [{"offers": [{"id": 1}]}] * 5)
@@ -0,0 +1,95 @@
+from django.test import TestCase
+
+from ..models import Flow, Offer, OfferFlow
+from ..sync import sync_campaign_flows
+
+
+def make_flows(flow_count: int, offers_per_flow: int, campaign_id: int = 123, first_id: int = 1) -> list[dict]:
+    return [
+        {
+            "id": flow_id, "name": f"Flow {flow_id}", "type": "regular",
+            "campaign_id": campaign_id, "position": flow_id, "action_options": {},
+            "comments": "", "state": "active", "action_type": "", "action_payload": "",
+            "schema": "", "collect_clicks": False, "filter_or": False,
+            "weight": 100, "offer_selection": "", "filters": [],
+            "triggers": [], "landings": [],
+            "offers": [
+                {"offer_id": flow_id * 100 + n, "share": 100 // offers_per_flow}
+                for n in range(offers_per_flow)
+            ],
+        }
+        for flow_id in range(first_id, first_id + flow_count)
+    ]
+
+
+class CampaignSyncTests(TestCase):
+
+    def test_query_count_does_not_depend_on_campaign_size(self):
+        small = sync_campaign_flows(make_flows(2, 3, campaign_id=1))
+        large = sync_campaign_flows(make_flows(50, 20, campaign_id=2, first_id=100))
+
+        self.assertEqual(large.flows_created, 50)
+        self.assertEqual(large.offer_flows_created, 1000)
+        self.assertEqual(small.queries, large.queries)
+        self.assertEqual(OfferFlow.objects.filter(flow__campaign_id=2).count(), 1000)
+
+    def test_resync_updates_in_constant_queries(self):
+        flows = make_flows(30, 10)
+        sync_campaign_flows(flows)
+
+        for flow in flows:
+            flow["offers"][0]["share"] = 1
+            flow["offers"].pop()
+        with self.assertNumQueries(7):
+            report = sync_campaign_flows(flows)
+
+        self.assertEqual(report.offer_flows_updated, 30)
+        self.assertEqual(report.offer_flows_deleted, 30)
+        self.assertEqual(OfferFlow.objects.filter(state="deleted").count(), 30)
+
+    def test_pending_delete_restored_when_flow_changes_upstream(self):
+        flows = make_flows(1, 1)
+        sync_campaign_flows(flows)
+        OfferFlow.objects.update(state="pending_delete", share=0)
+
+        flows[0]["offers"][0]["share"] = 90
+        sync_campaign_flows(flows)
+
+        offerflow = OfferFlow.objects.get()
+        self.assertEqual(offerflow.state, "published")
+        self.assertEqual(offerflow.share, 90)
+        self.assertEqual(Flow.objects.count(), 1)
+        self.assertEqual(Offer.objects.count(), 1)
+
+    def test_unchanged_flows_are_skipped_entirely(self):
+        flows = make_flows(20, 5)
+        for flow in flows:
+            flow["offers"][0]["updated_at"] = "2025-12-01 10:00:00"
+        sync_campaign_flows(flows)
+        OfferFlow.objects.filter(flow__keitaro_flow_id=1).update(state="pending_delete")
+
+        with self.assertNumQueries(3):
+            report = sync_campaign_flows(flows)
+
+        self.assertEqual(report.flows_skipped, 20)
+        self.assertEqual(report.offer_flows_updated, 0)
+        # Локальные несохранённые правки не затираются, пока поток в Keitaro не менялся
+        self.assertEqual(OfferFlow.objects.filter(state="pending_delete").count(), 5)
+        flow = Flow.objects.get(keitaro_flow_id=1)
+        self.assertEqual(len(flow.content_hash), 64)
+        self.assertEqual(flow.upstream_updated_at.year, 2025)
+
+    def test_changed_flow_is_upserted_and_unchanged_are_not_written(self):
+        flows = make_flows(3, 2)
+        sync_campaign_flows(flows)
+
+        flows[0]["name"] = "Renamed"
+        report = sync_campaign_flows(flows)
+
+        self.assertEqual(report.flows_created, 0)
+        self.assertEqual(report.flows_updated, 1)
+        self.assertEqual(Flow.objects.get(keitaro_flow_id=1).name, "Renamed")
+        self.assertEqual(Flow.objects.count(), 3)
+
+        report = sync_campaign_flows(flows)
+        self.assertEqual(report.flows_updated, 0)
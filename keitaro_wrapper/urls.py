@@ -3,13 +3,19 @@ from django.urls import path
 from .views import (
     HomeView,
     CampaignCreateView,
+    CampaignJobStatusView,
     CampaignEditListView,
     CampaignDetailView,
     CampaignFlowsView,
     OffersView,
     FlowUpdateView,
+    FlowPushStatusView,
     OfferFlowUpdateView,
-    OfferFlowsView
+    OfferFlowBatchUpdateView,
+    OfferFlowsView,
+    CampaignSnapshotView,
+    CampaignPublishView,
+    MetricsView,
 )
 
 app_name = "keitaro_wrapper"
@@ -17,11 +23,17 @@ app_name = "keitaro_wrapper"
 urlpatterns = [
     path("", HomeView.as_view(), name="home"),
     path("create/", CampaignCreateView.as_view(), name="create_company"),
+    path("create/jobs/<int:job_id>/", CampaignJobStatusView.as_view(), name="campaign_job_status"),
     path("edit/", CampaignEditListView.as_view(), name="edit_company"),
     path("edit/<int:campaign_id>/", CampaignDetailView.as_view(), name="campaign_detail"),
     path("company/<int:campaign_id>/streams/", CampaignFlowsView.as_view(), name="campaign_streams"),
+    path("campaign/<int:campaign_id>/snapshot/", CampaignSnapshotView.as_view(), name="campaign_snapshot"),
+    path("campaign/<int:campaign_id>/publish/", CampaignPublishView.as_view(), name="campaign_publish"),
     path("offers/", OffersView.as_view(), name="offers"),
     path("flow/<int:flow_id>/", FlowUpdateView.as_view(), name="flow_update"),
+    path("flow_push/<int:push_id>/", FlowPushStatusView.as_view(), name="flow_push_status"),
     path("flow/<int:flow_id>/update_offer/", OfferFlowUpdateView.as_view(), name="flow_update_offer"),
+    path("offer_flows/batch/", OfferFlowBatchUpdateView.as_view(), name="offer_flows_batch"),
     path("flow/<int:flow_id>/offer_flows/", OfferFlowsView.as_view(), name="offer_flows"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
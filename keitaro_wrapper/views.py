@@ -1,35 +1,38 @@
 import json
+import logging
+from dataclasses import asdict
+from datetime import datetime, timezone as dt_timezone
 
+from asgiref.sync import sync_to_async
 from django.db import transaction
 from django.views.generic import TemplateView, FormView, View
-from django.http import JsonResponse
-from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.contrib import messages
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.http import urlencode
 from django.utils.text import slugify
-from uuid import uuid4
 
-from .api_manager import KeitaroAPIManager
+from adrobot.settings import KEITARO_CAMPAIGN_FRAGMENT_TTL, KEITARO_CAMPAIGNS_PAGE_SIZE
+from . import metrics
+from .api_manager import FetchResult, KeitaroAPIManager
+from .async_api_manager import AsyncKeitaroAPIManager
+from .campaign_catalog import STATES, CampaignPage, search_campaigns, synced_at_or_schedule
+from .campaign_jobs import create_job, serialize_job
+from .conditional import arows_version, conditional_json, not_modified, rows_version, version_etag
 from .forms import CampaignForm
-from .models import Offer, Flow, OfferFlow
-
-
-class FlowActionResolver:
-    @staticmethod
-    def pick(actions: list[dict] | None, schema: str) -> str:
-        """Возвращает доступный action_type в зависимости от схемы."""
-        fallback = "redirect" if schema == "redirect" else "offers"
-        if not actions:
-            return fallback
-
-        schema_target_type = "redirect" if schema == "redirect" else "other"
-        filtered = [a for a in actions if a.get("type") == schema_target_type]
-
-        if filtered:
-            return filtered[0].get("key", fallback)
-
-        # fallback на любой action_type
-        return actions[0].get("key", fallback)
+from .models import Campaign, CampaignCreationJob, Offer, Flow, FlowPush, OfferFlow
+from .outbox import enqueue_flow_push, serialize_push
+from .publishing import dirty_flows, publish_flows, with_offer_flows
+from .reference_data import REFERENCE_RESOURCES, get_reference_data
+from .sync import (
+    SyncReport,
+    ensure_offers,
+    flow_fingerprint,
+    mirror_offers,
+    sync_campaign_flows,
+    upstream_updated_at,
+)
 
 
 class HomeView(TemplateView):
@@ -42,34 +45,8 @@ class CampaignCreateView(FormView):
     success_url = reverse_lazy("keitaro_wrapper:create_company")
 
     def get_api_data(self):
-        domains = cache.get("keitaro_domains")
-        offers = cache.get("keitaro_offers")
-        sources = cache.get("keitaro_sources")
-        groups = cache.get("keitaro_groups")
-        actions = cache.get("keitaro_flow_actions")
-
-        if not domains or not offers or not sources or groups is None or actions is None:
-            api = KeitaroAPIManager()
-            domains = api.get_domains()
-            offers = api.get_offers()
-            sources = api.get_sources()
-            groups = api.get_groups()
-            actions = api.get_flow_actions()
-
-            # кладем в кеш на 10 минут
-            cache.set("keitaro_domains", domains, 600)
-            cache.set("keitaro_offers", offers, 600)
-            cache.set("keitaro_sources", sources, 600)
-            cache.set("keitaro_groups", groups, 600)
-            cache.set("keitaro_flow_actions", actions, 600)
-
-        return {
-            "domains": domains,
-            "offers": offers,
-            "sources": sources,
-            "groups": groups,
-            "flow_actions": actions,
-        }
+        # domains, offers, sources, groups, flow_actions
+        return get_reference_data(REFERENCE_RESOURCES)
 
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
@@ -124,39 +101,24 @@ class CampaignCreateView(FormView):
         if group_id:
             payload["group_id"] = group_id
 
-        api = KeitaroAPIManager()
-        campaign_response = api.create_campaign(payload)
-
-        if not campaign_response:
-            form.add_error(None, "Не удалось создать кампанию в Keitaro. Проверьте журнал ошибок.")
-            return self.form_invalid(form)
-
-        campaign_id = campaign_response.get("id")
-        if not campaign_id:
-            form.add_error(None, "Keitaro вернул пустой идентификатор кампании.")
-            return self.form_invalid(form)
-
-        flow_actions = data.get("flow_actions") or []
-
-        flow_errors = self._create_default_flows(
-            api=api,
-            campaign_id=int(campaign_id),
+        # Кампания и её потоки создаются в фоне; ответ не ждёт Keitaro
+        job = create_job(
+            name=cleaned["name"],
+            campaign_payload=payload,
             country_code=cleaned["country"],
             offer_id=int(offer_id),
             offer_name=selected_offer["name"] if selected_offer else "",
-            actions=flow_actions,
+            flow_actions=data.get("flow_actions") or [],
         )
+        messages.info(self.request, f"Кампания «{cleaned['name']}» создаётся в Keitaro.")
+        return HttpResponseRedirect(f"{self.get_success_url()}?job={job.pk}")
 
-        if flow_errors:
-            messages.warning(
-                self.request,
-                "Кампания создана, но возникли ошибки при создании потоков: "
-                + ", ".join(flow_errors),
-            )
-        else:
-            messages.success(self.request, f"Кампания «{campaign_response.get('name', cleaned['name'])}» создана.")
-
-        return super().form_valid(form)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        job_id = self.request.GET.get("job", "")
+        if job_id.isdigit():
+            context["job_status_url"] = reverse("keitaro_wrapper:campaign_job_status", args=[int(job_id)])
+        return context
 
     @staticmethod
     def _pick_first_id(items):
@@ -174,384 +136,199 @@ class CampaignCreateView(FormView):
 
     @staticmethod
     def _build_alias(name: str) -> str:
-        slug = slugify(name, allow_unicode=True)
-        if slug:
-            return slug
-        return f"campaign-{uuid4().hex[:8]}"
-
-    def _create_default_flows(
-        self,
-        api: KeitaroAPIManager,
-        campaign_id: int,
-        country_code: str,
-        offer_id: int,
-        offer_name: str = "",
-        actions: list[dict] | None = None,
-    ) -> list[str]:
-        """Создаёт два потока: георедирект и поток с оффером."""
-        errors: list[str] = []
-        flows = [
-            self._build_geo_redirect_flow(campaign_id, country_code, actions),
-            self._build_offer_flow(campaign_id, offer_id, offer_name, actions),
-        ]
-
-        for flow in flows:
-            response = api.create_flow(flow)
-            if not response:
-                errors.append(flow.get("name", "flow"))
-
-        return errors
+        # Уникальный суффикс добавляет create_job
+        return slugify(name, allow_unicode=True) or "campaign"
 
-    @staticmethod
-    def _build_geo_redirect_flow(campaign_id: int, country_code: str, actions: list[dict] | None) -> dict:
-        redirect_action = FlowActionResolver.pick(actions, schema="redirect")
-        return {
-            "campaign_id": campaign_id,
-            "schema": "redirect",
-            "type": "forced",
-            "name": f"{campaign_id}-geo-redirect",
-            "action_type": redirect_action,
-            "action_options": {"url": "https://www.google.com"},
-            "comments": "Auto-generated redirect for selected country",
-            "state": "active",
-            "collect_clicks": False,
-            "filter_or": False,
-            "filters": [
-                {
-                    "name": "country",
-                    "mode": "accept",
-                    "payload": [country_code],
-                }
-            ],
-        }
 
-    @staticmethod
-    def _build_offer_flow(
-        campaign_id: int,
-        offer_id: int,
-        offer_name: str,
-        actions: list[dict] | None,
-    ) -> dict:
-        offer_action = FlowActionResolver.pick(actions, schema="landings")
-        return {
-            "campaign_id": campaign_id,
-            "schema": "landings",
-            "type": "default",
-            "name": f"{campaign_id}-offer",
-            "action_type": offer_action,
-            "comments": f"Auto flow for offer {offer_name or offer_id}",
-            "state": "active",
-            "collect_clicks": False,
-            "filter_or": False,
-            "offers": [
-                {
-                    "offer_id": offer_id,
-                    "share": 100,
-                    "state": "active",
-                }
-            ],
-        }
+class CampaignJobStatusView(View):
+    def get(self, request, job_id: int):
+        try:
+            job = CampaignCreationJob.objects.get(pk=job_id)
+        except CampaignCreationJob.DoesNotExist:
+            return JsonResponse({"error": "Job not found"}, status=404)
+        return JsonResponse({"job": serialize_job(job)})
+
 
 class CampaignEditListView(TemplateView):
     template_name = "keitaro_wrapper/edit_list.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        api = KeitaroAPIManager()
-        context["campaigns"] = api.get_campaigns()
-        return context
+    async def get(self, request, *args, **kwargs):
+        # Страница читает только локальный каталог; устаревший обновляется в фоне
+        synced_at = await sync_to_async(synced_at_or_schedule)()
+        query = request.GET.get("q", "").strip()
+        state = request.GET.get("state", "")
+        if state not in STATES:
+            state = ""
+
+        context = self.get_context_data(**kwargs)
+        context.update({
+            "catalog_synced": synced_at is not None,
+            # Любое изменение каталога меняет версию, а с ней и ключ кеша фрагмента
+            "catalog_version": await arows_version(Campaign.objects.all()),
+            "fragment_ttl": KEITARO_CAMPAIGN_FRAGMENT_TTL,
+            "page": CampaignPage(
+                search_campaigns(query, state),
+                KEITARO_CAMPAIGNS_PAGE_SIZE,
+                after=request.GET.get("after", ""),
+                before=request.GET.get("before", ""),
+            ),
+            "query": query,
+            "state": state,
+            "states": Campaign._meta.get_field("state").choices,
+            "filter_query": urlencode({key: value for key, value in {"q": query, "state": state}.items() if value}),
+        })
+        return self.render_to_response(context)
 
 
 class CampaignDetailView(TemplateView):
     template_name = "keitaro_wrapper/campaign_detail.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
         campaign_id = kwargs.get("campaign_id")
-        api = KeitaroAPIManager()
-        context["campaign"] = api.get_campaign(campaign_id)
-        return context
+        result = await AsyncKeitaroAPIManager().fetch_campaign(campaign_id)
+        context["campaign"] = result.data
+        # Keitaro недоступен — показываем последнюю сохранённую версию кампании
+        if result.stale:
+            context["stale_since"] = datetime.fromtimestamp(result.fetched_at, dt_timezone.utc)
+        return self.render_to_response(context)
 
 
 class CampaignFlowsView(View):
-    def get(self, request, campaign_id: int):
+    async def get(self, request, campaign_id: int):
         # Получаем данные из API
-        flows = self._get_flows_from_api(campaign_id)
-
-        # Сохраняем потоки в БД
-        self._sync_flows_to_db(flows)
-
-        # Синхронизируем офферы для каждого потока
-        for flow_json in flows:
-            self._sync_flow_offers(flow_json)
-
-        return JsonResponse({"flows": flows})
-
-    def _get_flows_from_api(self, campaign_id: int) -> list:
-        """Получает потоки из API Keitaro и фильтрует те, у которых есть офферы"""
-        api = KeitaroAPIManager()
-        flows = api.get_flows(campaign_id)
-        return [flow for flow in flows if flow["offers"]]
-
-    def _sync_flows_to_db(self, flows: list) -> None:
-        """Синхронизирует потоки с базой данных"""
-        incoming_ids = [f["id"] for f in flows]
-
-        # Получаем существующие ID потоков
-        existing_flow_ids = self._get_existing_flow_ids(incoming_ids)
-
-        # Создаем новые потоки
-        flows_to_insert = self._prepare_flows_for_insertion(flows, existing_flow_ids)
-
-        # Массово создаем записи
-        if flows_to_insert:
-            Flow.objects.bulk_create(flows_to_insert, ignore_conflicts=True)
-
-    def _get_existing_flow_ids(self, flow_ids: list) -> set:
-        """Возвращает set существующих ID потоков"""
-        return set(
-            Flow.objects.filter(keitaro_flow_id__in=flow_ids)
-            .values_list("keitaro_flow_id", flat=True)
-        )
-
-    def _prepare_flows_for_insertion(self, flows: list, existing_flow_ids: set) -> list:
-        """Подготавливает объекты Flow для вставки"""
-        return [
-            Flow(
-                keitaro_flow_id=f["id"],
-                name=f["name"],
-                type=f["type"],
-                campaign_id=f["campaign_id"],
-                position=f["position"],
-                action_options=f["action_options"],
-                comments=f["comments"],
-                state=f["state"],
-                action_type=f["action_type"],
-                action_payload=f["action_payload"],
-                schema=f["schema"],
-                collect_clicks=f["collect_clicks"],
-                filter_or=f["filter_or"],
-                weight=f["weight"],
-                offer_selection=f["offer_selection"],
-                filters=f["filters"],
-                triggers=f["triggers"],
-                landings=f["landings"]
-            )
-            for f in flows
-            if f["id"] not in existing_flow_ids
-        ]
-
-    def _sync_flow_offers(self, flow_json: dict) -> None:
-        """Синхронизирует офферы для конкретного потока"""
-        flow = self._get_flow_instance(flow_json)
-        if not flow:
-            return
-
-        # Подготавливаем данные об офферах
-        incoming_offers = self._prepare_incoming_offers(flow_json)
-        incoming_offer_ids = set(incoming_offers.keys())
-
-        # Получаем существующие связи офферов с потоком
-        existing_offerflows = OfferFlow.objects.filter(flow=flow)
-        existing_offer_ids = set(
-            existing_offerflows.values_list("offer__keitaro_offer_id", flat=True)
+        flows, result = await self._get_flows_from_api(campaign_id)
+
+        # Клиент уже видел эти потоки — не синхронизируем и не сериализуем их заново
+        etag = version_etag([flow_fingerprint(f) for f in flows], result.stale)
+        last_modified = self._last_modified(flows)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        report = await self._sync(campaign_id, flows, result)
+        return conditional_json(
+            request,
+            etag,
+            lambda: {"flows": flows, "sync": asdict(report), "stale": result.stale},
+            last_modified,
         )
 
-        # Добавляем новые офферы
-        self._add_new_offers(flow, incoming_offers, incoming_offer_ids, existing_offer_ids)
-
-        # Обновляем существующие офферы
-        self._update_existing_offers(flow, incoming_offers, incoming_offer_ids, existing_offer_ids)
-
-        # Удаляем отсутствующие офферы
-        self._delete_missing_offers(flow, incoming_offer_ids, existing_offer_ids)
-
-        # Восстанавливаем ранее удаленные офферы
-        self._restore_deleted_offers(flow, incoming_offers, incoming_offer_ids)
-
-    def _get_flow_instance(self, flow_json: dict):
-        """Возвращает экземпляр Flow по ID из JSON"""
-        try:
-            return Flow.objects.get(keitaro_flow_id=flow_json["id"])
-        except Flow.DoesNotExist:
-            return None
-
-    def _prepare_incoming_offers(self, flow_json: dict) -> dict:
-        """Преобразует список офферов в словарь для быстрого доступа"""
-        return {
-            o["offer_id"]: o
-            for o in flow_json.get("offers", [])
-        }
-
-    def _add_new_offers(self, flow: Flow, incoming_offers: dict,
-                        incoming_offer_ids: set, existing_offer_ids: set) -> None:
-        """Добавляет новые офферы в поток"""
-        missing_offer_ids = incoming_offer_ids - existing_offer_ids
-        if not missing_offer_ids:
-            return
-
-        new_offerflows = []
-        for offer_id in missing_offer_ids:
-            offer, _ = Offer.objects.get_or_create(
-                keitaro_offer_id=offer_id,
-                defaults={"name": f"offer #{offer_id}"}
-            )
-            share = incoming_offers[offer_id].get("share", 0)
-            new_offerflows.append(
-                OfferFlow(
-                    offer=offer,
-                    flow=flow,
-                    share=share,
-                    state="published",
-                    is_pinned=False
-                )
-            )
-
-        OfferFlow.objects.bulk_create(new_offerflows)
-
-    def _update_existing_offers(self, flow: Flow, incoming_offers: dict,
-                                incoming_offer_ids: set, existing_offer_ids: set) -> None:
-        """Обновляет существующие связи офферов с потоком"""
-        common_offer_ids = incoming_offer_ids & existing_offer_ids
-        if not common_offer_ids:
-            return
-
-        existing_offerflows = OfferFlow.objects.filter(flow=flow)
-        updates = []
-
-        for offerflow in existing_offerflows:
-            offer_id = offerflow.offer.keitaro_offer_id
-            if offer_id in common_offer_ids:
-                new_share = incoming_offers[offer_id].get("share", 0)
-                if offerflow.share != new_share or offerflow.state != "published":
-                    offerflow.share = new_share
-                    offerflow.state = "published"
-                    updates.append(offerflow)
-
-        if updates:
-            OfferFlow.objects.bulk_update(updates, ["share", "state", "updated_at"])
-
-    def _delete_missing_offers(self, flow: Flow, incoming_offer_ids: set,
-                               existing_offer_ids: set) -> None:
-        """Помечает отсутствующие офферы как удаленные"""
-        to_delete = existing_offer_ids - incoming_offer_ids
-        if not to_delete:
-            return
-
-        OfferFlow.objects.filter(
-            flow=flow,
-            offer__keitaro_offer_id__in=to_delete,
-            state="published"
-        ).update(state="deleted", share=0)
-
-    def _restore_deleted_offers(self, flow: Flow, incoming_offers: dict,
-                                incoming_offer_ids: set) -> None:
-        """Восстанавливает ранее удаленные офферы"""
-        restored_offerflows = OfferFlow.objects.filter(
-            flow=flow,
-            offer__keitaro_offer_id__in=incoming_offer_ids,
-            state__in=["pending_delete", "deleted"]
-        )
+    async def _get_flows_from_api(self, campaign_id: int) -> tuple[list, FetchResult]:
+        """
+        Получает потоки из API Keitaro и фильтрует те, у которых есть офферы.
+        Второй элемент — результат запроса: не изменился ли ответ Keitaro
+        с прошлого запроса, не сохранённая ли это копия.
+        """
+        result = await AsyncKeitaroAPIManager().fetch_flows(campaign_id)
+        flows = result.data or []
+        return [flow for flow in flows if flow["offers"]], result
 
-        updates = []
-        for offerflow in restored_offerflows:
-            offer_id = offerflow.offer.keitaro_offer_id
-            new_share = incoming_offers[offer_id].get("share", 0)
-            if offerflow.share != new_share or offerflow.state != "published":
-                offerflow.share = new_share
-                offerflow.state = "published"
-                updates.append(offerflow)
+    @staticmethod
+    async def _sync(campaign_id: int, flows: list, result: FetchResult) -> SyncReport:
+        # Сохранённая копия старше того, что уже лежит в БД
+        if result.stale:
+            return SyncReport(flows_skipped=len(flows))
+
+        # Сверяем потоки, офферы и OfferFlow всей кампании за фиксированное число запросов.
+        # not_modified не повод пропустить сверку: валидаторы у каждого процесса свои,
+        # и БД мог переписать другой воркер; неизменная кампания стоит один SELECT
+        report = await sync_to_async(sync_campaign_flows)(flows)
+        logging.debug(f"Campaign {campaign_id} synced: {report}")
+        return report
 
-        if updates:
-            OfferFlow.objects.bulk_update(updates, ["share", "state", "updated_at"])
+    @staticmethod
+    def _last_modified(flows: list):
+        stamps = [stamp for stamp in map(upstream_updated_at, flows) if stamp]
+        return max(stamps, default=None)
 
 
 class OffersView(View):
-    def get(self, request):
-        api = KeitaroAPIManager()
-        offers = api.get_offers()
+    async def get(self, request):
+        api = AsyncKeitaroAPIManager()
+        result = await api.fetch_offers()
+        offers = result.data or []
 
-        incoming_ids = [o["id"] for o in offers]
+        etag = version_etag(offers, result.stale)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
 
-        # какие уже есть в БД
-        existing_ids = set(
-            Offer.objects.filter(keitaro_offer_id__in=incoming_ids)
-                         .values_list("keitaro_offer_id", flat=True)
-        )
-
-        # какие нужно вставить
-        to_insert = [
-            Offer(
-                keitaro_offer_id=o["id"],
-                name=o["name"]
-            )
-            for o in offers
-            if o["id"] not in existing_ids
-        ]
-
-        # массовая вставка за один SQL запрос
-        Offer.objects.bulk_create(to_insert, ignore_conflicts=True)
-        return JsonResponse({"offers": offers})
+        # upsert новых и переименованных офферов одним SQL запросом (без изменений —
+        # один SELECT); сохранённую копию (Keitaro недоступен) не зеркалируем
+        if not result.stale:
+            await sync_to_async(mirror_offers)(offers)
+        return conditional_json(request, etag, lambda: {"offers": offers, "stale": result.stale})
 
 
 class FlowUpdateView(View):
-    @transaction.atomic
-    def put(self, request, flow_id: int):
+    async def put(self, request, flow_id: int):
         # Получаем локальный Flow
         try:
-            flow = Flow.objects.get(keitaro_flow_id=flow_id)
+            flow = await Flow.objects.aget(keitaro_flow_id=flow_id)
         except Flow.DoesNotExist:
             return JsonResponse({"error": "Flow not found"}, status=404)
 
-        # ================= Сборка payload =================
-        # Только офферы, которые нужно отправить
-        offerflows = OfferFlow.objects.filter(
-            flow=flow,
-            state__in=["pending_add", "published"]
-        )
-        offers_payload = [
+        # ?dry_run=1 только показывает diff — без сети, поэтому синхронно
+        if is_dry_run(request):
+            flow = await with_offer_flows(Flow.objects.filter(pk=flow.pk)).aget()
+            [result] = publish_flows(KeitaroAPIManager(), [flow], dry_run=True)
+            return JsonResponse({"dry_run": True, "skipped": result.skipped, "diff": result.diff})
+
+        # Отправку в Keitaro делает воркер drain_flow_pushes; клиент опрашивает status_url
+        push = await sync_to_async(enqueue_flow_push)(flow)
+        return JsonResponse(
             {
-                "offer_id": of.offer.keitaro_offer_id,
-                "share": of.share,
-                "state": "active"
-            }
-            for of in offerflows
-        ]
+                "push": serialize_push(push),
+                "status_url": reverse("keitaro_wrapper:flow_push_status", args=[push.pk]),
+            },
+            status=202,
+        )
 
-        # Собираем полный payload для Keitaro
-        payload = {
-            "id": flow.keitaro_flow_id,
-            "name": flow.name,
-            "type": flow.type,
-            "campaign_id": flow.campaign_id,
-            "position": flow.position,
-            "action_options": flow.action_options,
-            "comments": flow.comments,
-            "state": flow.state,
-            "action_type": flow.action_type,
-            "action_payload": flow.action_payload,
-            "schema": flow.schema,
-            "collect_clicks": flow.collect_clicks,
-            "filter_or": flow.filter_or,
-            "weight": flow.weight,
-            "offer_selection": flow.offer_selection,
-            "filters": flow.filters,
-            "triggers": flow.triggers,
-            "landings": flow.landings,
-            "offers": offers_payload
-        }
 
-        # ================= Отправка в Keitaro =================
-        api = KeitaroAPIManager()
+class FlowPushStatusView(View):
+    def get(self, request, push_id: int):
         try:
-            updated_flow = api.update_flow(flow_id, payload)
-        except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
-
-        # ================= Обновление локальных OfferFlow =================
-        OfferFlow.objects.filter(flow=flow, state="pending_add").update(state="published")
-        OfferFlow.objects.filter(flow=flow, state="pending_delete").update(state="deleted")
-        return JsonResponse({"flow": updated_flow})
+            push = FlowPush.objects.select_related("flow").get(pk=push_id)
+        except FlowPush.DoesNotExist:
+            return JsonResponse({"error": "Push not found"}, status=404)
+        return JsonResponse({"push": serialize_push(push)})
+
+
+class CampaignPublishView(View):
+    """
+    Ставит все изменённые потоки кампании в outbox отправки; клиент опрашивает
+    status_url каждой записи. ?dry_run=1 только показывает diff — без сети.
+    """
+
+    def post(self, request, campaign_id: int):
+        flows, clean = dirty_flows(campaign_id)
+        if is_dry_run(request):
+            results = publish_flows(KeitaroAPIManager(), flows, dry_run=True)
+            return JsonResponse({
+                "dry_run": True,
+                "results": [
+                    {"flow_id": result.flow_id, "skipped": result.skipped, "diff": result.diff}
+                    for result in results
+                ],
+                "skipped": clean + sum(result.skipped for result in results),
+            })
+
+        # PUT-запросы делает воркер drain_flow_pushes, а не веб-процесс
+        pushes = [enqueue_flow_push(flow) for flow in flows]
+        return JsonResponse(
+            {
+                "pushes": [
+                    {
+                        "push": serialize_push(push),
+                        "status_url": reverse("keitaro_wrapper:flow_push_status", args=[push.pk]),
+                    }
+                    for push in pushes
+                ],
+                "skipped": clean,
+            },
+            status=202,
+        )
 
 
 class OfferFlowUpdateView(View):
@@ -605,20 +382,167 @@ class OfferFlowUpdateView(View):
         })
 
 
+class OfferFlowBatchUpdateView(View):
+    """
+    Пакет staged-правок OfferFlow одного или нескольких потоков:
+    {"changes": [{"flow_id", "offer_id", "share", "state", "is_pinned"}, ...]}.
+    Все правки применяются в одной транзакции одним upsert-ом,
+    в ответе — итоговое состояние OfferFlow затронутых потоков.
+    """
+    STATES = {value for value, _ in OfferFlow._meta.get_field("state").choices}
+
+    @transaction.atomic
+    def post(self, request):
+        try:
+            changes = self._parse(json.loads(request.body))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return JsonResponse({"error": "Invalid payload"}, status=400)
+
+        flow_ids = {flow_id for flow_id, _ in changes}
+        flows_by_kid = {
+            flow.keitaro_flow_id: flow
+            for flow in Flow.objects.filter(keitaro_flow_id__in=flow_ids)
+        }
+        missing = sorted(flow_ids - flows_by_kid.keys())
+        if missing:
+            return JsonResponse({"error": "Flow not found", "flow_ids": missing}, status=404)
+
+        offers_by_kid, _ = ensure_offers(offer_id for _, offer_id in changes)
+
+        # Повтор пары (flow, offer) в одном upsert Postgres не допускает — побеждает последняя правка
+        OfferFlow.objects.bulk_create(
+            [
+                OfferFlow(
+                    flow=flows_by_kid[flow_id],
+                    offer=offers_by_kid[offer_id],
+                    **fields,
+                )
+                for (flow_id, offer_id), fields in changes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["flow", "offer"],
+            update_fields=["share", "state", "is_pinned", "updated_at"],
+        )
+
+        offer_flows = OfferFlow.objects.filter(
+            flow__keitaro_flow_id__in=flow_ids
+        ).select_related("offer", "flow").order_by("pk")
+        return JsonResponse({"offer_flows": [serialize_offer_flow(of) for of in offer_flows]})
+
+    def _parse(self, data: dict) -> dict[tuple[int, int], dict]:
+        """{(flow_id, offer_id): поля OfferFlow}; ValueError на некорректной правке."""
+        if not isinstance(data, dict) or not isinstance(data.get("changes"), list):
+            raise ValueError("Expected {\"changes\": [...]}")
+        changes = {}
+        for change in data["changes"]:
+            if not isinstance(change, dict):
+                raise ValueError("Each change must be an object")
+            state = change.get("state", "pending_add")
+            if state not in self.STATES:
+                raise ValueError(f"Unknown state {state}")
+            share = int(change.get("share", 0))
+            if not 0 <= share <= 100:
+                raise ValueError(f"Share {share} is out of 0..100")
+            is_pinned = change.get("is_pinned", False)
+            if not isinstance(is_pinned, bool):
+                raise ValueError("is_pinned must be a boolean")
+            changes[(int(change["flow_id"]), int(change["offer_id"]))] = {
+                "share": share,
+                "state": state,
+                "is_pinned": is_pinned,
+            }
+        if not changes:
+            raise ValueError("Empty changes")
+        return changes
+
+
 class OfferFlowsView(View):
     def get(self, request, flow_id: int):
-        offer_flows = OfferFlow.objects.filter(flow__keitaro_flow_id=flow_id).prefetch_related(
-            "offer", "flow"
+        offer_flows = OfferFlow.objects.filter(flow__keitaro_flow_id=flow_id)
+
+        # Версия — число строк и последний updated_at: один агрегирующий запрос до выборки
+        count, last_modified = rows_version(offer_flows)
+        return conditional_json(
+            request,
+            version_etag(flow_id, count, last_modified),
+            lambda: {
+                "offer_flows": [
+                    serialize_offer_flow(of) for of in offer_flows.select_related("offer", "flow")
+                ]
+            },
+            last_modified,
         )
-        return JsonResponse(
-            {"offer_flows": [
+
+
+class CampaignSnapshotView(CampaignFlowsView):
+    """
+    Потоки кампании, их OfferFlow и названия упомянутых офферов одним ответом
+    вместо цепочки offers → streams → offer_flows на каждый поток.
+    """
+
+    async def get(self, request, campaign_id: int):
+        flows, result = await self._get_flows_from_api(campaign_id)
+        fingerprints = [flow_fingerprint(f) for f in flows]
+        offer_flows = OfferFlow.objects.filter(
+            flow__keitaro_flow_id__in=[f["id"] for f in flows]
+        )
+
+        # Потоки в Keitaro не менялись, значит синхронизация ничего не тронет:
+        # версию OfferFlow можно взять до неё и ответить 304 сразу
+        count, last_modified = await arows_version(offer_flows)
+        response = not_modified(
+            request, version_etag(fingerprints, count, last_modified, result.stale), last_modified
+        )
+        if response is not None:
+            return response
+
+        await self._sync(campaign_id, flows, result)
+
+        # Один JOIN-запрос на все OfferFlow кампании
+        offer_flows = [of async for of in offer_flows.select_related("offer", "flow").order_by("pk")]
+
+        by_flow = {f["id"]: [] for f in flows}
+        offer_names = {}
+        for of in offer_flows:
+            by_flow[of.flow.keitaro_flow_id].append(serialize_offer_flow(of))
+            offer_names[of.offer.keitaro_offer_id] = of.offer.name
+
+        # Версия после синхронизации — по уже выбранным строкам, без лишнего запроса
+        last_modified = max((of.updated_at for of in offer_flows), default=None)
+        etag = version_etag(fingerprints, len(offer_flows), last_modified, result.stale)
+
+        return conditional_json(request, etag, lambda: {
+            "flows": [
                 {
-                "offer": of.offer.keitaro_offer_id,
-                "flow": of.flow.keitaro_flow_id,
-                "share": of.share,
-                "state": of.state,
-                "is_pinned": of.is_pinned
+                    "id": f["id"],
+                    "name": f["name"],
+                    "type": f["type"],
+                    "offer_flows": by_flow[f["id"]],
                 }
-            for of in offer_flows]
-                  }
-            )
\ No newline at end of file
+                for f in flows
+            ],
+            "offers": offer_names,
+            "stale": result.stale,
+        }, last_modified)
+
+
+class MetricsView(View):
+    """Метрики клиента Keitaro и кешей в текстовом формате Prometheus."""
+
+    def get(self, request):
+        body, content_type = metrics.render()
+        return HttpResponse(body, content_type=content_type)
+
+
+def serialize_offer_flow(of: OfferFlow) -> dict:
+    return {
+        "offer": of.offer.keitaro_offer_id,
+        "flow": of.flow.keitaro_flow_id,
+        "share": of.share,
+        "state": of.state,
+        "is_pinned": of.is_pinned
+    }
+
+
+def is_dry_run(request) -> bool:
+    return request.GET.get("dry_run", "").lower() in ("1", "true", "yes")
@@ -10,11 +10,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // === URL из data-атрибутов ===
     const requiredAttrs = [
-        'url',                   // campaign_streams → /company/<id>/streams/
+        'snapshotUrl',           // campaign_snapshot → /campaign/<id>/snapshot/
         'offersUrl',             // offers → /offers/
         'flowUpdateUrl',         // flow_update → /flow/0/
-        'offerUpdateUrlTemplate',// flow_update_offer → /flow/0/update_offer/
-        'offerFlowsUrlTemplate'  // offer_flows → /flow/0/offer_flows/
+        'offerFlowsBatchUrl',    // offer_flows_batch → /offer_flows/batch/
+        'publishUrl'             // campaign_publish → /campaign/<id>/publish/
     ];
 
     const urls = {};
@@ -32,6 +32,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let offers = {}; // { id: { id, name } }
     let flows = [];  // [flow]
+    let stale = false; // Keitaro недоступен, данные — последняя сохранённая версия
 
     const STATUS_ICONS = {
         pending_add: '🆕',
@@ -42,6 +43,27 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const fmtStatus = (s) => STATUS_ICONS[s] || s;
 
+    // === GET с валидатором: на 304 отдаём ранее полученное тело ===
+    const responseCache = new Map(); // url → { etag, data }
+
+    async function fetchJson(url, label) {
+        const cached = responseCache.get(url);
+        const res = await fetch(url, {
+            headers: cached ? { 'If-None-Match': cached.etag } : {}
+        });
+
+        if (res.status === 304 && cached) {
+            console.log(`♻️ ${label}: 304, данные не менялись`);
+            return cached.data;
+        }
+        if (!res.ok) throw new Error(`${label}: ${res.status}`);
+
+        const data = await res.json();
+        const etag = res.headers.get('ETag');
+        if (etag) responseCache.set(url, { etag, data });
+        return data;
+    }
+
     // === Пересчёт долей (с поддержкой pinned и неактивных) ===
     function recalculateShares(flowData) {
         const active = flowData.offerFlows.filter(of =>
@@ -72,18 +94,24 @@ document.addEventListener('DOMContentLoaded', () => {
         unpinned.forEach((of, i) => of.share = base + (i < rem ? 1 : 0));
     }
 
-    // === Синхронизация одного OfferFlow с бэком ===
-    async function syncOfferFlow(flowId, offerId, payload) {
-        const url = urls.offerUpdateUrlTemplate.replace('/0/', `/${flowId}/`);
-        console.log(`📡 POST ${url}`, { offer_id: offerId, ...payload });
-
-        const res = await fetch(url, {
+    // === Синхронизация изменённых OfferFlow потока с бэком одним запросом ===
+    async function syncOfferFlows(flow, changed) {
+        const changes = changed.map(of => ({
+            flow_id: flow.id,
+            offer_id: of.offer_id,
+            share: of.share,
+            state: of.state,
+            is_pinned: of.is_pinned
+        }));
+        console.log(`📡 POST ${urls.offerFlowsBatchUrl}`, changes);
+
+        const res = await fetch(urls.offerFlowsBatchUrl, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': csrfToken
             },
-            body: JSON.stringify({ offer_id: offerId, ...payload })
+            body: JSON.stringify({ changes })
         });
 
         if (!res.ok) {
@@ -93,7 +121,32 @@ document.addEventListener('DOMContentLoaded', () => {
             throw new Error(err.error || err.message || `HTTP ${res.status}`);
         }
 
-        return await res.json();
+        // Итоговое состояние с сервера — источник истины
+        const data = await res.json();
+        for (const saved of data.offer_flows) {
+            const of = flow.offerFlows.find(x => x.offer_id === saved.offer);
+            if (of) Object.assign(of, { share: saved.share, state: saved.state, is_pinned: saved.is_pinned });
+        }
+        return data;
+    }
+
+    // === Ожидание отправки потока из outbox ===
+    const PUSH_POLL_INTERVAL = 1000;
+    const PUSH_POLL_TIMEOUT = 60000;
+
+    async function waitForPush(statusUrl) {
+        const deadline = Date.now() + PUSH_POLL_TIMEOUT;
+        while (true) {
+            const res = await fetch(statusUrl);
+            const data = await res.json();
+            if (!res.ok) throw new Error(data.error || res.statusText);
+
+            const push = data.push;
+            if (push.status === 'done' || push.status === 'failed' || Date.now() > deadline) {
+                return push;
+            }
+            await new Promise(resolve => setTimeout(resolve, PUSH_POLL_INTERVAL));
+        }
     }
 
     // === Рендеринг UI ===
@@ -170,7 +223,14 @@ document.addEventListener('DOMContentLoaded', () => {
             `;
         }).join('');
 
-        flowsOutput.innerHTML = html;
+        const staleNote = stale
+            ? '<p class="stale">⚠️ Keitaro недоступен: показана последняя сохранённая версия</p>'
+            : '';
+        flowsOutput.innerHTML = staleNote + `
+            <div class="flow-actions">
+                <button class="btn btn-publish-all">📤 Отправить все изменения кампании</button>
+            </div>
+        ` + html;
         initOfferAutocomplete();
     }
 
@@ -267,13 +327,8 @@ document.addEventListener('DOMContentLoaded', () => {
             });
 
             render();
-            await Promise.all(changed.map(of =>
-                syncOfferFlow(flowId, of.offer_id, {
-                    share: of.share,
-                    state: of.state,
-                    is_pinned: of.is_pinned
-                })
-            ));
+            await syncOfferFlows(flow, changed);
+            render();
             console.log(`✅ Оффер ${offerId} добавлен в Flow ${flowId}`);
         } catch (err) {
             // Откат
@@ -289,19 +344,69 @@ document.addEventListener('DOMContentLoaded', () => {
         const btn = e.target.closest('button');
         if (!btn) return;
 
-        if (btn.classList.contains('btn-push')) {
+        if (btn.classList.contains('btn-publish-all')) {
+            btn.disabled = true;
+            try {
+                // Сначала dry-run: показываем, какие потоки реально изменятся
+                const previewRes = await fetch(`${urls.publishUrl}?dry_run=1`, {
+                    method: 'POST',
+                    headers: { 'X-CSRFToken': csrfToken }
+                });
+                const preview = await previewRes.json();
+                if (!previewRes.ok) throw new Error(preview.error || previewRes.statusText);
+
+                const changedFlows = preview.results.filter(r => !r.skipped).map(r => r.flow_id);
+                if (changedFlows.length === 0) {
+                    alert('✅ Изменений нет — отправлять нечего');
+                    return;
+                }
+                if (!confirm(`Будут отправлены потоки: ${changedFlows.join(', ')}. Продолжить?`)) return;
+
+                // Сервер ставит потоки в очередь (202) — дожидаемся итога каждого
+                const res = await fetch(urls.publishUrl, {
+                    method: 'POST',
+                    headers: { 'X-CSRFToken': csrfToken }
+                });
+                const data = await res.json();
+                if (!res.ok) throw new Error(data.error || res.statusText);
+
+                const pushes = await Promise.all(data.pushes.map(p => waitForPush(p.status_url)));
+                const published = pushes.filter(p => p.status === 'done' && !p.skipped).length;
+                const skipped = data.skipped + pushes.filter(p => p.status === 'done' && p.skipped).length;
+                const failed = pushes.filter(p => p.status === 'failed');
+                const pending = pushes.filter(p => p.status !== 'done' && p.status !== 'failed');
+                await loadAllFlows();
+                if (failed.length || pending.length) {
+                    alert(`⚠️ Отправлено: ${published}` +
+                        (failed.length ? `, с ошибкой: ${failed.map(p => `${p.flow_id} (${p.error})`).join(', ')}` : '') +
+                        (pending.length ? `, ещё отправляются: ${pending.map(p => p.flow_id).join(', ')}` : ''));
+                } else {
+                    alert(`✅ Отправлено потоков: ${published}, без изменений: ${skipped}`);
+                }
+            } catch (err) {
+                console.error(err);
+                alert(`⚠️ ${err.message}`);
+            } finally {
+                btn.disabled = false;
+            }
+        }
+        else if (btn.classList.contains('btn-push')) {
             const flowId = parseInt(btn.dataset.id);
             if (!flowId) return;
 
             const url = urls.flowUpdateUrl.replace('/0/', `/${flowId}/`);
+            btn.disabled = true;
             try {
+                // Сервер ставит отправку в очередь (202) — дожидаемся её итога
                 const res = await fetch(url, {
                     method: 'PUT',
                     headers: { 'X-CSRFToken': csrfToken }
                 });
                 const data = await res.json();
+                if (!res.ok) throw new Error(data.error || res.statusText);
 
-                if (res.ok) {
+                const push = await waitForPush(data.status_url);
+                if (push.status === 'done') {
                     const flow = flows.find(f => f.id === flowId);
                     if (flow) {
                         flow.offerFlows.forEach(of => {
@@ -310,13 +415,19 @@ document.addEventListener('DOMContentLoaded', () => {
                         });
                         render();
                     }
-                    alert(`✅ Flow ${flowId} отправлен в Keitaro`);
+                    alert(push.skipped
+                        ? `✅ Flow ${flowId} уже совпадает с Keitaro`
+                        : `✅ Flow ${flowId} отправлен в Keitaro`);
+                } else if (push.status === 'failed') {
+                    alert(`❌ ${push.error}`);
                 } else {
-                    alert(`❌ ${data.error || res.statusText}`);
+                    alert(`⏳ Flow ${flowId} ещё отправляется (попытка ${push.attempts}): ${push.error || 'в очереди'}`);
                 }
             } catch (err) {
                 console.error(err);
                 alert(`⚠️ ${err.message}`);
+            } finally {
+                btn.disabled = false;
             }
         }
         else if (btn.classList.contains('btn-reload')) {
@@ -360,13 +471,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (changed.length === 0) { render(); return; }
 
                 render();
-                await Promise.all(changed.map(of =>
-                    syncOfferFlow(flowId, of.offer_id, {
-                        share: of.share,
-                        state: of.state,
-                        is_pinned: of.is_pinned
-                    })
-                ));
+                await syncOfferFlows(flow, changed);
+                render();
             } catch (err) {
                 // Откат
                 flow.offerFlows.forEach(of => {
@@ -385,29 +491,24 @@ document.addEventListener('DOMContentLoaded', () => {
         flowsOutput.innerHTML = '<p>🔄 Синхронизация с Keitaro…</p>';
 
         try {
-            // 1. Получаем офферы
-            const offersRes = await fetch(urls.offersUrl);
-            if (!offersRes.ok) throw new Error(`Offers: ${offersRes.status}`);
-            const offersData = await offersRes.json();
-            offers = Object.fromEntries(offersData.offers.map(o => [o.id, o]));
-
-            // 2. Синхронизируем потоки и OfferFlow через CampaignFlowsView
-            const streamsRes = await fetch(urls.url);
-            if (!streamsRes.ok) throw new Error(`Streams: ${streamsRes.status}`);
-            const streamsData = await streamsRes.json();
+            // Офферы (для автокомплита) и снимок кампании — параллельно, двумя запросами
+            const [offersData, snapshot] = await Promise.all([
+                fetchJson(urls.offersUrl, 'Offers'),
+                fetchJson(urls.snapshotUrl, 'Snapshot')
+            ]);
 
-            // 3. Для каждого flow — получаем актуальные OfferFlow из БД
-            flows = [];
-            for (const ktFlow of streamsData.flows) {
-                const ofUrl = urls.offerFlowsUrlTemplate.replace('/0/', `/${ktFlow.id}/`);
-                const ofRes = await fetch(ofUrl);
-                const ofData = ofRes.ok ? await ofRes.json() : { offer_flows: [] };
+            offers = Object.fromEntries(offersData.offers.map(o => [o.id, o]));
+            // Офферы потоков, которых нет в общем списке, берём из снимка
+            for (const [id, name] of Object.entries(snapshot.offers)) {
+                if (!offers[id]) offers[id] = { id: parseInt(id), name };
+            }
 
+            flows = snapshot.flows.map(ktFlow => {
                 const flow = {
                     id: ktFlow.id,
                     name: ktFlow.name,
                     type: ktFlow.type,
-                    offerFlows: ofData.offer_flows.map(of => ({
+                    offerFlows: ktFlow.offer_flows.map(of => ({
                         offer_id: of.offer,
                         flow_id: of.flow,
                         share: of.share,
@@ -415,11 +516,11 @@ document.addEventListener('DOMContentLoaded', () => {
                         is_pinned: of.is_pinned
                     }))
                 };
-
                 recalculateShares(flow);
-                flows.push(flow);
-            }
+                return flow;
+            });
 
+            stale = Boolean(snapshot.stale || offersData.stale);
             render();
         } catch (err) {
             console.error('❌ loadAllFlows error:', err);
@@ -15,3 +15,49 @@
         }, 5000 + idx * 200);
     });
 })();
+
+// === Прогресс фонового создания кампании ===
+(function() {
+    const panel = document.getElementById('job-progress');
+    if (!panel) return;
+
+    const statusEl = panel.querySelector('.job-status');
+    const stepsEl = panel.querySelector('.job-steps');
+    const STEP_TITLES = {
+        campaign: 'Кампания',
+        geo_flow: 'Поток-георедирект',
+        offer_flow: 'Поток оффера'
+    };
+    const STEP_ICONS = { pending: '⏳', done: '✅', failed: '❌' };
+    const JOB_TEXT = {
+        pending: '⏳ В очереди',
+        running: '🔄 Выполняется',
+        done: '✅ Кампания создана',
+        failed: '❌ Не удалось создать кампанию'
+    };
+
+    async function poll() {
+        try {
+            const res = await fetch(panel.dataset.statusUrl);
+            const data = await res.json();
+            if (!res.ok) throw new Error(data.error || res.statusText);
+
+            const job = data.job;
+            statusEl.textContent = `${JOB_TEXT[job.status] || job.status}` +
+                (job.campaign_id ? ` (ID ${job.campaign_id})` : '') +
+                (job.error && job.status !== 'done' ? `: ${job.error}` : '');
+            stepsEl.innerHTML = Object.entries(job.steps).map(([step, info]) =>
+                `<li>${STEP_ICONS[info.status] || ''} ${STEP_TITLES[step] || step}` +
+                `${info.error ? ` — ${info.error}` : ''}</li>`
+            ).join('');
+
+            if (job.status !== 'done' && job.status !== 'failed') {
+                setTimeout(poll, 1000);
+            }
+        } catch (err) {
+            statusEl.textContent = `⚠️ ${err.message}`;
+        }
+    }
+
+    poll();
+})();